@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+
+"""
+Benchmark for :py:class:`ws.db.execution.DeferrableExecutionQueue` inserting
+rows into the ``revision`` table with the ``INSERT ... ON CONFLICT DO UPDATE``
+statement used by :py:class:`ws.db.grabbers.revision.GrabberRevisions`.
+
+The rows are inserted into an empty database (all tables are dropped first!)
+using an engine created with each of the given ``executemany_mode`` values
+(``default`` is the row-by-row *executemany* of the DBAPI).
+
+Usage:
+
+    python misc/benchmarks/deferrable_execution_queue.py postgresql://user@host/db [--rows N] [--modes default values]
+"""
+
+import argparse
+import datetime
+import os.path
+import sys
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from ws.db import schema
+from ws.db.execution import DeferrableExecutionQueue
+
+def run(url, mode, rows, chunk_size):
+    options = {}
+    if mode != "default":
+        options["executemany_mode"] = mode
+    engine = sa.create_engine(url, **options)
+
+    metadata = sa.MetaData(bind=engine)
+    schema.create_tables(metadata)
+    metadata.drop_all()
+    metadata.create_all()
+
+    revision = metadata.tables["revision"]
+    ins = insert(revision)
+    ins = ins.on_conflict_do_update(
+                constraint=revision.primary_key,
+                set_={"rev_text_id": ins.excluded.rev_text_id},
+            )
+    timestamp = datetime.datetime(2020, 1, 1)
+
+    time1 = time.time()
+    # the foreign keys are deferred, so they are not checked until the commit
+    # and the transaction is rolled back to avoid failing on them
+    with engine.connect() as conn:
+        trans = conn.begin()
+        with DeferrableExecutionQueue(conn, chunk_size) as dfe:
+            for i in range(1, rows + 1):
+                db_entry = {
+                    "rev_id": i,
+                    "rev_page": i // 10 + 1,
+                    "rev_text_id": None,
+                    "rev_comment": "edit summary {}".format(i),
+                    "rev_user": 1,
+                    "rev_user_text": "User",
+                    "rev_timestamp": timestamp + datetime.timedelta(seconds=i),
+                    "rev_minor_edit": False,
+                    "rev_deleted": 0,
+                    "rev_len": i,
+                    "rev_parent_id": i - 1,
+                    "rev_sha1": "{:040x}".format(i),
+                    "rev_content_model": "wikitext",
+                    "rev_content_format": "text/x-wiki",
+                }
+                dfe.execute(ins, db_entry)
+        time2 = time.time()
+        trans.rollback()
+
+    engine.dispose()
+    return time2 - time1
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmark for DeferrableExecutionQueue")
+    argparser.add_argument("url", help="URL of an empty PostgreSQL database (all tables are dropped)")
+    argparser.add_argument("--rows", type=int, default=50000, help="number of inserted rows")
+    argparser.add_argument("--chunk-size", type=int, default=5000, help="size of the execution queue")
+    argparser.add_argument("--modes", nargs="+", default=["default", "values"], help="executemany_mode values of the engine")
+    args = argparser.parse_args()
+
+    for mode in args.modes:
+        duration = run(args.url, mode, args.rows, args.chunk_size)
+        print("executemany_mode={}: inserted {} rows in {:.2f} seconds ({:.1f} ms per 500 rows)"
+              .format(mode, args.rows, duration, duration / args.rows * 500 * 1000))
+
+if __name__ == "__main__":
+    main()
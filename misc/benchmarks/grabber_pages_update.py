@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+
+"""
+Benchmark for :py:meth:`ws.db.grabbers.page.GrabberPages.gen_update` after a
+bulk move of many pages (e.g. a reorganization of namespaces).
+
+The API and the database are replaced with in-memory fakes, so only the CPU
+time spent in the grabber is measured (i.e. the generation of the SQL
+statements, which are not executed).
+
+Usage:
+
+    python misc/benchmarks/grabber_pages_update.py [--pages N]
+"""
+
+import argparse
+import datetime
+import os.path
+import random
+import sys
+import time
+from unittest import mock
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from ws.db import schema
+from ws.db.grabbers.page import GrabberPages
+import ws.db.selects
+
+class FakeTitle:
+    def __init__(self, title):
+        self.title = title
+
+    def dbtitle(self, ns=None):
+        return self.title.split(":", 1)[-1].replace(" ", "_")
+
+class FakeDB:
+    """
+    Provides the tables and the ``query`` method returning a move log event
+    for each page.
+    """
+    def __init__(self, pageids):
+        self.metadata = sa.MetaData()
+        schema.create_tables(self.metadata)
+        self.pageids = pageids
+
+    def __getattr__(self, name):
+        tables = self.__dict__["metadata"].tables
+        if name not in tables:
+            raise AttributeError(name)
+        return tables[name]
+
+    def Title(self, title):
+        return FakeTitle(title)
+
+    def query(self, params):
+        if params["list"] != "logevents":
+            return
+        # the log events are newer than "since" in main()
+        timestamp = datetime.datetime(2020, 1, 1, 12)
+        for logid, pageid in enumerate(self.pageids, start=1):
+            yield {
+                "logid": logid,
+                "timestamp": timestamp,
+                "type": "move",
+                "action": "move",
+                "logpage": pageid,
+                "params": {"target_ns": 0, "target_title": "Moved page {}".format(pageid)},
+            }
+
+class FakeAPI:
+    """
+    Returns the pages for the ``pageids=`` queries in random order, like
+    MediaWiki does.
+    """
+    max_ids_per_query = 500
+
+    def call_api(self, params):
+        pages = {}
+        for pageid in params["pageids"].split("|"):
+            pages[pageid] = {
+                "pageid": int(pageid),
+                "ns": 0,
+                "title": "Moved page {}".format(pageid),
+                "touched": datetime.datetime(2020, 1, 1),
+                "lastrevid": int(pageid),
+                "length": 42,
+                "contentmodel": "wikitext",
+                "pagelanguage": "en",
+                "protection": [],
+            }
+        items = list(pages.items())
+        random.shuffle(items)
+        return {"pages": dict(items)}
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmark for GrabberPages.gen_update with many changed pages")
+    argparser.add_argument("--pages", type=int, default=50000,
+            help="number of changed pages (default: %(default)s)")
+    args = argparser.parse_args()
+
+    pageids = list(range(1, args.pages + 1))
+    random.shuffle(pageids)
+
+    grabber = GrabberPages(FakeAPI(), FakeDB(pageids))
+    since = datetime.datetime(2020, 1, 1)
+
+    # recentchanges are older than "since", so only the logging table is used
+    with mock.patch.object(ws.db.selects, "oldest_rc_timestamp", return_value=None), \
+         mock.patch.object(grabber, "get_outdated_pages", return_value=set()):
+        time1 = time.time()
+        count = sum(1 for _ in grabber.gen_update(since))
+        time2 = time.time()
+
+    print("Generated {} statements for {} changed pages in {:.2f} seconds.".format(count, args.pages, time2 - time1))
+
+if __name__ == "__main__":
+    main()
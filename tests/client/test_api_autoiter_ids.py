@@ -0,0 +1,86 @@
+#! /usr/bin/env python3
+
+import itertools
+
+import pytest
+
+from ws.client.api import API
+
+class FakeAPI(API):
+    """
+    Records the queried values and returns them as pages. The result is
+    truncated for chunks larger than ``truncate``.
+    """
+    max_ids_per_query = 5
+
+    def __init__(self, *, truncate=None):
+        self.truncate = truncate
+        self.chunks = []
+
+    def call_api(self, params, *, expand_result=True, check_warnings=True):
+        chunk = params["pageids"].split("|")
+        self.chunks.append(chunk)
+        result = {"query": {"pages": [int(pageid) for pageid in chunk]}}
+        if self.truncate is not None and len(chunk) > self.truncate:
+            result["warnings"] = {"result": {"*": "This result was truncated because it would otherwise be larger than the limit."}}
+        return result
+
+def _pages(results):
+    return [pageid for result in results for pageid in result["pages"]]
+
+class test_call_api_autoiter_ids:
+    @pytest.mark.parametrize("values", [
+        [3, 1, 2],
+        {3, 1, 2},
+    ])
+    def test_sorted(self, values):
+        api = FakeAPI()
+        results = list(api.call_api_autoiter_ids(action="query", pageids=values))
+        assert _pages(results) == [1, 2, 3]
+        assert api.chunks == [["1", "2", "3"]]
+
+    @pytest.mark.parametrize("count", [0, 1, 5, 6, 12])
+    def test_iterator(self, count):
+        api = FakeAPI()
+        # the order of the iterator is preserved
+        values = iter(range(count, 0, -1))
+        results = list(api.call_api_autoiter_ids(action="query", pageids=values))
+        assert _pages(results) == list(range(count, 0, -1))
+        assert [len(chunk) for chunk in api.chunks] == [5] * (count // 5) + ([count % 5] if count % 5 else [])
+
+    def test_iterator_lazy(self):
+        api = FakeAPI()
+        consumed = []
+        def gen():
+            for i in itertools.count(1):
+                consumed.append(i)
+                yield i
+
+        results = api.call_api_autoiter_ids(action="query", pageids=gen())
+        assert next(results)["pages"] == [1, 2, 3, 4, 5]
+        assert consumed == [1, 2, 3, 4, 5]
+        assert next(results)["pages"] == [6, 7, 8, 9, 10]
+        assert consumed == list(range(1, 11))
+
+    def test_iterator_truncated(self):
+        # the chunk size is decreased after each truncated result and the
+        # values taken from the iterator are not lost
+        api = FakeAPI(truncate=2)
+        results = list(api.call_api_autoiter_ids(action="query", pageids=iter(range(1, 8))))
+        assert _pages(results) == list(range(1, 8))
+        assert [len(chunk) for chunk in api.chunks] == [5, 2, 2, 2, 1]
+
+    def test_not_expanded(self):
+        api = FakeAPI()
+        results = list(api.call_api_autoiter_ids({"action": "query", "pageids": iter([1, 2])}, expand_result=False))
+        assert results == [{"query": {"pages": [1, 2]}}]
+
+    @pytest.mark.parametrize("values", [
+        (1, 2, 3),
+        range(1, 4),
+        "1|2|3",
+    ])
+    def test_invalid_type(self, values):
+        api = FakeAPI()
+        with pytest.raises(TypeError):
+            list(api.call_api_autoiter_ids(action="query", pageids=values))
@@ -10,6 +10,7 @@ import ws.db.schema as schema
 from fixtures.postgresql import *
 from fixtures.mediawiki import *
 from fixtures.title_context import *
+from fixtures.wiki_db import *
 
 # disable rate-limiting for tests
 def pytest_configure(config):
@@ -43,6 +44,11 @@ class TestingDatabase(Database):
         self.metadata = sa.MetaData(bind=self.engine)
         schema.create_tables(self.metadata)
 
+        # drop everything cached for the old tables
+        self.invalidate_title_context()
+        self.select_cache.clear()
+        self.compiled_cache.clear()
+
     def dump(self, table=None):
         if table is None:
             raise NotImplementedError
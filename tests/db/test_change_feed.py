@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+
+import datetime
+import threading
+
+import pytest
+
+from ws.db.grabbers.change_feed import ChangeFeed
+
+def _timestamp(i):
+    return datetime.datetime(2020, 1, 1) + datetime.timedelta(hours=i)
+
+class FakeDB:
+    """
+    Returns the entries with a timestamp not older than the start parameter
+    and records the queries.
+    """
+    def __init__(self):
+        self.queries = []
+        self.lists = {
+            "logevents": [
+                {"logid": 1, "timestamp": _timestamp(1), "type": "move", "action": "move", "logpage": 1},
+                {"logid": 2, "timestamp": _timestamp(2), "type": "delete", "action": "delete", "logpage": 2},
+                {"logid": 3, "timestamp": _timestamp(3), "type": "move", "action": "move_redir", "logpage": 2},
+                {"logid": 4, "timestamp": _timestamp(4), "type": "protect", "action": "protect", "logpage": 1},
+                # log events without a target page
+                {"logid": 5, "timestamp": _timestamp(5), "type": "newusers", "action": "create"},
+                {"logid": 6, "timestamp": _timestamp(6), "type": "delete", "action": "restore", "logpage": 3},
+            ],
+            "recentchanges": [
+                {"rcid": 1, "timestamp": _timestamp(1), "type": "new", "pageid": 1, "revid": 10},
+                {"rcid": 2, "timestamp": _timestamp(2), "type": "edit", "pageid": 1, "revid": 11},
+                {"rcid": 3, "timestamp": _timestamp(3), "type": "log", "pageid": 2, "revid": 0},
+                {"rcid": 4, "timestamp": _timestamp(4), "type": "edit", "pageid": 2, "revid": 12},
+            ],
+        }
+
+    def query(self, params):
+        list_ = params["list"]
+        since = params["lestart" if list_ == "logevents" else "rcstart"]
+        self.queries.append((list_, since))
+        for entry in self.lists[list_]:
+            if entry["timestamp"] >= since:
+                yield entry
+
+def _ids(entries, key="logid"):
+    return [entry[key] for entry in entries]
+
+class test_change_feed:
+    @pytest.fixture
+    def fake_db(self):
+        return FakeDB()
+
+    def test_no_filters(self, fake_db):
+        feed = ChangeFeed(fake_db)
+        assert _ids(feed.logevents(_timestamp(0))) == [1, 2, 3, 4, 5, 6]
+        assert _ids(feed.recentchanges(_timestamp(0)), "rcid") == [1, 2, 3, 4]
+
+    def test_indexes(self, fake_db):
+        feed = ChangeFeed(fake_db)
+        delta = feed._get_delta("logevents", _timestamp(0))
+        assert delta["indexes"]["type"] == {"move": [0, 2], "delete": [1, 5], "protect": [3], "newusers": [4]}
+        # entries without the key are not indexed
+        assert delta["indexes"]["pageid"] == {1: [0, 3], 2: [1, 2], 3: [5]}
+
+    @pytest.mark.parametrize("filters, expected", [
+        ({"type": "move"}, [1, 3]),
+        ({"action": "restore"}, [6]),
+        ({"pageid": 2}, [2, 3]),
+        ({"type": "move", "pageid": 2}, [3]),
+        ({"type": "delete", "action": "delete"}, [2]),
+        ({"type": "protect", "pageid": 2}, []),
+        ({"type": "unknown"}, []),
+        # None means no filter
+        ({"type": None, "pageid": 1}, [1, 4]),
+    ])
+    def test_filters(self, fake_db, filters, expected):
+        feed = ChangeFeed(fake_db)
+        assert _ids(feed.logevents(_timestamp(0), **filters)) == expected
+
+    @pytest.mark.parametrize("filters, expected", [
+        ({"type": {"move", "delete"}}, [1, 2, 3, 6]),
+        ({"pageid": {1, 3}}, [1, 4, 6]),
+        ({"pageid": frozenset({2, 3}), "type": "delete"}, [2, 6]),
+        ({"type": {"move", "protect"}, "action": {"move", "protect"}}, [1, 4]),
+        ({"type": set()}, []),
+    ])
+    def test_multi_value_filters(self, fake_db, filters, expected):
+        feed = ChangeFeed(fake_db)
+        assert _ids(feed.logevents(_timestamp(0), **filters)) == expected
+
+    def test_recentchanges_filters(self, fake_db):
+        feed = ChangeFeed(fake_db)
+        since = _timestamp(0)
+        assert _ids(feed.recentchanges(since, type="edit"), "rcid") == [2, 4]
+        assert _ids(feed.recentchanges(since, pageid=2), "rcid") == [3, 4]
+        assert _ids(feed.recentchanges(since, revid={10, 12}), "rcid") == [1, 4]
+        assert _ids(feed.recentchanges(since, type={"new", "edit"}, pageid=1), "rcid") == [1, 2]
+
+    def test_since(self, fake_db):
+        feed = ChangeFeed(fake_db)
+        assert _ids(feed.logevents(_timestamp(3))) == [3, 4, 5, 6]
+        # a newer part of the delta is filtered from the selected entries
+        assert _ids(feed.logevents(_timestamp(5))) == [5, 6]
+        assert _ids(feed.logevents(_timestamp(4), type="protect")) == [4]
+        assert _ids(feed.logevents(_timestamp(7))) == []
+        assert fake_db.queries == [("logevents", _timestamp(3))]
+
+    def test_reselect_older_since(self, fake_db):
+        feed = ChangeFeed(fake_db)
+        assert _ids(feed.logevents(_timestamp(4), pageid=1)) == [4]
+        assert _ids(feed.logevents(_timestamp(1), pageid=1)) == [1, 4]
+        # the indexes are rebuilt for the new entries
+        assert _ids(feed.logevents(_timestamp(2), pageid=2)) == [2, 3]
+        assert fake_db.queries == [("logevents", _timestamp(4)), ("logevents", _timestamp(1))]
+
+    def test_since_hint(self, fake_db):
+        feed = ChangeFeed(fake_db, since=_timestamp(2))
+        assert _ids(feed.logevents(_timestamp(4))) == [4, 5, 6]
+        assert _ids(feed.logevents(_timestamp(2))) == [2, 3, 4, 5, 6]
+        assert _ids(feed.recentchanges(_timestamp(3)), "rcid") == [3, 4]
+        assert fake_db.queries == [("logevents", _timestamp(2)), ("recentchanges", _timestamp(2))]
+        # an older part than the hint is still selected
+        assert _ids(feed.logevents(_timestamp(1))) == [1, 2, 3, 4, 5, 6]
+        assert fake_db.queries[-1] == ("logevents", _timestamp(1))
+
+    def test_concurrent_access(self, fake_db):
+        feed = ChangeFeed(fake_db)
+        barrier = threading.Barrier(4)
+        results = []
+        def worker():
+            barrier.wait(timeout=5)
+            results.append(_ids(feed.logevents(_timestamp(0))))
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [[1, 2, 3, 4, 5, 6]] * 4
+        assert fake_db.queries == [("logevents", _timestamp(0))]
+
+    def test_release(self, fake_db):
+        feed = ChangeFeed(fake_db)
+        entries = feed.logevents(_timestamp(0))
+        assert next(entries)["logid"] == 1
+        feed.release()
+        assert feed._deltas == {}
+        # the started iteration continues with the released entries
+        assert _ids(entries) == [2, 3, 4, 5, 6]
+        # the list is selected again on the next access
+        assert _ids(feed.logevents(_timestamp(0))) == [1, 2, 3, 4, 5, 6]
+        assert fake_db.queries == [("logevents", _timestamp(0))] * 2
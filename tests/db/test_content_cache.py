@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+
+import pytest
+
+from ws.db.content_cache import ContentCache, CacheInfo
+
+from fixtures.wiki_db import wiki_timestamp
+
+@pytest.fixture(scope="function")
+def pages(db, wiki):
+    for i, title in enumerate(["Template:A", "Template:B", "Template:C"]):
+        wiki.create(title, "content of {}".format(title), wiki_timestamp(i))
+    return wiki
+
+class test_content_cache:
+    def test_get(self, db, pages):
+        cache = ContentCache(db)
+        assert cache.get(db.Title("Template:A")) == "content of Template:A"
+        assert cache.get(db.Title("Template:A")) == "content of Template:A"
+        assert cache.cache_info() == CacheInfo(hits=1, disk_hits=0, misses=1, maxsize=1024, currsize=1)
+        assert list(cache.memory) == [("Template:A", pages.latest("Template:A"))]
+
+    def test_missing_page(self, db, pages):
+        cache = ContentCache(db)
+        with pytest.raises(ValueError):
+            cache.get(db.Title("Template:Missing"))
+        assert cache.cache_info().currsize == 0
+
+    def test_lru_eviction(self, db, pages):
+        cache = ContentCache(db, maxsize=2)
+        for title in ["Template:A", "Template:B", "Template:A", "Template:C"]:
+            cache.get(db.Title(title))
+        # Template:B is the least recently used
+        assert [key[0] for key in cache.memory] == ["Template:A", "Template:C"]
+        assert cache.cache_info() == CacheInfo(hits=1, disk_hits=0, misses=3, maxsize=2, currsize=2)
+        cache.get(db.Title("Template:B"))
+        assert [key[0] for key in cache.memory] == ["Template:C", "Template:B"]
+        assert cache.cache_info().misses == 4
+
+    def test_new_revision(self, db, pages):
+        cache = ContentCache(db)
+        title = db.Title("Template:A")
+        old_revid = pages.latest("Template:A")
+        assert cache.get(title) == "content of Template:A"
+        new_revid = pages.edit("Template:A", "new content", wiki_timestamp(10))
+
+        # the latest revision IDs are not looked up again until reset
+        assert cache.get(title) == "content of Template:A"
+        cache.reset()
+        assert cache.get(title) == "new content"
+        assert set(cache.memory) == {("Template:A", old_revid), ("Template:A", new_revid)}
+        assert cache.cache_info().misses == 2
+
+    def test_disk_tier(self, db, pages, tmp_path):
+        path = str(tmp_path / "content_cache")
+        cache = ContentCache(db, path=path)
+        cache.get(db.Title("Template:A"))
+        cache.get(db.Title("Template:B"))
+        cache.close()
+
+        pages.edit("Template:B", "new content", wiki_timestamp(10))
+
+        # the entries persist across instances
+        cache = ContentCache(db, path=path)
+        try:
+            assert cache.get(db.Title("Template:A")) == "content of Template:A"
+            assert cache.cache_info() == CacheInfo(hits=0, disk_hits=1, misses=0, maxsize=1024, currsize=1)
+            # the disk entry is outdated
+            assert cache.get(db.Title("Template:B")) == "new content"
+            assert cache.cache_info().misses == 1
+            # the in-memory tier is used after the first disk hit
+            assert cache.get(db.Title("Template:A")) == "content of Template:A"
+            assert cache.cache_info().hits == 1
+            # only the latest revision is stored on disk
+            assert cache.disk["Template:B"] == (pages.latest("Template:B"), "new content")
+        finally:
+            cache.close()
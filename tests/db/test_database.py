@@ -0,0 +1,148 @@
+#! /usr/bin/env python3
+
+import argparse
+import threading
+
+import pytest
+import sqlalchemy as sa
+
+from ws.db.database import Database
+
+from fixtures.wiki_db import wiki_timestamp
+
+class RecordingDatabase(Database):
+    """
+    Records the arguments passed by :py:meth:`Database.from_argparser`
+    instead of connecting to the database.
+    """
+    def __init__(self, engine_or_url, **kwargs):
+        self.url = engine_or_url
+        self.kwargs = kwargs
+
+def _parse_args(*args):
+    argparser = argparse.ArgumentParser()
+    Database.set_argparser(argparser)
+    argparser.set_defaults(db_dialect="postgresql", db_driver="psycopg2")
+    return argparser.parse_args(args)
+
+def test_argparser_pool_options():
+    args = _parse_args("--db-name", "wiki", "--db-pool-size", "3", "--db-max-overflow", "2", "--db-pool-recycle", "60")
+    db = RecordingDatabase.from_argparser(args)
+    assert str(db.url) == "postgresql+psycopg2:///wiki"
+    assert db.kwargs == {"pool_size": 3, "max_overflow": 2, "pool_recycle": 60}
+
+def test_argparser_defaults():
+    db = RecordingDatabase.from_argparser(_parse_args("--db-name", "wiki"))
+    assert db.kwargs == {"pool_size": None, "max_overflow": None, "pool_recycle": None}
+
+def test_argparser_no_name():
+    with pytest.raises(ValueError):
+        RecordingDatabase.from_argparser(_parse_args())
+
+class EngineCreated(Exception):
+    pass
+
+@pytest.fixture
+def created_engine(monkeypatch):
+    """
+    Stop the :py:class:`Database` constructor right after the engine is
+    created (before it connects to the database) and return the engine.
+    """
+    create_engine = sa.create_engine
+    def fake_create_engine(*args, **kwargs):
+        raise EngineCreated(create_engine(*args, **kwargs))
+    monkeypatch.setattr(sa, "create_engine", fake_create_engine)
+
+    def created_engine(*args, **kwargs):
+        with pytest.raises(EngineCreated) as excinfo:
+            Database(*args, **kwargs)
+        return excinfo.value.args[0]
+    return created_engine
+
+def test_pool_options(created_engine):
+    engine = created_engine("postgresql+psycopg2:///wiki", pool_size=3, max_overflow=2, pool_recycle=60)
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 2
+    assert engine.pool._recycle == 60
+
+def test_pool_defaults(created_engine):
+    engine = created_engine("postgresql+psycopg2:///wiki")
+    assert engine.pool.size() == 5
+    assert engine.pool._max_overflow == 10
+    assert engine.pool._recycle == -1
+
+class test_connection:
+    def test_nested_scopes(self, db):
+        with db.connection() as conn:
+            assert conn.connection.connection.autocommit is True
+            with db.connection() as inner:
+                assert inner is conn
+            # the inner scope does not return the connection to the pool
+            assert db.engine.pool.checkedout() == 1
+            with db.connection() as inner:
+                assert inner is conn
+        assert db.engine.pool.checkedout() == 0
+
+        # a new outermost scope gets a new connection
+        with db.connection() as other:
+            assert other is not conn
+
+    def test_scope_reset_on_error(self, db):
+        with pytest.raises(RuntimeError):
+            with db.connection() as conn:
+                raise RuntimeError
+        assert db.engine.pool.checkedout() == 0
+        with db.connection() as other:
+            assert other is not conn
+
+    def test_threads(self, db):
+        connections = []
+        barrier = threading.Barrier(2)
+        def worker():
+            with db.connection() as conn:
+                with db.connection() as inner:
+                    assert inner is conn
+                connections.append(conn)
+                # both threads hold their connections at the same time
+                barrier.wait(timeout=5)
+                conn.execute(sa.select([sa.literal(1)])).scalar()
+
+        with db.connection() as conn:
+            threads = [threading.Thread(target=worker) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert len(connections) == 2
+            assert len({id(c) for c in connections + [conn]}) == 3
+            # the scope of the main thread is not affected by the other threads
+            with db.connection() as inner:
+                assert inner is conn
+            assert db.engine.pool.checkedout() == 1
+
+    def test_execute_sql(self, db, wiki):
+        wiki.create("Foo", "foo", wiki_timestamp(0))
+        wiki.create("Bar", "bar", wiki_timestamp(1))
+
+        executions = []
+        @sa.event.listens_for(db.engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            stream = context.execution_options.get("stream_results", False)
+            executions.append((conn.connection.connection, stream))
+
+        try:
+            with db.connection() as conn:
+                scoped = conn.connection.connection
+                pages = list(db.query(titles={"Foo", "Bar"}, prop="info"))
+                assert [page["title"] for page in pages] == ["Bar", "Foo"]
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", record)
+
+        assert {stream for _, stream in executions} == {True, False}
+        for dbapi_connection, stream in executions:
+            # streamed queries need a transaction, so they are executed on a
+            # different connection
+            if stream:
+                assert dbapi_connection is not scoped
+            else:
+                assert dbapi_connection is scoped
@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+
+import datetime
+import hashlib
+import os.path
+
+import sqlalchemy as sa
+
+from ws.db.grabbers.page import GrabberPages
+from ws.db.grabbers.revision import GrabberRevisions
+from ws.utils import base_enc
+
+IMPORT_DATA = os.path.join(os.path.dirname(__file__), "..", "..", "misc", "MediaWiki-import-data.xml")
+
+def _select(db, *columns):
+    query = sa.select(columns).order_by(*columns)
+    with db.engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(query)]
+
+def test_import_data(db):
+    db.import_dump(IMPORT_DATA)
+
+    timestamp = datetime.datetime(2017, 12, 23, 17, 32, 40)
+    assert _select(db, db.page.c.page_id, db.page.c.page_namespace, db.page.c.page_title,
+                   db.page.c.page_latest, db.page.c.page_len, db.page.c.page_touched) \
+        == [(1, 0, "Test", 1, 12, timestamp)]
+    assert _select(db, db.revision.c.rev_id, db.revision.c.rev_page, db.revision.c.rev_text_id,
+                   db.revision.c.rev_user, db.revision.c.rev_user_text, db.revision.c.rev_comment,
+                   db.revision.c.rev_timestamp, db.revision.c.rev_len) \
+        == [(1, 1, 1, 1, "Some user", "test", timestamp, 12)]
+    assert _select(db, db.text.c.old_id, db.text.c.old_text) == [(1, "Some text...")]
+    assert (1, "Some user") in _select(db, db.user.c.user_id, db.user.c.user_name)
+
+class FakeAPI:
+    def __init__(self):
+        self.lists = []
+
+    def list_chunks(self, params, *, continue_=None):
+        # the lists are empty
+        self.lists.append(params["list"])
+        yield from []
+
+def _sha1(text):
+    return base_enc(int(hashlib.sha1(text.encode("utf-8")).hexdigest(), 16), 36).decode()
+
+def _revision(revid, parentid, timestamp, contributor, text):
+    return """
+    <revision>
+      <id>{revid}</id>
+      <parentid>{parentid}</parentid>
+      <timestamp>{timestamp}</timestamp>
+      <contributor>{contributor}</contributor>
+      <comment>edit {revid}</comment>
+      <model>wikitext</model>
+      <format>text/x-wiki</format>
+      <text xml:space="preserve">{text}</text>
+      <sha1>{sha1}</sha1>
+    </revision>""".format(revid=revid, parentid=parentid, timestamp=timestamp,
+                          contributor=contributor, text=text, sha1=_sha1(text))
+
+def test_import_revisions(db, tmp_path):
+    user = "<username>User</username><id>1</id>"
+    ip = "<ip>127.0.0.1</ip>"
+    dump = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10">
+  <siteinfo>
+    <namespaces>
+      <namespace key="0" case="first-letter" />
+      <namespace key="2" case="first-letter">User</namespace>
+    </namespaces>
+  </siteinfo>
+  <page>
+    <title>Foo bar</title>
+    <ns>0</ns>
+    <id>1</id>{}{}{}
+  </page>
+  <page>
+    <title>User:Some page</title>
+    <ns>2</ns>
+    <id>2</id>
+    <redirect title="Foo bar" />{}
+  </page>
+</mediawiki>
+""".format(_revision(1, 0, "2020-01-01T00:00:00Z", user, "first"),
+           _revision(2, 1, "2020-01-02T00:00:00Z", ip, "second"),
+           # revert to the first revision
+           _revision(3, 2, "2020-01-03T00:00:00Z", user, "first"),
+           _revision(4, 0, "2020-01-04T00:00:00Z", ip, "#REDIRECT [[Foo bar]]"))
+    path = tmp_path / "dump.xml"
+    path.write_text(dump)
+
+    # small batches to test the commits between them
+    db.import_dump(str(path), batch_size=1)
+
+    assert _select(db, db.page.c.page_id, db.page.c.page_namespace, db.page.c.page_title,
+                   db.page.c.page_is_redirect, db.page.c.page_is_new, db.page.c.page_latest) \
+        == [(1, 0, "Foo_bar", False, False, 3), (2, 2, "Some_page", True, True, 4)]
+    assert _select(db, db.revision.c.rev_id, db.revision.c.rev_page, db.revision.c.rev_text_id,
+                   db.revision.c.rev_user, db.revision.c.rev_user_text) \
+        == [(1, 1, 1, 1, "User"), (2, 1, 2, 0, "127.0.0.1"), (3, 1, 1, 1, "User"), (4, 2, 3, 0, "127.0.0.1")]
+    assert _select(db, db.text.c.old_id, db.text.c.old_text) \
+        == [(1, "first"), (2, "second"), (3, "#REDIRECT [[Foo bar]]")]
+
+    # the synchronization continues from the newest revision
+    timestamp = datetime.datetime(2020, 1, 4)
+    assert GrabberPages(None, db)._get_sync_timestamp() == timestamp
+    # the revisions grabber resumes its insert with the deleted revisions
+    g = GrabberRevisions(None, db)
+    assert g._get_sync_timestamp() is None
+    assert g._get_sync_checkpoint() == {"timestamp": timestamp, "state": {"list": "alldeletedrevisions", "continue": None}}
+
+    # only the deleted revisions are imported by the first synchronization
+    g = GrabberRevisions(FakeAPI(), db)
+    g.update()
+    assert g.api.lists == ["alldeletedrevisions"]
+    assert g._get_sync_timestamp() == timestamp
+    assert g._get_sync_checkpoint() is None
+    assert len(_select(db, db.revision.c.rev_id)) == 4
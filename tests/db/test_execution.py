@@ -0,0 +1,52 @@
+#! /usr/bin/env python3
+
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
+from ws.db.execution import DeferrableExecutionQueue
+
+def _revision(revid, text_id):
+    return {
+        "rev_id": revid,
+        "rev_page": 1,
+        "rev_text_id": text_id,
+        "rev_comment": "",
+        "rev_user": 1,
+        "rev_user_text": "User",
+        "rev_timestamp": datetime.datetime(2020, 1, 1),
+    }
+
+def _upsert(db):
+    ins = insert(db.revision)
+    return ins.on_conflict_do_update(
+            constraint=db.revision.primary_key,
+            set_={"rev_text_id": ins.excluded.rev_text_id},
+        )
+
+def test_split_conflicts(db):
+    params = [_revision(1, None), _revision(2, None), _revision(1, 5), _revision(3, None), _revision(2, 7)]
+    groups = DeferrableExecutionQueue._split_conflicts(_upsert(db), params)
+    assert groups == [params[:2], params[2:]]
+
+def test_split_conflicts_plain_insert(db):
+    params = [_revision(1, None), _revision(1, 5)]
+    groups = DeferrableExecutionQueue._split_conflicts(db.revision.insert(), params)
+    assert groups == [params]
+
+def test_duplicate_upserts(db):
+    params = [_revision(1, None), _revision(2, None), _revision(1, 5), _revision(3, None), _revision(2, 7)]
+    with db.engine.connect() as conn:
+        # the foreign keys are deferred, so the rows are valid until the end
+        # of the transaction
+        trans = conn.begin()
+        try:
+            upsert = _upsert(db)
+            with DeferrableExecutionQueue(conn, 100) as dfe:
+                for entry in params:
+                    dfe.execute(upsert, entry)
+            query = sa.select([db.revision.c.rev_id, db.revision.c.rev_text_id]).order_by(db.revision.c.rev_id)
+            assert [tuple(row) for row in conn.execute(query)] == [(1, 5), (2, 7), (3, None)]
+        finally:
+            trans.rollback()
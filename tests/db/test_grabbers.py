@@ -0,0 +1,463 @@
+#! /usr/bin/env python3
+
+import datetime
+import threading
+import time
+import types
+
+import pytest
+import sqlalchemy as sa
+
+import ws.db.grabbers
+from ws.db.grabbers import GRABBERS, _run_concurrently
+from ws.db.grabbers.GrabberBase import _pipeline, GrabberBase, Checkpoint
+from ws.db.grabbers.page import GrabberPages
+from ws.db.grabbers.revision import GrabberRevisions
+
+from fixtures.wiki_db import wiki_timestamp
+
+class FakeGrabber:
+    def __init__(self, name, depends, log, *, barrier=None, exception=None):
+        self.name = name
+        self.DEPENDS = depends
+        self.log = log
+        self.barrier = barrier
+        self.exception = exception
+
+    def update(self):
+        self.log.append(("start", self.name))
+        if self.barrier is not None:
+            # fails unless all parties run concurrently
+            self.barrier.wait(timeout=5)
+        if self.exception is not None:
+            raise self.exception
+        self.log.append(("finish", self.name))
+
+def _make_grabbers(graph, log, **kwargs):
+    return {name: FakeGrabber(name, depends, log, **kwargs.get(name, {})) for name, depends in graph.items()}
+
+class test_run_concurrently:
+    graph = {
+        "A": [],
+        "B": ["A"],
+        "C": ["A"],
+        "D": ["B", "C"],
+        "E": [],
+    }
+
+    @pytest.mark.parametrize("max_workers", [1, 2, 4])
+    def test_dependency_order(self, max_workers):
+        log = []
+        callbacks = []
+        grabbers = _make_grabbers(self.graph, log)
+        _run_concurrently(grabbers, max_workers=max_workers, callback=lambda name: callbacks.append(name))
+
+        assert sorted(name for event, name in log if event == "finish") == sorted(self.graph)
+        assert sorted(callbacks) == sorted(self.graph)
+        for name, depends in self.graph.items():
+            start = log.index(("start", name))
+            for dep in depends:
+                assert log.index(("finish", dep)) < start
+
+    def test_callback_before_dependents(self):
+        log = []
+        grabbers = _make_grabbers(self.graph, log)
+        _run_concurrently(grabbers, max_workers=4, callback=lambda name: log.append(("callback", name)))
+        for name, depends in self.graph.items():
+            start = log.index(("start", name))
+            for dep in depends:
+                assert log.index(("callback", dep)) < start
+
+    def test_independent_run_concurrently(self):
+        log = []
+        barrier = threading.Barrier(2)
+        graph = {"A": [], "B": [], "C": ["A", "B"]}
+        grabbers = _make_grabbers(graph, log, A={"barrier": barrier}, B={"barrier": barrier})
+        _run_concurrently(grabbers, max_workers=2)
+        assert log[-1] == ("finish", "C")
+
+    def test_missing_dependency_ignored(self):
+        log = []
+        grabbers = _make_grabbers({"A": ["Missing"]}, log)
+        _run_concurrently(grabbers, max_workers=2)
+        assert log == [("start", "A"), ("finish", "A")]
+
+    def test_circular_dependencies(self):
+        log = []
+        graph = {"A": [], "B": ["A", "C"], "C": ["B"]}
+        grabbers = _make_grabbers(graph, log)
+        with pytest.raises(ValueError, match="Circular dependencies between grabbers: B, C"):
+            _run_concurrently(grabbers, max_workers=2)
+        assert log == [("start", "A"), ("finish", "A")]
+
+    def test_exception(self):
+        log = []
+        graph = {"A": [], "B": ["A"]}
+        grabbers = _make_grabbers(graph, log, A={"exception": RuntimeError("failed")})
+        with pytest.raises(RuntimeError, match="failed"):
+            _run_concurrently(grabbers, max_workers=2)
+        # dependents of the failed grabber are not started
+        assert ("start", "B") not in log
+
+def test_grabbers_depends():
+    names = {cls.__name__ for cls in GRABBERS}
+    for cls in GRABBERS:
+        assert set(cls.DEPENDS) <= names, cls.__name__
+    # the dependencies are acyclic
+    log = []
+    grabbers = {cls.__name__: FakeGrabber(cls.__name__, cls.DEPENDS, log) for cls in GRABBERS}
+    _run_concurrently(grabbers, max_workers=4)
+    assert len(log) == 2 * len(GRABBERS)
+
+class test_pipeline:
+    @staticmethod
+    def _producer_threads():
+        return [t for t in threading.enumerate() if t.name == "pipeline-producer"]
+
+    def test_items(self):
+        assert list(_pipeline((i for i in range(100)), 10)) == list(range(100))
+        assert self._producer_threads() == []
+
+    def test_empty(self):
+        assert list(_pipeline((i for i in []), 10)) == []
+
+    def test_exception_propagation(self):
+        def gen():
+            yield 1
+            yield 2
+            raise RuntimeError("producer failed")
+
+        items = []
+        with pytest.raises(RuntimeError, match="producer failed"):
+            for item in _pipeline(gen(), 10):
+                items.append(item)
+        assert items == [1, 2]
+        assert self._producer_threads() == []
+
+    def test_bounded(self):
+        produced = []
+        def gen():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        pipeline = _pipeline(gen(), 5)
+        assert next(pipeline) == 0
+        # give the producer time to fill the queue
+        time.sleep(0.2)
+        # the queue, the item being put and the item being consumed
+        assert len(produced) <= 5 + 2
+        pipeline.close()
+        assert self._producer_threads() == []
+
+    @pytest.mark.parametrize("stop", ["break", "exception"])
+    def test_producer_shutdown(self, stop):
+        closed = threading.Event()
+        def gen():
+            try:
+                i = 0
+                while True:
+                    yield i
+                    i += 1
+            finally:
+                closed.set()
+
+        pipeline = _pipeline(gen(), 5)
+        try:
+            for item in pipeline:
+                if item == 3:
+                    if stop == "break":
+                        break
+                    raise KeyError(item)
+        except KeyError:
+            pass
+        # the generator is closed by the pipeline at the end of the for loop
+        # (or when the exception propagates through it)
+        pipeline.close()
+        assert closed.wait(timeout=5)
+        assert self._producer_threads() == []
+
+class CheckpointGrabber(GrabberBase):
+    """
+    Inserts users with the given names and yields a checkpoint after each
+    user. Raises ``exception`` instead of inserting the user at the index
+    ``fail_at``.
+    """
+    INSERT_PREDELETE_TABLES = ["user"]
+    CHECKPOINT_INTERVAL = 2
+
+    def __init__(self, db, names, *, fail_at=None, exception=RuntimeError):
+        super().__init__(None, db)
+        self.names = names
+        self.fail_at = fail_at
+        self.exception = exception
+        # states from which gen_insert started
+        self.started = []
+
+    def gen_insert(self):
+        self.started.append(self.checkpoint)
+        start = self.checkpoint["next"] if self.checkpoint is not None else 0
+        for i in range(start, len(self.names)):
+            if i == self.fail_at:
+                raise self.exception("failed at {}".format(i))
+            yield self.db.user.insert(), {"user_id": i + 1, "user_name": self.names[i]}
+            yield Checkpoint({"next": i + 1})
+
+def _user_names(db):
+    with db.engine.connect() as conn:
+        return [row[0] for row in conn.execute(sa.select([db.user.c.user_name]).order_by(db.user.c.user_id))]
+
+class test_checkpoints:
+    names = ["User {}".format(i) for i in range(7)]
+
+    @pytest.mark.parametrize("exception", [RuntimeError, KeyboardInterrupt])
+    def test_failure_after_checkpoint(self, db, exception):
+        g = CheckpointGrabber(db, self.names, fail_at=5, exception=exception)
+        with pytest.raises(exception):
+            g.insert()
+        # the rows before the last committed checkpoint are kept
+        assert _user_names(db) == self.names[:4]
+        checkpoint = g._get_sync_checkpoint()
+        assert checkpoint["state"] == {"next": 4}
+        assert g._get_sync_timestamp() is None
+
+    def test_failure_before_checkpoint(self, db):
+        g = CheckpointGrabber(db, self.names, fail_at=1)
+        with pytest.raises(RuntimeError):
+            g.insert()
+        assert _user_names(db) == []
+        assert g._get_sync_checkpoint() is None
+        assert g._get_sync_timestamp() is None
+
+    def test_resume(self, db):
+        g = CheckpointGrabber(db, self.names, fail_at=5)
+        with pytest.raises(RuntimeError):
+            g.insert()
+        timestamp = g._get_sync_checkpoint()["timestamp"]
+
+        # the next update resumes the insert without the predelete
+        g = CheckpointGrabber(db, self.names)
+        g.update()
+        assert g.started == [{"next": 4}]
+        assert _user_names(db) == self.names
+        # the changes since the start of the interrupted insert are left for
+        # the next update
+        assert g._get_sync_timestamp() == timestamp
+        assert g._get_sync_checkpoint() is None
+
+    def test_insert_from_scratch(self, db):
+        g = CheckpointGrabber(db, self.names)
+        g.insert()
+        assert g.started == [None]
+        assert _user_names(db) == self.names
+
+        # without a checkpoint, the next insert deletes the old rows
+        g = CheckpointGrabber(db, ["Other user"])
+        g.insert()
+        assert g.started == [None]
+        assert _user_names(db) == ["Other user"]
+
+    def test_set_sync_timestamp_clears_checkpoint(self, db):
+        g = CheckpointGrabber(db, self.names)
+        g._set_sync_timestamp(datetime.datetime(2020, 1, 1))
+        with db.engine.begin() as conn:
+            g._set_sync_checkpoint(datetime.datetime(2020, 1, 2), {"next": 3}, conn)
+        # the checkpoint does not change the timestamp
+        assert g._get_sync_timestamp() == datetime.datetime(2020, 1, 1)
+        assert g._get_sync_checkpoint() == {"timestamp": datetime.datetime(2020, 1, 2), "state": {"next": 3}}
+
+        g._set_sync_timestamp(datetime.datetime(2020, 1, 3))
+        assert g._get_sync_timestamp() == datetime.datetime(2020, 1, 3)
+        assert g._get_sync_checkpoint() is None
+
+class FakeRevisionsAPI:
+    """
+    Serves ``list=allrevisions`` from the given revisions of page 1, one
+    revision per chunk, filtered by the ``arvstart`` and ``arvend``
+    parameters. Raises an exception instead of the chunk with the index
+    ``fail_at[1]`` in the window starting at ``fail_at[0]``.
+    """
+    def __init__(self, timestamps, *, fail_at=None):
+        self.timestamps = sorted(timestamps)
+        self.fail_at = fail_at
+        # (list, arvstart, continue) of the list_chunks calls
+        self.chunks = []
+
+    def call_api(self, params):
+        assert params["list"] == "allrevisions"
+        if not self.timestamps:
+            return {"allrevisions": []}
+        return {"allrevisions": [{"pageid": 1, "revisions": [{"timestamp": self.timestamps[0]}]}]}
+
+    def list_chunks(self, params, *, continue_=None):
+        self.chunks.append((params["list"], params.get("arvstart"), continue_))
+        if params["list"] != "allrevisions":
+            return
+        start = params.get("arvstart", datetime.datetime.min)
+        end = params.get("arvend", datetime.datetime.max)
+        timestamps = [t for t in self.timestamps if start <= t <= end]
+        for i in range(continue_ or 0, len(timestamps)):
+            if self.fail_at == (params.get("arvstart"), i):
+                raise RuntimeError("failed at {}".format(i))
+            revid = 100 + self.timestamps.index(timestamps[i])
+            rev = {
+                "revid": revid,
+                "timestamp": timestamps[i],
+                "comment": "",
+                "userid": 1,
+                "user": "User",
+                "size": 0,
+                "sha1": "{:040x}".format(revid),
+                "slots": {"main": {"contentmodel": "wikitext"}},
+            }
+            yield [{"pageid": 1, "revisions": [rev]}], (i + 1 if i + 1 < len(timestamps) else None)
+
+class test_revision_partitions:
+    @pytest.mark.parametrize("partitions, sync_minutes, expected", [
+        (1, 180, [(None, None)]),
+        (3, 180, [(None, 59 * 60 + 59), (60 * 60, 119 * 60 + 59), (120 * 60, None)]),
+        # the boundaries are truncated to seconds
+        (3, 10 / 60, [(None, 2), (3, 5), (6, None)]),
+    ])
+    def test_windows(self, db, partitions, sync_minutes, expected):
+        oldest = datetime.datetime(2020, 1, 1)
+        g = GrabberRevisions(FakeRevisionsAPI([oldest]), db, partitions=partitions)
+        windows = g._get_partition_windows(oldest + datetime.timedelta(minutes=sync_minutes))
+        def offset(t):
+            return None if t is None else int((t - oldest).total_seconds())
+        assert [(offset(w["start"]), offset(w["end"])) for w in windows] == expected
+
+    def test_windows_empty_wiki(self, db):
+        g = GrabberRevisions(FakeRevisionsAPI([]), db, partitions=3)
+        assert g._get_partition_windows(datetime.datetime(2020, 1, 1)) == [{"start": None, "end": None}]
+
+    def test_resume(self, db, wiki, monkeypatch):
+        # page 1 with revision 1
+        wiki.create("Foo", "foo", datetime.datetime(2020, 1, 1))
+        # commit after each chunk
+        monkeypatch.setattr(GrabberRevisions, "CHECKPOINT_INTERVAL", 1)
+
+        # three revisions in each of the three hour-long windows until now
+        oldest = datetime.datetime.utcnow().replace(microsecond=0) - datetime.timedelta(hours=3)
+        timestamps = [oldest] + [oldest + datetime.timedelta(minutes=m) for m in [10, 30, 50, 70, 90, 110, 130, 150, 170]]
+        second_window = oldest + datetime.timedelta(hours=1)
+
+        api = FakeRevisionsAPI(timestamps, fail_at=(second_window, 2))
+        g = GrabberRevisions(api, db, partitions=3)
+        with pytest.raises(RuntimeError):
+            g.insert()
+        checkpoint = g._get_sync_checkpoint()
+        windows = checkpoint["state"]["windows"]
+        assert [w["start"] for w in windows] == [None, second_window, oldest + datetime.timedelta(hours=2)]
+        assert g._get_sync_timestamp() is None
+        # the other partitions are finished and the failed one is committed
+        # up to the last checkpoint
+        parts = [g._get_partition(i, window) for i, window in enumerate(windows)]
+        assert [part._get_sync_timestamp() is not None for part in parts] == [True, False, True]
+        assert parts[1]._get_sync_checkpoint()["state"] == {"list": "allrevisions", "continue": 2}
+        with db.engine.connect() as conn:
+            revids = {row[0] for row in conn.execute(sa.select([db.revision.c.rev_id]))}
+        assert revids == {1} | set(range(100, 106)) | set(range(107, 110))
+
+        # the partitions are taken from the checkpoint, only the failed one
+        # is resumed
+        api = FakeRevisionsAPI(timestamps)
+        g = GrabberRevisions(api, db, partitions=1)
+        g.insert()
+        assert api.chunks == [("allrevisions", second_window, 2)]
+        with db.engine.connect() as conn:
+            revids = {row[0] for row in conn.execute(sa.select([db.revision.c.rev_id]))}
+            keys = {row[0] for row in conn.execute(sa.select([db.ws_sync.c.wss_key]))}
+        assert revids == {1} | set(range(100, 110))
+        assert g._get_sync_timestamp() == checkpoint["timestamp"]
+        assert g._get_sync_checkpoint() is None
+        # the keys of the partitions are removed
+        assert keys == {"GrabberRevisions"}
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 4, 100])
+def test_select_existing(db, chunk_size):
+    with db.engine.begin() as conn:
+        conn.execute(db.user.insert(), [
+            {"user_id": i, "user_name": "User {}".format(i)} for i in range(1, 6)
+        ])
+    db.chunk_size = chunk_size
+    g = GrabberBase(None, db)
+
+    statements = []
+    @sa.event.listens_for(db.engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    try:
+        values = [1, 3, 5, 7, 9, 2, 3]
+        assert g._select_existing(db.user.c.user_id, values) == {1, 2, 3, 5}
+        assert g._select_existing(db.user.c.user_id, []) == set()
+    finally:
+        sa.event.remove(db.engine, "before_cursor_execute", record)
+    # one query per chunk of the values
+    assert len(statements) == -(-len(values) // chunk_size)
+
+class FakeAllPagesAPI:
+    """
+    Serves ``generator=allpages`` with ``prop=info`` from the given pages.
+    """
+    def __init__(self, pages):
+        self.site = types.SimpleNamespace(namespaces={-1: "Special", 0: "", 10: "Template"})
+        self.pages = pages
+
+    def generator(self, params):
+        assert params["generator"] == "allpages"
+        assert params["prop"] == "info"
+        for page in self.pages:
+            if page["ns"] == params["gapnamespace"]:
+                yield dict(page)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_get_outdated_pages(db, wiki, chunk_size):
+    for i, title in enumerate(["Foo", "Bar", "Template:Baz", "Qux"]):
+        wiki.create(title, title, wiki_timestamp(i))
+
+    def info(title, ns, *, lastrevid=None, touched=None):
+        return {
+            "pageid": wiki.pageids[title],
+            "ns": ns,
+            "title": title,
+            "lastrevid": lastrevid or wiki.latest(title),
+            "touched": touched or wiki_timestamp(list(wiki.pageids).index(title)),
+        }
+    listing = [
+        info("Foo", 0),
+        # edited on the wiki
+        info("Bar", 0, lastrevid=100, touched=wiki_timestamp(10)),
+        # missing in the database
+        {"pageid": 99, "ns": 0, "title": "New", "lastrevid": 101, "touched": wiki_timestamp(11)},
+        info("Qux", 0),
+        # touched without a new revision
+        info("Template:Baz", 10, touched=wiki_timestamp(12)),
+    ]
+
+    db.chunk_size = chunk_size
+    g = GrabberPages(FakeAllPagesAPI(listing), db)
+    assert list(g.get_outdated_pages()) == [wiki.pageids["Bar"], 99, wiki.pageids["Template:Baz"]]
+
+@pytest.mark.parametrize("exception", [None, RuntimeError])
+def test_synchronize_releases_feed(db, monkeypatch, exception):
+    feeds = []
+    def run_concurrently(grabbers, **kwargs):
+        feed = grabbers["GrabberPages"].feed
+        # all grabbers share the feed
+        assert all(g.feed is feed for g in grabbers.values())
+        feed._deltas["logevents"] = {"since": None, "entries": [], "indexes": {}}
+        feeds.append(feed)
+        if exception is not None:
+            raise exception
+    monkeypatch.setattr(ws.db.grabbers, "_run_concurrently", run_concurrently)
+
+    # the grabbers check the user rights in their constructors
+    api = types.SimpleNamespace(user=types.SimpleNamespace(rights=set()))
+    if exception is None:
+        ws.db.grabbers.synchronize(db, api, check_needs_update=False)
+    else:
+        with pytest.raises(exception):
+            ws.db.grabbers.synchronize(db, api, check_needs_update=False)
+    assert len(feeds) == 1
+    assert feeds[0]._deltas == {}
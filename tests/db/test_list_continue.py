@@ -0,0 +1,134 @@
+#! /usr/bin/env python3
+
+import datetime
+
+import pytest
+
+from ws.db.selects.SelectBase import SelectBase
+
+@pytest.fixture(scope="function")
+def lists_db(db):
+    """
+    A database with a few rows in the tables of the list modules which support
+    the ``limit`` and ``continue`` parameters. Some timestamps are equal, so
+    that the continuation has to use the secondary key.
+    """
+    def timestamp(i):
+        return datetime.datetime(2020, 1, 1) + datetime.timedelta(minutes=i // 3)
+
+    with db.engine.begin() as conn:
+        conn.execute(db.namespace.insert(), [
+            {"ns_id": 0, "ns_case": "first-letter"},
+        ])
+        conn.execute(db.namespace_name.insert(), [
+            {"nsn_id": 0, "nsn_name": ""},
+        ])
+        conn.execute(db.namespace_starname.insert(), [
+            {"nss_id": 0, "nss_name": ""},
+        ])
+        conn.execute(db.user.insert(), [
+            {"user_id": i, "user_name": "User {}".format(i)}
+            for i in range(1, 12)
+        ])
+        conn.execute(db.page.insert(), [
+            {"page_id": i, "page_namespace": 0, "page_title": "Page {}".format(i),
+             "page_touched": timestamp(i), "page_latest": 100 + 2 * i + 1, "page_len": 0}
+            for i in range(1, 12)
+        ])
+        conn.execute(db.revision.insert(), [
+            {"rev_id": 100 + i, "rev_page": i // 2, "rev_comment": "", "rev_user": 1,
+             "rev_user_text": "User 1", "rev_timestamp": timestamp(i)}
+            for i in range(2, 24)
+        ])
+        conn.execute(db.logging.insert(), [
+            {"log_id": i, "log_type": "create", "log_action": "create", "log_timestamp": timestamp(i),
+             "log_user": 1, "log_user_text": "User 1", "log_namespace": 0,
+             "log_title": "Page {}".format(i), "log_page": i, "log_comment": "", "log_params": {}}
+            for i in range(1, 12)
+        ])
+        conn.execute(db.recentchanges.insert(), [
+            {"rc_id": i, "rc_timestamp": timestamp(i), "rc_user": 1, "rc_user_text": "User 1",
+             "rc_namespace": 0, "rc_title": "Page {}".format(i // 2), "rc_comment": "",
+             "rc_cur_id": i // 2, "rc_this_oldid": 100 + i, "rc_last_oldid": 0, "rc_type": "edit"}
+            for i in range(2, 24)
+        ])
+    return db
+
+def _query_all(db, params, prefix, limit):
+    """
+    Query all results with the given limit and return them as a list of chunks.
+    """
+    chunks = []
+    cont = {}
+    while True:
+        chunk_params = params.copy()
+        chunk_params[prefix + "limit"] = limit
+        chunk_params.update(cont)
+        gen = db.query(chunk_params)
+        chunk = []
+        try:
+            while True:
+                chunk.append(next(gen))
+        except StopIteration as e:
+            cont = e.value
+        chunks.append(chunk)
+        if cont is None:
+            return chunks
+        # check the format of the continuation
+        assert set(cont) == {prefix + "continue", "continue"}
+        assert cont["continue"] == "-||"
+        del cont["continue"]
+
+list_params = [
+    ({"list": "allpages"}, "ap"),
+    ({"list": "allpages", "apdir": "descending"}, "ap"),
+    ({"list": "allusers"}, "au"),
+    ({"list": "allusers", "audir": "descending"}, "au"),
+    ({"list": "allrevisions", "arvprop": {"ids", "timestamp"}}, "arv"),
+    ({"list": "allrevisions", "arvprop": {"ids", "timestamp"}, "arvdir": "newer"}, "arv"),
+    ({"list": "logevents", "leprop": {"ids", "timestamp"}}, "le"),
+    ({"list": "logevents", "leprop": {"ids", "timestamp"}, "ledir": "newer"}, "le"),
+    ({"list": "recentchanges", "rcprop": {"ids", "timestamp"}}, "rc"),
+    ({"list": "recentchanges", "rcprop": {"ids", "timestamp"}, "rcdir": "newer"}, "rc"),
+]
+
+@pytest.mark.parametrize("params, prefix", list_params)
+@pytest.mark.parametrize("limit", [1, 3, 4])
+def test_paged_equals_unpaged(lists_db, params, prefix, limit):
+    expected = list(lists_db.query(params.copy()))
+    assert len(expected) > limit
+
+    chunks = _query_all(lists_db, params, prefix, limit)
+    # all chunks except the last one are full
+    assert all(len(chunk) == limit for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= limit
+    assert [item for chunk in chunks for item in chunk] == expected
+
+@pytest.mark.parametrize("params, prefix", list_params)
+def test_limit_not_reached(lists_db, params, prefix):
+    expected = list(lists_db.query(params.copy()))
+    chunks = _query_all(lists_db, params, prefix, len(expected))
+    assert chunks == [expected]
+
+@pytest.mark.parametrize("params, prefix", list_params)
+def test_stop_early(lists_db, params, prefix, monkeypatch):
+    # keep references to the streamed results, otherwise they would be
+    # closed by the garbage collector
+    results = []
+    execute_sql = SelectBase.execute_sql
+    def recording_execute_sql(self, *args, **kwargs):
+        result = execute_sql(self, *args, **kwargs)
+        results.append(result)
+        return result
+    monkeypatch.setattr(SelectBase, "execute_sql", recording_execute_sql)
+
+    # fetch the rows in several batches from the server-side cursor
+    lists_db.fetch_size = 2
+    gen = lists_db.query(params.copy())
+    first = [next(gen) for _ in range(3)]
+    assert lists_db.engine.pool.checkedout() == 1
+    gen.close()
+    assert len(results) == 1
+    assert results[0].closed
+    assert lists_db.engine.pool.checkedout() == 0
+    assert first == list(lists_db.query(params.copy()))[:3]
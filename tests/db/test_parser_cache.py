@@ -0,0 +1,231 @@
+#! /usr/bin/env python3
+
+import re
+
+import mwparserfromhell
+import pytest
+import sqlalchemy as sa
+
+import ws.db.parser_cache
+from ws.db.parser_cache import ParserCache, get_normalized_extlinks
+
+from fixtures.wiki_db import wiki_timestamp
+
+class test_diff:
+    @staticmethod
+    def _section(pageid, number, title):
+        return {
+            "sec_page": pageid,
+            "sec_number": number,
+            "sec_level": 2,
+            "sec_title": title,
+            "sec_anchor": title,
+        }
+
+    @staticmethod
+    def _select(conn, db):
+        query = sa.select([db.section.c.sec_page, db.section.c.sec_number, db.section.c.sec_title])
+        return set(tuple(row) for row in conn.execute(query))
+
+    def _do_test(self, db, existing, new, pageids, expected_returned, expected_rows):
+        cache = ParserCache(db)
+        with db.engine.connect() as conn:
+            # the foreign keys to the page table are deferred, so the rows
+            # are valid until the end of the transaction
+            trans = conn.begin()
+            try:
+                if existing:
+                    conn.execute(db.section.insert(), existing)
+                returned = cache._diff(conn, "section", pageids, new)
+                assert returned == expected_returned
+                assert self._select(conn, db) == expected_rows
+            finally:
+                trans.rollback()
+
+    def test_empty_table(self, db):
+        new = [self._section(1, 1, "A"), self._section(1, 2, "B")]
+        self._do_test(db, [], new, {1}, new, set())
+
+    def test_unchanged(self, db):
+        rows = [self._section(1, 1, "A"), self._section(1, 2, "B")]
+        self._do_test(db, rows, rows, {1}, [], {(1, 1, "A"), (1, 2, "B")})
+
+    def test_removed(self, db):
+        rows = [self._section(1, 1, "A"), self._section(1, 2, "B")]
+        self._do_test(db, rows, rows[:1], {1}, [], {(1, 1, "A")})
+
+    def test_added(self, db):
+        rows = [self._section(1, 1, "A")]
+        new = rows + [self._section(1, 2, "B")]
+        self._do_test(db, rows, new, {1}, new[1:], {(1, 1, "A")})
+
+    def test_changed_non_key_value(self, db):
+        # the old row has the same primary key, so it must be deleted before
+        # the returned entry is inserted
+        rows = [self._section(1, 1, "A"), self._section(1, 2, "B")]
+        new = [self._section(1, 1, "A"), self._section(1, 2, "C")]
+        self._do_test(db, rows, new, {1}, new[1:], {(1, 1, "A")})
+
+    def test_duplicates(self, db):
+        new = [self._section(1, 1, "A"), self._section(1, 1, "A")]
+        self._do_test(db, [], new, {1}, new[:1], set())
+
+    def test_other_pages_untouched(self, db):
+        rows = [self._section(1, 1, "A"), self._section(2, 1, "A")]
+        self._do_test(db, rows, [], {1}, [], {(2, 1, "A")})
+
+class test_get_normalized_extlinks:
+    snippets = [
+        ("http://example.com/foo", ["http://example.com/foo"]),
+        ("plain http://a.b/c and [https://d.e/f?g=h#i text]", ["http://a.b/c", "https://d.e/f?g=h#i"]),
+        # templates and HTML entities are re-parsed
+        ("[http://example.com/{{Dead link}} foo]", ["http://example.com/{{Dead link}}"]),
+        ("[http://example.com/a&amp;b title]", ["http://example.com/a&amp;b"]),
+        # tags terminate the URL
+        ("http://example.com/<span>x</span>", ["http://example.com/"]),
+        # percent-encoding is decoded
+        ("http://example.com/%C3%A9", ["http://example.com/\u00e9"]),
+        # ports
+        ("http://example.com:8080/x", ["http://example.com:8080/x"]),
+        ("http://example.com:99999/x", []),
+        ("[http://example.com:abc/ x]", []),
+        # empty host
+        ("http://", []),
+        ("[http:///var/run x]", []),
+        ("[http://git@ x]", []),
+        ("[mailto:user@host x]", ["mailto:user@host"]),
+    ]
+
+    @staticmethod
+    def _urls(snippet):
+        wikicode = mwparserfromhell.parse(snippet)
+        return [str(el.url) for el in get_normalized_extlinks(wikicode)]
+
+    @pytest.mark.parametrize("snippet, expected", snippets)
+    def test_normalized(self, snippet, expected):
+        assert self._urls(snippet) == expected
+
+    @pytest.mark.parametrize("snippet, expected", snippets)
+    def test_fast_path_equivalence(self, monkeypatch, snippet, expected):
+        fast = self._urls(snippet)
+        # disable the fast path: re-parse all links and validate all URLs
+        # with urllib3
+        monkeypatch.setattr(ws.db.parser_cache, "_needs_reparse", lambda el: True)
+        monkeypatch.setattr(ws.db.parser_cache, "_simple_url_re", re.compile(r"(?!)"))
+        assert self._urls(snippet) == fast
+
+class test_update:
+    @pytest.fixture(scope="function")
+    def cache(self, db, wiki):
+        wiki.create("Template:A", "a", wiki_timestamp(1))
+        wiki.create("Template:B", "{{A}}", wiki_timestamp(2))
+        wiki.create("Foo", "{{B}} [[Bar]]\n== Section ==", wiki_timestamp(3))
+        wiki.create("Bar", "[[Foo]]", wiki_timestamp(4))
+        # touched at the same time as the newest page
+        wiki.create("Baz", "baz", wiki_timestamp(4))
+        cache = ParserCache(db)
+        cache.update()
+        assert self._parsed(cache) == {"Template:A", "Template:B", "Foo", "Bar", "Baz"}
+        return cache
+
+    @staticmethod
+    def _parsed(cache):
+        return set(entry["title"] for entry in cache.stats)
+
+    @staticmethod
+    def _watermark(db):
+        query = sa.select([db.ws_sync.c.wss_timestamp]).where(db.ws_sync.c.wss_key == "ParserCache")
+        with db.engine.connect() as conn:
+            return conn.execute(query).scalar()
+
+    @staticmethod
+    def _sync_revids(db):
+        query = sa.select([db.ws_parser_cache_sync.c.wspc_page_id, db.ws_parser_cache_sync.c.wspc_rev_id])
+        with db.engine.connect() as conn:
+            return dict(tuple(row) for row in conn.execute(query))
+
+    def test_nothing_changed(self, db, wiki, cache):
+        assert self._watermark(db) == wiki_timestamp(4)
+        cache.update()
+        assert self._parsed(cache) == set()
+        assert self._watermark(db) == wiki_timestamp(4)
+
+    def test_touched_page(self, db, wiki, cache):
+        revid = wiki.edit("Bar", "[[Foo]] [[Baz]]", wiki_timestamp(5))
+        cache.update()
+        assert self._parsed(cache) == {"Bar"}
+        assert self._sync_revids(db)[wiki.pageids["Bar"]] == revid
+        assert self._watermark(db) == wiki_timestamp(5)
+        query = sa.select([db.pagelinks.c.pl_title]).where(db.pagelinks.c.pl_from == wiki.pageids["Bar"])
+        with db.engine.connect() as conn:
+            assert set(row[0] for row in conn.execute(query)) == {"Foo", "Baz"}
+
+    def test_touched_at_watermark(self, db, wiki, cache):
+        # a page synchronized after the last update with the same page_touched
+        # as the watermark
+        wiki.edit("Baz", "baz 2", wiki_timestamp(4))
+        cache.update()
+        # Bar is touched at the watermark too, but it is not outdated
+        assert self._parsed(cache) == {"Baz"}
+        assert self._watermark(db) == wiki_timestamp(4)
+
+    def test_touched_without_new_revision(self, db, wiki, cache):
+        # pages touched after the watermark are parsed even if their revision
+        # was already parsed
+        wiki.touch("Foo", wiki_timestamp(5))
+        cache.update()
+        assert self._parsed(cache) == {"Foo"}
+
+    def test_transclusion_chain(self, db, wiki, cache):
+        # Foo transcludes Template:A through Template:B
+        wiki.edit("Template:A", "a 2", wiki_timestamp(5))
+        cache.update()
+        assert self._parsed(cache) == {"Template:A", "Template:B", "Foo"}
+
+    def test_transclusion_closure(self, db, wiki, cache):
+        page = db.page
+        seed = sa.select([page.c.page_id, page.c.page_namespace, page.c.page_title]) \
+                 .where(page.c.page_id == wiki.pageids["Template:A"])
+        with db.engine.connect() as conn:
+            rows = conn.execute(cache._transclusion_closure(seed))
+            pageids = set(row["page_id"] for row in rows)
+        assert pageids == {wiki.pageids[title] for title in ["Template:A", "Template:B", "Foo"]}
+
+    def test_not_incremental(self, db, wiki, cache):
+        # the full scan takes only pages with outdated revisions
+        wiki.touch("Foo", wiki_timestamp(5))
+        wiki.edit("Bar", "[[Foo]] [[Baz]]", wiki_timestamp(3), touched=wiki_timestamp(3))
+        cache.update(incremental=False)
+        assert self._parsed(cache) == {"Bar"}
+
+    def test_invalidate_all(self, db, wiki, cache):
+        cache.invalidate_all()
+        assert self._watermark(db) is None
+        cache.update()
+        assert self._parsed(cache) == {"Template:A", "Template:B", "Foo", "Bar", "Baz"}
+
+    def test_report(self, db, wiki, cache):
+        report = cache.get_report(slowest=2)
+        assert report["pages"] == 5
+        assert report["duration"] > 0
+        assert report["parse_time"] == pytest.approx(sum(entry["parse_time"] for entry in cache.stats))
+        assert report["pages_per_second"] == pytest.approx(5 / report["duration"])
+        assert len(report["slowest"]) == 2
+        assert report["slowest"][0]["parse_time"] >= report["slowest"][1]["parse_time"]
+
+        stats = {entry["title"]: entry for entry in cache.stats}
+        foo = stats["Foo"]
+        assert foo["pageid"] == wiki.pageids["Foo"]
+        assert foo["content_size"] == len("{{B}} [[Bar]]\n== Section ==")
+        assert foo["templates_fetched"] == 2
+        assert foo["links"]["templatelinks"] == 2
+        assert foo["links"]["pagelinks"] == 1
+        assert foo["links"]["section"] == 1
+        assert foo["links"]["categorylinks"] == 0
+        assert stats["Template:A"]["templates_fetched"] == 0
+
+    def test_report_nothing_parsed(self, db, wiki, cache):
+        cache.update()
+        report = cache.get_report()
+        assert report["pages"] == 0
+        assert report["slowest"] == []
@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+
+import pytest
+
+from fixtures.wiki_db import wiki_timestamp
+
+TITLES = ["Page {}".format(i) for i in range(1, 8)]
+
+@pytest.fixture(scope="function")
+def pages(db, wiki):
+    for i, title in enumerate(TITLES):
+        wiki.create(title, "content of {}".format(title), wiki_timestamp(i))
+    # one more revision of a page in the middle
+    wiki.edit("Page 4", "new content of Page 4", wiki_timestamp(10))
+    return wiki
+
+def _query(db, **params):
+    return list(db.query(prop="latestrevisions", rvprop={"ids", "content"}, **params))
+
+def _check_revisions(pages, result):
+    for page in result:
+        title = page["title"]
+        assert len(page["revisions"]) == 1
+        assert page["revisions"][0]["revid"] == pages.latest(title)
+        if title == "Page 4":
+            assert page["revisions"][0]["*"] == "new content of Page 4"
+        else:
+            assert page["revisions"][0]["*"] == "content of {}".format(title)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 100])
+def test_chunks(db, pages, chunk_size):
+    expected = _query(db, pageids=set(pages.pageids.values()))
+    assert [page["title"] for page in expected] == TITLES
+    _check_revisions(pages, expected)
+
+    db.chunk_size = chunk_size
+    db.fetch_size = 2
+    result = _query(db, pageids=set(pages.pageids.values()))
+    assert result == expected
+
+@pytest.mark.parametrize("chunk_size", [2, 3])
+def test_chunks_titles_missing(db, pages, chunk_size):
+    db.chunk_size = chunk_size
+    titles = set(TITLES[1:6]) | {"Missing"}
+    result = _query(db, titles=titles)
+    assert result[0] == {"missing": "", "ns": 0, "title": "Missing"}
+    assert [page["title"] for page in result[1:]] == TITLES[1:6]
+    _check_revisions(pages, result[1:])
+
+def test_select_cache(db, pages):
+    db.select_cache.clear()
+    ids = pages.pageids
+    first = _query(db, pageids={ids["Page 1"], ids["Page 2"]})
+    assert len(db.select_cache) == 1
+    cached = list(db.select_cache.values())[0]
+
+    # same shape of the parameters, different pageset
+    second = _query(db, pageids={ids["Page 3"], ids["Page 4"], ids["Page 5"]})
+    assert len(db.select_cache) == 1
+    assert list(db.select_cache.values())[0] is cached
+    assert [page["title"] for page in first] == ["Page 1", "Page 2"]
+    assert [page["title"] for page in second] == ["Page 3", "Page 4", "Page 5"]
+    _check_revisions(pages, first + second)
+
+    # titles= and different props are cached separately
+    third = _query(db, titles={"Page 6"})
+    assert [page["title"] for page in third] == ["Page 6"]
+    list(db.query(pageids={ids["Page 1"]}, prop="info"))
+    assert len(db.select_cache) == 3
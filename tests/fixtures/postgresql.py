@@ -14,6 +14,17 @@ postgresql = factories.postgresql("postgresql_proc", db_name=db_name)
 
 @pytest.fixture(scope="function")
 def pg_engine(postgresql):
-    return sqlalchemy.create_engine("postgresql+psycopg2://", poolclass=sqlalchemy.pool.StaticPool, creator=lambda: postgresql)
+    # The engine opens its own connections to the test database like in
+    # production, because streamed queries cannot share the connection with
+    # ws.db.database.Database.connection.
+    dsn = postgresql.get_dsn_parameters()
+    url = sqlalchemy.engine.url.URL("postgresql+psycopg2",
+                                    username=dsn.get("user"),
+                                    host=dsn.get("host"),
+                                    port=dsn.get("port"),
+                                    database=dsn.get("dbname"))
+    engine = sqlalchemy.create_engine(url, executemany_mode="values")
+    yield engine
+    engine.dispose()
 
 __all__ = ("postgresql_proc", "postgresql", "pg_engine")
@@ -0,0 +1,135 @@
+#! /usr/bin/env python3
+
+import datetime
+
+import pytest
+import sqlalchemy as sa
+
+# namespaces of a default MediaWiki installation (without the project namespaces)
+namespaces = {
+    -2: "Media",
+    -1: "Special",
+    0: "",
+    1: "Talk",
+    2: "User",
+    3: "User talk",
+    6: "File",
+    7: "File talk",
+    8: "MediaWiki",
+    9: "MediaWiki talk",
+    10: "Template",
+    11: "Template talk",
+    14: "Category",
+    15: "Category talk",
+}
+
+def wiki_timestamp(minutes):
+    return datetime.datetime(2020, 1, 1) + datetime.timedelta(minutes=minutes)
+
+class WikiWriter:
+    """
+    Creates and edits pages directly in the database tables, bypassing the
+    grabbers. Each edit creates a new revision with its own text row.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.pageids = {}
+        self._next_pageid = 1
+        self._next_revid = 1
+
+        with db.engine.begin() as conn:
+            conn.execute(db.namespace.insert(), [
+                {"ns_id": ns, "ns_case": "first-letter"} for ns in namespaces
+            ])
+            conn.execute(db.namespace_name.insert(), [
+                {"nsn_id": ns, "nsn_name": name} for ns, name in namespaces.items()
+            ])
+            conn.execute(db.namespace_starname.insert(), [
+                {"nss_id": ns, "nss_name": name} for ns, name in namespaces.items()
+            ])
+            conn.execute(db.namespace_canonical.insert(), [
+                {"nsc_id": ns, "nsc_name": name} for ns, name in namespaces.items() if ns != 0
+            ])
+            conn.execute(db.user.insert(), {"user_id": 1, "user_name": "User"})
+        db.invalidate_title_context()
+
+    def _insert_revision(self, conn, pageid, content, timestamp):
+        revid = self._next_revid
+        self._next_revid += 1
+        conn.execute(self.db.text.insert(), {"old_id": revid, "old_text": content})
+        conn.execute(self.db.revision.insert(), {
+            "rev_id": revid,
+            "rev_page": pageid,
+            "rev_text_id": revid,
+            "rev_comment": "",
+            "rev_user": 1,
+            "rev_user_text": "User",
+            "rev_timestamp": timestamp,
+            "rev_len": len(content),
+        })
+        return revid
+
+    def create(self, title, content, timestamp):
+        """
+        Create a page and return its ID.
+
+        :param str title: full title of the page (including the namespace prefix)
+        """
+        title_obj = self.db.Title(title)
+        pageid = self._next_pageid
+        self._next_pageid += 1
+        with self.db.engine.begin() as conn:
+            revid = self._insert_revision(conn, pageid, content, timestamp)
+            conn.execute(self.db.page.insert(), {
+                "page_id": pageid,
+                "page_namespace": title_obj.namespacenumber,
+                "page_title": title_obj.dbtitle(),
+                "page_is_new": True,
+                "page_touched": timestamp,
+                "page_latest": revid,
+                "page_len": len(content),
+                "page_content_model": "wikitext",
+                "page_lang": "en",
+            })
+        self.pageids[title] = pageid
+        return pageid
+
+    def edit(self, title, content, timestamp, *, touched=None):
+        """
+        Create a new revision of a page. ``page_touched`` is set to
+        ``touched``, which defaults to ``timestamp``.
+        """
+        pageid = self.pageids[title]
+        with self.db.engine.begin() as conn:
+            revid = self._insert_revision(conn, pageid, content, timestamp)
+            conn.execute(self.db.page.update().where(self.db.page.c.page_id == pageid).values(
+                page_is_new=False,
+                page_touched=touched or timestamp,
+                page_latest=revid,
+                page_len=len(content),
+            ))
+        return revid
+
+    def touch(self, title, timestamp):
+        """
+        Set ``page_touched`` of a page without creating a new revision.
+        """
+        with self.db.engine.begin() as conn:
+            conn.execute(self.db.page.update().where(self.db.page.c.page_id == self.pageids[title]).values(
+                page_touched=timestamp,
+            ))
+
+    def latest(self, title):
+        with self.db.engine.connect() as conn:
+            query = sa.select([self.db.page.c.page_latest]).where(self.db.page.c.page_id == self.pageids[title])
+            return conn.execute(query).scalar()
+
+@pytest.fixture(scope="function")
+def wiki(db):
+    """
+    Return a :py:class:`WikiWriter` for the database fixture, which contains
+    only the default namespaces and a single user.
+    """
+    return WikiWriter(db)
+
+__all__ = ("namespaces", "wiki_timestamp", "WikiWriter", "wiki")
@@ -1,6 +1,8 @@
 #! /usr/bin/env python3
 
+import collections.abc
 import hashlib
+import itertools
 import logging
 
 from ..utils import RateLimited, LazyProperty
@@ -192,7 +194,10 @@ class API(Connection):
         Note that this is applicable only to the ``titles``, ``pageids`` and
         ``revids`` API parameters which have to be supplied as :py:type:`list`
         or :py:type:`set` to this method. Exactly one of these parameters has
-        to be supplied.
+        to be supplied. Lists and sets are sorted before splitting. The values
+        can be also supplied as an iterator, which is consumed lazily (one
+        chunk at a time) in the given order, so it may be used to process more
+        values than would fit into memory.
 
         The parameters have the same meaning as those in the
         :py:meth:`Connection.call_api` method.
@@ -220,16 +225,21 @@ class API(Connection):
             raise ValueError("neither of the parameters titles, pageids or revids is present")
 
         iter_values = params[iter_key]
-        if not isinstance(iter_values, list) and not isinstance(iter_values, set):
-            raise TypeError("the value of the parameter '{}' must be either a list or a set".format(iter_key))
-        # code below expects a list
-        iter_values = sorted(iter_values)
+        if isinstance(iter_values, list) or isinstance(iter_values, set):
+            iter_values = iter(sorted(iter_values))
+        elif not isinstance(iter_values, collections.abc.Iterator):
+            raise TypeError("the value of the parameter '{}' must be either a list, a set or an iterator".format(iter_key))
 
         chunk_size = self.max_ids_per_query
-        while iter_values:
-            logger.debug("call_api_autoiter_ids: current chunk size is {}".format(chunk_size))
+        # values taken from the iterator, but not processed yet
+        pending = []
+        while True:
             # take the next chunk
-            chunk = iter_values[:chunk_size]
+            pending.extend(itertools.islice(iter_values, max(0, chunk_size - len(pending))))
+            if not pending:
+                break
+            chunk = pending[:chunk_size]
+            logger.debug("call_api_autoiter_ids: current chunk size is {}".format(len(chunk)))
             # update params
             params[iter_key] = "|".join(str(v) for v in chunk)
             # call
@@ -257,9 +267,10 @@ class API(Connection):
                     yield chunk_result[action]
                 else:
                     raise APIExpandResultFailed
-            yield chunk_result
+            else:
+                yield chunk_result
             # remove the processed values
-            iter_values = iter_values[chunk_size:]
+            del pending[:len(chunk)]
 
     def query_continue(self, params=None, **kwargs):
         """
@@ -285,8 +296,11 @@ class API(Connection):
             params = params.copy()
         params["action"] = "query"
 
-        last_continue = {"continue": ""}
+        for query, _ in self._query_continue(params, {"continue": ""}):
+            if query is not None:
+                yield query
 
+    def _query_continue(self, params, last_continue):
         while True:
             # clone the original params to clean up old continue params
             params_copy = params.copy()
@@ -295,11 +309,10 @@ class API(Connection):
             params_copy.update(last_continue)
             # call the API and handle the result
             result = self.call_api(params_copy, expand_result=False)
-            if "query" in result:
-                yield result["query"]
-            if "continue" not in result:
+            last_continue = result.get("continue")
+            yield result.get("query"), last_continue
+            if last_continue is None:
                 break
-            last_continue = result["continue"]
 
     def generator(self, params=None, **kwargs):
         """
@@ -368,6 +381,35 @@ class API(Connection):
                 #          {"title": ...}]
                 yield from snippet[list_]
 
+    def list_chunks(self, params, *, continue_=None):
+        """
+        Interface to API:Lists which allows to interrupt the query and resume
+        it later.
+
+        Parameter ``list`` must be supplied. Modules with special structure
+        (``list=querypage``) are not supported.
+
+        :param dict params: same as :py:meth:`API.query_continue`
+        :param dict continue_:
+            the continuation of an interrupted query, i.e. a value previously
+            yielded by this method (``None`` starts from the beginning)
+        :yields: tuples ``(items, continue)``, where ``items`` is the
+            ``"list"`` part of one API response and ``continue`` is the value
+            to be passed as ``continue_`` to resume the query after ``items``
+            (``None`` for the last response)
+        """
+        list_ = params.get("list")
+        if list_ is None:
+            raise ValueError("param 'list' must be supplied")
+        params = params.copy()
+        params["action"] = "query"
+        if continue_ is None:
+            continue_ = {"continue": ""}
+
+        for query, last_continue in self._query_continue(params, continue_):
+            items = query[list_] if query is not None else []
+            yield items, last_continue
+
     @LazyProperty
     def _csrftoken(self):
         logger.debug("Requesting new csrftoken...")
@@ -0,0 +1,138 @@
+#! /usr/bin/env python3
+
+import logging
+import shelve
+from collections import OrderedDict, namedtuple
+
+import sqlalchemy as sa
+
+__all__ = ["ContentCache"]
+
+logger = logging.getLogger(__name__)
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "disk_hits", "misses", "maxsize", "currsize"])
+
+class ContentCache:
+    """
+    Cache for the content of the latest revisions of pages, used by
+    :py:class:`ws.db.parser_cache.ParserCache` for template expansion.
+
+    The entries are keyed by ``(title, page_latest)``, so an entry is
+    invalidated exactly when the latest revision of the page changes. The
+    latest revision IDs are looked up in the ``page`` table only once per title
+    until :py:meth:`reset` is called, i.e. the cache assumes that the database
+    is not synchronized while it is being used.
+
+    The in-memory tier holds at most ``maxsize`` entries and discards the least
+    recently used entries. The optional on-disk tier (a :py:mod:`shelve` file)
+    holds the latest known revision of each title and persists across runs.
+
+    :param db: a :py:class:`ws.db.database.Database` instance
+    :param int maxsize: maximum number of entries in the in-memory tier
+    :param str path: path to the file for the on-disk tier (optional)
+    """
+
+    def __init__(self, db, *, maxsize=1024, path=None):
+        if maxsize <= 0:  # pragma: no cover
+            raise ValueError("maxsize must be positive")
+
+        self.db = db
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.disk = shelve.open(path) if path is not None else None
+        # mapping of titles to the latest revision IDs (None for missing pages)
+        self.latest = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def reset(self):
+        """
+        Forget the latest revision IDs, they will be looked up again on the
+        next access. To be called whenever the database might have been
+        synchronized.
+        """
+        self.latest.clear()
+
+    def close(self):
+        """
+        Close the on-disk tier.
+        """
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    def cache_info(self):
+        """
+        Return the cache statistics, similarly to :py:func:`functools.lru_cache`.
+        """
+        return CacheInfo(self.hits, self.disk_hits, self.misses, self.maxsize, len(self.memory))
+
+    def _get_latest(self, title):
+        key = str(title)
+        if key not in self.latest:
+            page = self.db.page
+            query = sa.select([page.c.page_latest]).where(
+                        (page.c.page_namespace == title.namespacenumber) &
+                        (page.c.page_title == title.dbtitle())
+                    )
+            with self.db.connection() as conn:
+                row = conn.execute(query).fetchone()
+            self.latest[key] = row[0] if row else None
+        return self.latest[key]
+
+    def _fetch(self, revid):
+        rev = self.db.revision
+        text = self.db.text
+        query = sa.select([text.c.old_text]).select_from(
+                    rev.join(text, rev.c.rev_text_id == text.c.old_id)
+                ).where(rev.c.rev_id == revid)
+        with self.db.connection() as conn:
+            row = conn.execute(query).fetchone()
+        if row:
+            return row[0]
+        return None
+
+    def _store(self, key, content):
+        self.memory[key] = content
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def get(self, title):
+        """
+        Get the content of the latest revision of a page.
+
+        :param title: a :py:class:`ws.parser_helpers.title.Title` object
+        :raises ValueError: if the page or its content does not exist
+        """
+        revid = self._get_latest(title)
+        if revid is None:
+            # no revision => page does not exist
+            logger.warning("ParserCache: page not found: {{" + str(title) + "}}")
+            raise ValueError
+
+        key = (str(title), revid)
+        if key in self.memory:
+            self.hits += 1
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        if self.disk is not None:
+            entry = self.disk.get(key[0])
+            if entry is not None and entry[0] == revid:
+                self.disk_hits += 1
+                self._store(key, entry[1])
+                return entry[1]
+
+        self.misses += 1
+        content = self._fetch(revid)
+        if content is None:
+            logger.error("ParserCache: no latest revision found for page [[{}]]".format(title))
+            raise ValueError
+        self._store(key, content)
+        if self.disk is not None:
+            # only the latest revision of each title is kept on disk
+            self.disk[key[0]] = (revid, content)
+        return content
@@ -12,12 +12,17 @@ Prerequisites:
 
 import sys
 import os.path
+import json
 import logging
+import contextlib
+import threading
 
 import sqlalchemy as sa
 import alembic.config
 
 from . import schema, selects, grabbers, parser_cache
+from .content_cache import ContentCache
+from .dump_importer import DumpImporter
 from ..parser_helpers.title import Context, Title
 
 logger = logging.getLogger(__name__)
@@ -27,20 +32,49 @@ class Database:
     :param engine_or_url:
         either an existing :py:class:`sqlalchemy.engine.Engine` instance or a
         :py:class:`str` representing the URL created by :py:meth:`make_url`
+    :param int pool_size:
+        number of connections kept in the connection pool (ignored if an
+        existing engine is passed)
+    :param int max_overflow:
+        number of connections which can be opened beyond ``pool_size``
+        (ignored if an existing engine is passed)
+    :param int pool_recycle:
+        number of seconds after which a pooled connection is replaced (ignored
+        if an existing engine is passed)
     """
 
     # it doesn't make sense to even test anything else
     charset = "utf8"
 
-    # TODO: take parameters
-    def __init__(self, engine_or_url):
+    def __init__(self, engine_or_url, *, pool_size=None, max_overflow=None, pool_recycle=None):
         # limit for continuation
         self.chunk_size = 5000
+        # number of rows fetched at once from server-side cursors
+        # (used for streaming the results of list queries)
+        self.fetch_size = 1000
+        # selects reused for queries with the same shape of parameters and
+        # their compiled forms, see ws.db.selects.query_pageset
+        self.select_cache = sa.util.LRUCache(100)
+        self.compiled_cache = sa.util.LRUCache(500)
+        # context for the Title objects, see the Title method
+        self._title_context = None
+
+        # connections shared by the nested scopes of the connection() method
+        self._local = threading.local()
 
         if isinstance(engine_or_url, sa.engine.Engine):
             self.engine = engine_or_url
         else:
-            self.engine = sa.create_engine(engine_or_url, echo=False)
+            pool_options = {
+                "pool_size": pool_size,
+                "max_overflow": max_overflow,
+                "pool_recycle": pool_recycle,
+            }
+            pool_options = {key: value for key, value in pool_options.items() if value is not None}
+            # executemany_mode="values" makes the executemany execution (used
+            # by ws.db.execution.DeferrableExecutionQueue) use psycopg2's
+            # execute_values and execute_batch instead of a query per row
+            self.engine = sa.create_engine(engine_or_url, echo=False, executemany_mode="values", **pool_options)
 
         assert self.engine.name == "postgresql"
 
@@ -96,6 +130,12 @@ class Database:
                 help="port on which the database server listens (default: %(default)s)")
         group.add_argument("--db-name", metavar="DATABASE",
                 help="name of the database (default: %(default)s)")
+        group.add_argument("--db-pool-size", metavar="N", type=int,
+                help="number of connections kept in the connection pool (default: %(default)s)")
+        group.add_argument("--db-max-overflow", metavar="N", type=int,
+                help="number of connections which can be opened beyond the pool size (default: %(default)s)")
+        group.add_argument("--db-pool-recycle", metavar="SECONDS", type=int,
+                help="recycle pooled connections after given number of seconds (default: %(default)s)")
 
     @classmethod
     def from_argparser(klass, args):
@@ -120,7 +160,40 @@ class Database:
                                 host=args.db_host,
                                 port=args.db_port,
                                 database=args.db_name)
-        return klass(url)
+        return klass(url,
+                     pool_size=args.db_pool_size,
+                     max_overflow=args.db_max_overflow,
+                     pool_recycle=args.db_pool_recycle)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Context manager providing a connection for read-only queries.
+
+        Nested scopes in the same thread share the same connection, which is
+        returned to the pool at the end of the outermost scope. The connection
+        uses the ``AUTOCOMMIT`` isolation level so that it does not stay idle in
+        a transaction between the queries. Statements which modify the database
+        should be executed in a transaction, e.g. using
+        :py:meth:`sqlalchemy.engine.Engine.begin`.
+
+        Example::
+
+            with db.connection() as conn:
+                result = conn.execute(query)
+        """
+        conn = getattr(self._local, "connection", None)
+        if conn is not None:
+            yield conn
+            return
+
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            self._local.connection = conn
+            try:
+                yield conn
+            finally:
+                self._local.connection = None
 
     def __getattr__(self, table_name):
         """
@@ -133,7 +206,7 @@ class Database:
             raise AttributeError("Table '{}' does not exist in the database.".format(table_name))
         return self.metadata.tables[table_name]
 
-    def sync_with_api(self, api, *, with_content=False, check_needs_update=True):
+    def sync_with_api(self, api, *, with_content=False, check_needs_update=True, revision_partitions=1):
         """
         Sync the local data with a remote MediaWiki instance.
 
@@ -143,8 +216,15 @@ class Database:
         :param bool check_needs_update:
             whether to use the ``recentchanges`` table to check if the
             synchronization is needed and otherwise exit early
+        :param int revision_partitions:
+            number of concurrent partitions for the initial import of the
+            revisions (each needs its own database connections, so the pool
+            size may need to be increased; the API rate limit is shared by
+            all partitions)
         """
-        grabbers.synchronize(self, api, with_content=with_content, check_needs_update=check_needs_update)
+        with self.connection():
+            grabbers.synchronize(self, api, with_content=with_content, check_needs_update=check_needs_update,
+                                 revision_partitions=revision_partitions)
 
     def sync_revisions_content(self, api, *, mode="latest"):
         """
@@ -159,7 +239,24 @@ class Database:
                   the wiki will be synchronized
                 - `"all"`: the content of all revisions will be synchronized
         """
-        grabbers.GrabberRevisions(api, self).sync_revisions_content(mode=mode)
+        with self.connection():
+            grabbers.GrabberRevisions(api, self).sync_revisions_content(mode=mode)
+
+    def import_dump(self, path, *, timestamp=None, batch_size=1000):
+        """
+        Fill an empty database from a MediaWiki XML dump. The synchronization
+        with :py:meth:`.sync_with_api` continues from the time of the dump.
+
+        :param str path: path to the XML dump
+        :param datetime.datetime timestamp:
+            the time when the dump was created (default: the timestamp of the
+            newest revision in the dump)
+        :param int batch_size:
+            number of pages loaded in one transaction, see
+            :py:class:`ws.db.dump_importer.DumpImporter`
+        """
+        importer = DumpImporter(self, batch_size=batch_size)
+        importer.import_dump(path, timestamp=timestamp)
 
     def query(self, *args, **kwargs):
         """
@@ -173,28 +270,66 @@ class Database:
         """
         Parse a MediaWiki title.
 
+        The context (interwiki map and namespaces) is loaded from the database
+        on the first call and reused until :py:meth:`invalidate_title_context`
+        is called.
+
         :param str title: page title to be parsed
         :returns: a :py:class:`ws.parser_helpers.title.Title` object
         """
-        iwmap = selects.get_interwikimap(self)
-        namespacenames = selects.get_namespacenames(self)
-        namespaces = selects.get_namespaces(self)
-        # legaltitlechars are not stored in the database, it will hardly ever
-        # change so let's just hardcode it
-        legaltitlechars = " %!\"$&'()*,\\-.\\/0-9:;=?@A-Z\\\\^_`a-z~\\x80-\\xFF+"
-        context = Context(iwmap, namespacenames, namespaces, legaltitlechars)
-        return Title(context, title)
+        if self._title_context is None:
+            iwmap = selects.get_interwikimap(self)
+            namespacenames = selects.get_namespacenames(self)
+            namespaces = selects.get_namespaces(self)
+            # legaltitlechars are not stored in the database, it will hardly ever
+            # change so let's just hardcode it
+            legaltitlechars = " %!\"$&'()*,\\-.\\/0-9:;=?@A-Z\\\\^_`a-z~\\x80-\\xFF+"
+            self._title_context = Context(iwmap, namespacenames, namespaces, legaltitlechars)
+        return Title(self._title_context, title)
+
+    def invalidate_title_context(self):
+        """
+        Discard the context used by :py:meth:`Title`. Has to be called after
+        the ``interwiki`` or ``namespace`` tables are modified.
+        """
+        self._title_context = None
 
-    def update_parser_cache(self):
+    def update_parser_cache(self, *, batch_size=100, incremental=True, content_cache_path=None, report_path=None):
         """
         Update the parser cache tables.
 
         Note that the methods :py:meth:`.sync_with_api` and
         :py:meth:`.sync_latest_revisions_content` should be called prior to
         calling this method.
+
+        :param int batch_size:
+            number of pages parsed and written in one transaction, see
+            :py:class:`ws.db.parser_cache.ParserCache`
+        :param bool incremental:
+            whether to check only pages touched since the last update, see
+            :py:meth:`ws.db.parser_cache.ParserCache.update`
+        :param str content_cache_path:
+            path to a file for persisting the content of transcluded pages
+            across updates (optional), see
+            :py:class:`ws.db.content_cache.ContentCache`
+        :param str report_path:
+            path to a JSON file where the summary and per-page statistics of
+            the update are written (optional), see
+            :py:meth:`ws.db.parser_cache.ParserCache.get_report`
         """
-        cache = parser_cache.ParserCache(self)
-        cache.update()
+        content_cache = ContentCache(self, path=content_cache_path)
+        cache = parser_cache.ParserCache(self, batch_size=batch_size, content_cache=content_cache)
+        try:
+            with self.connection():
+                cache.update(incremental=incremental)
+        finally:
+            content_cache.close()
+
+        if report_path is not None:
+            report = cache.get_report()
+            report["stats"] = cache.stats
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=4, sort_keys=True)
 
 
 """
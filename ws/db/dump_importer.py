@@ -0,0 +1,404 @@
+#! /usr/bin/env python3
+
+import datetime
+import io
+import itertools
+import logging
+import xml.etree.ElementTree as ET
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
+from ws.utils import parse_date
+import ws.db.mw_constants as mwconst
+from ws.db.grabbers.page import GrabberPages
+from ws.db.grabbers.revision import GrabberRevisions
+
+__all__ = ["DumpImporter"]
+
+logger = logging.getLogger(__name__)
+
+def _tag(elem):
+    # strip the XML namespace, it changes with the version of the export format
+    return elem.tag.rsplit("}", 1)[-1]
+
+def _child(elem, tag):
+    for child in elem:
+        if _tag(child) == tag:
+            return child
+    return None
+
+def _child_text(elem, tag, default=None):
+    child = _child(elem, tag)
+    if child is None or child.text is None:
+        return default
+    return child.text
+
+class CopyWriter:
+    """
+    Buffers rows for a table and loads them into the database with the
+    ``COPY ... FROM STDIN`` statement, which is much faster than ``INSERT``.
+
+    The values are converted with the custom column types from
+    :py:mod:`ws.db.sql_types` and formatted for the text format of ``COPY``.
+
+    :param conn: an :py:obj:`sqlalchemy.engine.Connection` object
+    :param table: a :py:class:`sqlalchemy.schema.Table` object
+    :param list columns: names of the columns to be loaded
+    """
+
+    def __init__(self, conn, table, columns):
+        self.conn = conn
+        self.table = table
+        self.columns = [table.c[name] for name in columns]
+        self.buffer = io.StringIO()
+        self.count = 0
+
+        self.processors = []
+        for column in self.columns:
+            if isinstance(column.type, sa.types.TypeDecorator):
+                self.processors.append(column.type.process_bind_param)
+            else:
+                self.processors.append(None)
+
+    @staticmethod
+    def _format(value):
+        if value is None:
+            return "\\N"
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, (bytes, bytearray)):
+            # bytea in the hex format (with escaped backslash)
+            return "\\\\x" + value.hex()
+        if isinstance(value, datetime.datetime):
+            return value.isoformat(" ")
+        value = str(value)
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+    def write(self, row):
+        """
+        Add a row (a dict keyed by the column names) into the buffer.
+        """
+        values = []
+        for column, processor in zip(self.columns, self.processors):
+            value = row.get(column.name)
+            if processor is not None:
+                value = processor(value, self.conn.dialect)
+            values.append(self._format(value))
+        self.buffer.write("\t".join(values))
+        self.buffer.write("\n")
+        self.count += 1
+
+    def flush(self):
+        """
+        Load the buffered rows into the database.
+        """
+        if self.count == 0:
+            return
+        self.buffer.seek(0)
+        sql = "COPY {} ({}) FROM STDIN".format(
+                    self.conn.dialect.identifier_preparer.format_table(self.table),
+                    ", ".join(self.conn.dialect.identifier_preparer.format_column(c) for c in self.columns))
+        cursor = self.conn.connection.cursor()
+        try:
+            cursor.copy_expert(sql, self.buffer)
+        finally:
+            cursor.close()
+        self.buffer = io.StringIO()
+        self.count = 0
+
+class DumpImporter:
+    """
+    Fills an empty database from a MediaWiki XML dump, such as the output of
+    ``Special:Export`` or ``dumpBackup.php --full``.
+
+    The dump is parsed iteratively, so the memory usage does not depend on its
+    size or on the number of revisions of a page. The rows are loaded with ``COPY`` in batches of ``batch_size`` pages,
+    each batch in its own transaction. The secondary indexes of the loaded
+    tables are dropped during the import and created again at the end.
+
+    The ``page``, ``revision`` and ``text`` tables are filled from the dump.
+    Identical content of revisions of the same page is stored only once. The
+    ``user`` table gets the IDs and names of the contributors, the other
+    columns are filled by :py:class:`ws.db.grabbers.user.GrabberUsers` during
+    the next synchronization. Namespaces from the ``siteinfo`` header are
+    inserted only if they are missing.
+
+    The dumps do not contain deleted revisions and their log items do not
+    contain the parameters in the format of the API, so the ``archive`` and
+    ``logging`` tables are left to the synchronization with the API. The
+    ``page_props`` and ``page_restrictions`` tables are filled only for pages
+    changed after the dump.
+
+    Finally, the ``ws_sync`` table is stamped for the pages grabber, so that
+    :py:func:`ws.db.grabbers.synchronize` fetches only the pages changed after
+    the dump. The revisions grabber gets a checkpoint of its insert placed
+    after the ``allrevisions`` list, so the first synchronization imports
+    only the deleted revisions into the ``archive`` table and the revisions
+    made after the dump are fetched by the next synchronization.
+
+    :param db: a :py:class:`ws.db.database.Database` instance
+    :param int batch_size: number of pages loaded in one transaction
+    """
+
+    # tables which are filled with COPY
+    COPY_TABLES = ["page", "revision", "text", "user"]
+
+    def __init__(self, db, *, batch_size=1000):
+        if batch_size <= 0:  # pragma: no cover
+            raise ValueError("batch_size must be positive")
+
+        self.db = db
+        self.batch_size = batch_size
+
+        # namespace names from the siteinfo header, used to strip the prefixes from titles
+        self.namespaces = {}
+        # IDs of the users which were already loaded
+        self.user_ids = set()
+        self.text_id_gen = None
+        self.newest_timestamp = None
+        # text IDs of the content of the page being parsed, keyed by the SHA1
+        self.page_text_ids = {}
+        # the latest revision of the page being parsed
+        self.page_latest = None
+
+        self.pages = 0
+        self.revisions = 0
+
+    def _check_empty(self, conn):
+        for table in ["page", "revision"]:
+            count = conn.execute(sa.select([sa.func.count()]).select_from(self.db.metadata.tables[table])).scalar()
+            if count > 0:
+                raise ValueError("The dump can be imported only into an empty database, but the '{}' table is not empty.".format(table))
+
+    def _get_indexes(self):
+        for table in self.COPY_TABLES:
+            yield from self.db.metadata.tables[table].indexes
+
+    def _insert_siteinfo(self, conn, siteinfo):
+        namespaces = _child(siteinfo, "namespaces")
+        ns_rows = []
+        nsn_rows = []
+        for ns in namespaces if namespaces is not None else []:
+            ns_id = int(ns.get("key"))
+            name = ns.text or ""
+            self.namespaces[ns_id] = name
+            ns_rows.append({"ns_id": ns_id, "ns_case": ns.get("case", "first-letter")})
+            nsn_rows.append({"nsn_id": ns_id, "nsn_name": name})
+
+        # the complete namespace info is synchronized from the API later
+        if ns_rows:
+            conn.execute(insert(self.db.namespace).on_conflict_do_nothing(), ns_rows)
+            conn.execute(insert(self.db.namespace_name).on_conflict_do_nothing(), nsn_rows)
+            conn.execute(insert(self.db.namespace_starname).on_conflict_do_nothing(),
+                         [{"nss_id": row["nsn_id"], "nss_name": row["nsn_name"]} for row in nsn_rows])
+
+        # the user for anonymous edits, see GrabberUsers.gen_insert
+        conn.execute(insert(self.db.user).on_conflict_do_nothing(), {"user_id": 0, "user_name": "Anonymous"})
+        self.user_ids.add(0)
+
+    def _dbtitle(self, title, ns):
+        prefix = self.namespaces.get(ns)
+        if ns != 0 and prefix and title.startswith(prefix + ":"):
+            title = title[len(prefix) + 1:]
+        return title.replace(" ", "_")
+
+    def _parse_revision(self, elem):
+        rev = {
+            "rev_id": int(_child_text(elem, "id")),
+            "rev_timestamp": parse_date(_child_text(elem, "timestamp")),
+            "rev_minor_edit": _child(elem, "minor") is not None,
+            "rev_parent_id": int(_child_text(elem, "parentid")) if _child(elem, "parentid") is not None else None,
+            "rev_comment": _child_text(elem, "comment", ""),
+            "rev_content_model": _child_text(elem, "model"),
+            "rev_content_format": _child_text(elem, "format"),
+            "rev_deleted": 0,
+        }
+
+        contributor = _child(elem, "contributor")
+        if contributor is None or contributor.get("deleted") == "deleted":
+            rev["rev_deleted"] |= mwconst.DELETED_USER
+            rev["rev_user"] = 0
+            rev["rev_user_text"] = ""
+        elif _child(contributor, "ip") is not None:
+            rev["rev_user"] = 0
+            rev["rev_user_text"] = _child_text(contributor, "ip")
+        else:
+            rev["rev_user"] = int(_child_text(contributor, "id", 0))
+            rev["rev_user_text"] = _child_text(contributor, "username", "")
+
+        comment = _child(elem, "comment")
+        if comment is not None and comment.get("deleted") == "deleted":
+            rev["rev_deleted"] |= mwconst.DELETED_COMMENT
+
+        text = _child(elem, "text")
+        if text is None or text.get("deleted") == "deleted":
+            rev["rev_deleted"] |= mwconst.DELETED_TEXT
+            rev["rev_len"] = None
+            content = None
+        else:
+            # empty content is an empty element
+            content = text.text or ""
+            if text.get("bytes") is not None:
+                rev["rev_len"] = int(text.get("bytes"))
+            else:
+                rev["rev_len"] = len(content.encode("utf-8"))
+
+        # the dump uses the base36 encoding like the database, but
+        # ws.db.sql_types.SHA1 expects the hexadecimal encoding from the API
+        sha1 = _child_text(elem, "sha1")
+        rev["rev_sha1"] = "{:040x}".format(int(sha1, 36)) if sha1 else None
+
+        return rev, content
+
+    def _load_revision(self, page, elem, writers):
+        """
+        Load a revision of the page which is being parsed. The page data is
+        collected in the ``page_text_ids`` and ``page_latest`` attributes
+        until the whole page is parsed, see :py:meth:`_load_page`.
+        """
+        rev, content = self._parse_revision(elem)
+        rev["rev_page"] = int(_child_text(page, "id"))
+
+        if content is not None:
+            sha1 = rev["rev_sha1"]
+            if sha1 is not None and sha1 in self.page_text_ids:
+                rev["rev_text_id"] = self.page_text_ids[sha1]
+            else:
+                rev["rev_text_id"] = next(self.text_id_gen)
+                writers["text"].write({"old_id": rev["rev_text_id"], "old_text": content})
+                if sha1 is not None:
+                    self.page_text_ids[sha1] = rev["rev_text_id"]
+
+        if rev["rev_user"] not in self.user_ids:
+            writers["user"].write({"user_id": rev["rev_user"], "user_name": rev["rev_user_text"]})
+            self.user_ids.add(rev["rev_user"])
+
+        writers["revision"].write(rev)
+        self.revisions += 1
+
+        latest = self.page_latest
+        if latest is None or (rev["rev_timestamp"], rev["rev_id"]) > (latest["rev_timestamp"], latest["rev_id"]):
+            self.page_latest = rev
+        if self.newest_timestamp is None or rev["rev_timestamp"] > self.newest_timestamp:
+            self.newest_timestamp = rev["rev_timestamp"]
+
+    def _load_page(self, elem, writers):
+        latest = self.page_latest
+        self.page_text_ids = {}
+        self.page_latest = None
+
+        if latest is None:
+            logger.warning("Skipping page [[{}]] without revisions.".format(_child_text(elem, "title")))
+            return
+
+        ns = int(_child_text(elem, "ns"))
+        page = {
+            "page_id": int(_child_text(elem, "id")),
+            "page_namespace": ns,
+            "page_title": self._dbtitle(_child_text(elem, "title"), ns),
+            "page_is_redirect": _child(elem, "redirect") is not None,
+            "page_is_new": latest["rev_parent_id"] in {None, 0},
+            "page_touched": latest["rev_timestamp"],
+            "page_latest": latest["rev_id"],
+            "page_len": latest["rev_len"] or 0,
+            "page_content_model": latest["rev_content_model"],
+        }
+        writers["page"].write(page)
+        self.pages += 1
+
+    def _flush(self, writers):
+        for writer in writers.values():
+            writer.flush()
+
+    def _stamp(self, timestamp):
+        with self.db.engine.begin() as conn:
+            GrabberPages(None, self.db)._set_sync_timestamp(timestamp, conn)
+            # the dump does not contain deleted revisions, they are imported
+            # when the insert is resumed from this checkpoint
+            g = GrabberRevisions(None, self.db)
+            g._set_sync_checkpoint(timestamp, {"list": g.adr_params["list"], "continue": None}, conn)
+
+    def import_dump(self, path, *, timestamp=None):
+        """
+        Import the dump.
+
+        :param str path: path to the XML file
+        :param datetime.datetime timestamp:
+            the time when the dump was created, the synchronization continues
+            from this point (default: the timestamp of the newest revision in
+            the dump)
+        """
+        with self.db.engine.begin() as conn:
+            self._check_empty(conn)
+            for index in self._get_indexes():
+                index.drop(bind=conn)
+
+        try:
+            self._import(path)
+        finally:
+            # the indexes are created in one pass over the loaded tables
+            logger.info("Creating indexes for the tables {}...".format(", ".join(self.COPY_TABLES)))
+            with self.db.engine.begin() as conn:
+                for index in self._get_indexes():
+                    index.create(bind=conn)
+
+        if timestamp is None:
+            timestamp = self.newest_timestamp
+        if timestamp is not None:
+            self._stamp(timestamp)
+        logger.info("Imported {} pages with {} revisions from the dump.".format(self.pages, self.revisions))
+
+    def _import(self, path):
+        with self.db.engine.connect() as conn:
+            max_text_id = conn.execute(sa.select([sa.func.max(self.db.text.c.old_id)])).scalar()
+            self.text_id_gen = itertools.count((max_text_id or 0) + 1)
+            # the user table may be already filled by GrabberUsers
+            self.user_ids = set(row[0] for row in conn.execute(sa.select([self.db.user.c.user_id])))
+
+            trans = conn.begin()
+            try:
+                writers = {
+                    "page": CopyWriter(conn, self.db.page, [c.name for c in self.db.page.c]),
+                    "revision": CopyWriter(conn, self.db.revision, [c.name for c in self.db.revision.c]),
+                    "text": CopyWriter(conn, self.db.text, ["old_id", "old_text"]),
+                    "user": CopyWriter(conn, self.db.user, ["user_id", "user_name"]),
+                }
+                batch = 0
+
+                context = ET.iterparse(path, events=("start", "end"))
+                _, root = next(context)
+                page = None
+                for event, elem in context:
+                    tag = _tag(elem)
+                    if event == "start":
+                        if tag == "page":
+                            page = elem
+                        continue
+                    if tag == "revision" and page is not None:
+                        self._load_revision(page, elem, writers)
+                        # discard the processed revision, pages may have
+                        # many revisions
+                        page.remove(elem)
+                    elif tag == "siteinfo":
+                        self._insert_siteinfo(conn, elem)
+                        root.clear()
+                    elif tag == "page":
+                        self._load_page(elem, writers)
+                        page = None
+                        # discard the processed elements
+                        root.clear()
+                        batch += 1
+                        if batch >= self.batch_size:
+                            self._flush(writers)
+                            trans.commit()
+                            trans = conn.begin()
+                            batch = 0
+                            logger.info("Imported {} pages with {} revisions...".format(self.pages, self.revisions))
+
+                self._flush(writers)
+            except BaseException:
+                trans.rollback()
+                raise
+            else:
+                trans.commit()
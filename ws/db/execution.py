@@ -1,5 +1,7 @@
 #! /usr/bin/env python3
 
+from sqlalchemy.dialects.postgresql.dml import OnConflictDoUpdate
+
 class DeferrableExecutionQueue:
     """
     An execution wrapper which defers the execution of statements until the
@@ -16,12 +18,22 @@ class DeferrableExecutionQueue:
         are executed - otherwise the queues may get out of sync and execution
         may hit constraint errors.
 
+    The speed of the *executemany* execution depends on the
+    ``executemany_mode`` of the engine. :py:class:`ws.db.database.Database`
+    creates engines with ``executemany_mode="values"``, which executes
+    ``INSERT`` statements with :py:func:`psycopg2.extras.execute_values` and
+    other statements with :py:func:`psycopg2.extras.execute_batch`. Since
+    PostgreSQL does not allow ``INSERT ... ON CONFLICT DO UPDATE`` to affect
+    the same row twice in one statement, the parameter sets of such statements
+    are split at duplicate conflict targets.
+
     :param sqlalchemy.engine.Connection conn:
         a connection (with an established transaction) to the database where the
         statements are executed
     :param int chunk_size:
         maximum queue size
     """
+
     def __init__(self, conn, chunk_size):
         if chunk_size <= 0:  # pragma: no cover
             raise ValueError("chunk_size must be positive")
@@ -62,11 +74,39 @@ class DeferrableExecutionQueue:
         """
         for statement in self.ordered_keys:
             if statement in self.stmt_queues:
-                self.conn.execute(statement, self.stmt_queues[statement])
+                self._execute_many(statement, self.stmt_queues[statement])
 
         # don't clear self.ordered_keys to preserve the order from first execution
         self.stmt_queues.clear()
 
+    @staticmethod
+    def _split_conflicts(statement, params_list):
+        """
+        Split the parameter sets of an ``INSERT ... ON CONFLICT DO UPDATE``
+        statement into consecutive groups without duplicate conflict targets.
+        Other statements are not split.
+        """
+        on_conflict = getattr(statement, "_post_values_clause", None)
+        if not isinstance(on_conflict, OnConflictDoUpdate) or on_conflict.inferred_target_elements is None:
+            return [params_list]
+        target = [element if isinstance(element, str) else element.key
+                  for element in on_conflict.inferred_target_elements]
+
+        groups = [[]]
+        keys = set()
+        for params in params_list:
+            key = tuple(params.get(column) for column in target)
+            if key in keys:
+                groups.append([])
+                keys.clear()
+            groups[-1].append(params)
+            keys.add(key)
+        return groups
+
+    def _execute_many(self, statement, params_list):
+        for group in self._split_conflicts(statement, params_list):
+            self.conn.execute(statement, group)
+
     def __enter__(self):
         return self
 
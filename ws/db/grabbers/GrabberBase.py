@@ -2,17 +2,83 @@
 
 import datetime
 import logging
+import queue
+import threading
 
-from sqlalchemy import select
+from sqlalchemy import select, bindparam
 from sqlalchemy.dialects.postgresql import insert
 
 from ws.client.api import ShortRecentChangesError
 from ws.db.execution import DeferrableExecutionQueue
 
-__all__ = ["GrabberBase"]
+from .change_feed import ChangeFeed
+
+__all__ = ["GrabberBase", "Checkpoint"]
 
 logger = logging.getLogger(__name__)
 
+def _pipeline(gen, maxsize):
+    """
+    Iterate over a generator which is consumed in a separate thread, so that
+    the production of the items (API queries) overlaps with the work done by
+    the caller on the items (executing the SQL statements).
+
+    At most ``maxsize`` items are buffered. Exceptions raised by the generator
+    are re-raised in the calling thread. When the caller stops the iteration
+    (e.g. due to an exception), the producer thread is stopped as well.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in gen:
+                if not put((item, None)):
+                    break
+        except BaseException as e:
+            put((done, e))
+        else:
+            put((done, None))
+        finally:
+            gen.close()
+
+    thread = threading.Thread(target=produce, name="pipeline-producer", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, exc = items.get()
+            if item is done:
+                if exc is not None:
+                    raise exc
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+class Checkpoint:
+    """
+    A marker yielded from :py:meth:`GrabberBase.gen_insert` at a point where
+    the statements yielded so far can be committed.
+
+    :param dict state:
+        a JSON-serializable value which allows :py:meth:`GrabberBase.gen_insert`
+        to resume after this point, it is available as the ``checkpoint``
+        attribute of the grabber
+    """
+    def __init__(self, state):
+        self.state = state
+
 class GrabberBase:
 
     # class attributes that should be overridden in subclasses
@@ -22,9 +88,30 @@ class GrabberBase:
     # be here.
     INSERT_PREDELETE_TABLES = []
 
+    # Maximum number of items from gen_insert/gen_update buffered between the
+    # producer thread (API queries) and the thread executing the statements.
+    PIPELINE_SIZE = 10000
+
+    # Minimum number of statements executed between two commits of a full
+    # insert, see the Checkpoint class.
+    CHECKPOINT_INTERVAL = 100000
+
+    # Names of grabber classes which must be finished before this grabber
+    # starts, e.g. because it reads their tables or the rows it inserts
+    # reference them. Used by ws.db.grabbers.synchronize to run independent
+    # grabbers concurrently.
+    DEPENDS = []
+
     def __init__(self, api, db):
         self.api = api
         self.db = db
+        # key of the grabber in the ws_sync table
+        self.sync_key = self.__class__.__name__
+        # state of an interrupted insert, see the Checkpoint class
+        self.checkpoint = None
+        # view of the local logevents and recentchanges delta, shared by all
+        # grabbers in ws.db.grabbers.synchronize
+        self.feed = ChangeFeed(db)
 
     def _set_sync_timestamp(self, timestamp, conn=None):
         """
@@ -40,16 +127,21 @@ class GrabberBase:
         ins = insert(ws_sync)
         ins = ins.on_conflict_do_update(
                     constraint=ws_sync.primary_key,
-                    set_={"wss_timestamp": ins.excluded.wss_timestamp}
+                    set_={
+                        "wss_timestamp": ins.excluded.wss_timestamp,
+                        "wss_checkpoint": None,
+                    }
                 )
         entry = {
-            "wss_key": self.__class__.__name__,
+            "wss_key": self.sync_key,
             "wss_timestamp": timestamp,
         }
 
         if conn is None:
-            conn = self.db.engine.connect()
-        conn.execute(ins, entry)
+            with self.db.engine.begin() as conn:
+                conn.execute(ins, entry)
+        else:
+            conn.execute(ins, entry)
 
     def _get_sync_timestamp(self):
         """
@@ -58,14 +150,71 @@ class GrabberBase:
         """
         ws_sync = self.db.ws_sync
         sel = select([ws_sync.c.wss_timestamp]) \
-              .where(ws_sync.c.wss_key == self.__class__.__name__)
+              .where(ws_sync.c.wss_key == self.sync_key)
+
+        with self.db.connection() as conn:
+            row = conn.execute(sel).fetchone()
+        if row:
+            return row[0]
+        return None
+
+    def _set_sync_checkpoint(self, timestamp, state, conn):
+        """
+        Save the checkpoint of an unfinished insert. Writes into the custom
+        ``ws_sync`` table, the last-sync timestamp is not changed.
 
-        conn = self.db.engine.connect()
-        row = conn.execute(sel).fetchone()
+        :param datetime.datetime timestamp: the timestamp of the insert start
+        :param state: the state of the :py:class:`Checkpoint`
+        :param conn: an existing :py:obj:`sqlalchemy.engine.Connection` object
+            to be re-used for execution of the SQL query
+        """
+        ws_sync = self.db.ws_sync
+        ins = insert(ws_sync)
+        ins = ins.on_conflict_do_update(
+                    constraint=ws_sync.primary_key,
+                    set_={"wss_checkpoint": ins.excluded.wss_checkpoint}
+                )
+        entry = {
+            "wss_key": self.sync_key,
+            "wss_checkpoint": {"timestamp": timestamp, "state": state},
+        }
+        conn.execute(ins, entry)
+
+    def _get_sync_checkpoint(self):
+        """
+        Get the checkpoint of an unfinished insert saved by
+        :py:meth:`_set_sync_checkpoint`. Reads from the custom ``ws_sync``
+        table.
+        """
+        ws_sync = self.db.ws_sync
+        sel = select([ws_sync.c.wss_checkpoint]) \
+              .where(ws_sync.c.wss_key == self.sync_key)
+
+        with self.db.connection() as conn:
+            row = conn.execute(sel).fetchone()
         if row:
             return row[0]
         return None
 
+    def _select_existing(self, column, values):
+        """
+        Select the values which are present in the given column, e.g. the IDs
+        of the revisions which exist in the ``revision`` table. The lookup is
+        done with a few ``IN`` queries instead of a query per value.
+
+        :param column: a :py:class:`sqlalchemy.schema.Column` object
+        :param values: an iterable of values to look up
+        :returns: a :py:class:`set` of the values found in the column
+        """
+        values = list(values)
+        sel = select([column]).where(column.in_(bindparam("values", expanding=True)))
+        found = set()
+        with self.db.connection() as conn:
+            for i in range(0, len(values), self.db.chunk_size):
+                result = conn.execute(sel, values=values[i:i + self.db.chunk_size])
+                found.update(row[0] for row in result)
+        return found
+
     def gen_insert(self):
         """
         A generator for database entries which assumes that the tables are
@@ -84,6 +233,13 @@ class GrabberBase:
           to exploit the *executemany* execution strategy.
         - Or it can yield ``stmt`` objects directly, if the *executemany*
           execution strategy is not applicable.
+
+        Grabbers for large tables should also yield :py:class:`Checkpoint`
+        objects, which allow to commit the data in multiple transactions. When
+        the insert is interrupted, the next :py:meth:`insert` resumes from the
+        last committed checkpoint: the ``checkpoint`` attribute is set to its
+        state before the generator is created (it is ``None`` when starting
+        from scratch).
         """
         raise NotImplementedError
 
@@ -104,13 +260,22 @@ class GrabberBase:
         raise NotImplementedError
 
     def insert(self):
-        # delete everything and start over, otherwise the invalid rows would
-        # stay in the tables
-        with self.db.engine.begin() as conn:
-            for table in self.INSERT_PREDELETE_TABLES:
-                conn.execute(self.db.metadata.tables[table].delete())
+        checkpoint = self._get_sync_checkpoint()
+        if checkpoint is None:
+            # delete everything and start over, otherwise the invalid rows would
+            # stay in the tables
+            with self.db.engine.begin() as conn:
+                for table in self.INSERT_PREDELETE_TABLES:
+                    conn.execute(self.db.metadata.tables[table].delete())
 
-        sync_timestamp = datetime.datetime.utcnow()
+            sync_timestamp = datetime.datetime.utcnow()
+            self.checkpoint = None
+        else:
+            logger.info("Resuming the interrupted insert of {} from the last checkpoint.".format(self.sync_key))
+            # changes since the start of the interrupted insert will be
+            # synchronized by the next update
+            sync_timestamp = checkpoint["timestamp"]
+            self.checkpoint = checkpoint["state"]
 
         gen = self.gen_insert()
         self._execute(gen, sync_timestamp)
@@ -120,7 +285,7 @@ class GrabberBase:
 
         if since is None:
             since = self._get_sync_timestamp()
-            if since is None:
+            if since is None or self._get_sync_checkpoint() is not None:
                 self.insert()
                 return
 
@@ -132,15 +297,38 @@ class GrabberBase:
             self.insert()
 
     def _execute(self, gen, sync_timestamp):
-        with self.db.engine.begin() as conn:
-            with DeferrableExecutionQueue(conn, self.db.chunk_size) as dfe:
-                for item in gen:
-                    if isinstance(item, tuple):
+        # The generator is consumed in a separate thread, so the API queries
+        # run while the queued statements are being executed. All statements
+        # are still executed in this thread, in a single transaction (unless
+        # the generator yields checkpoints).
+        with self.db.engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                dfe = DeferrableExecutionQueue(conn, self.db.chunk_size)
+                count = 0
+                for item in _pipeline(gen, self.PIPELINE_SIZE):
+                    if isinstance(item, Checkpoint):
+                        if count >= self.CHECKPOINT_INTERVAL:
+                            # commit the data together with the checkpoint
+                            dfe.execute_deferred()
+                            self._set_sync_checkpoint(sync_timestamp, item.state, conn)
+                            trans.commit()
+                            trans = conn.begin()
+                            count = 0
+                    elif isinstance(item, tuple):
                         # unpack the tuple
                         dfe.execute(*item)
+                        count += 1
                     else:
                         # probably a single value
                         dfe.execute(item)
+                        count += 1
+                dfe.execute_deferred()
 
-            # set the sync timestamp, in the same transaction as the data
-            self._set_sync_timestamp(sync_timestamp, conn)
+                # set the sync timestamp, in the same transaction as the data
+                self._set_sync_timestamp(sync_timestamp, conn)
+            except BaseException:
+                trans.rollback()
+                raise
+            else:
+                trans.commit()
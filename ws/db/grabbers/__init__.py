@@ -2,6 +2,7 @@
 
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from ws.db.grabbers.namespace import GrabberNamespaces
 from ws.db.grabbers.tags import GrabberTags
@@ -14,10 +15,64 @@ from ws.db.grabbers.page import GrabberPages
 from ws.db.grabbers.protected_titles import GrabberProtectedTitles
 from ws.db.grabbers.revision import GrabberRevisions
 from ws.db.grabbers.logging_ import GrabberLogging
+from ws.db.grabbers.change_feed import ChangeFeed
 
 logger = logging.getLogger(__name__)
 
-def synchronize(db, api, *, with_content=False, check_needs_update=True):
+# all grabbers used for the synchronization, their order does not matter
+GRABBERS = [
+    GrabberNamespaces,
+    GrabberTags,
+    GrabberInterwiki,
+    GrabberRecentChanges,
+    GrabberUsers,
+    GrabberUserMerge,
+    GrabberIPBlocks,
+    GrabberPages,
+    GrabberProtectedTitles,
+    GrabberRevisions,
+    GrabberLogging,
+]
+
+# grabbers affecting the context of ws.parser_helpers.title.Title
+TITLE_CONTEXT_GRABBERS = {"GrabberNamespaces", "GrabberInterwiki"}
+
+def _run_concurrently(grabbers, *, max_workers, callback=None):
+    """
+    Run the :py:meth:`update <ws.db.grabbers.GrabberBase.GrabberBase.update>`
+    method of each grabber in a thread pool. Each grabber is started as soon as
+    all grabbers from its ``DEPENDS`` list are finished, dependencies which are
+    not in ``grabbers`` are ignored.
+
+    :param dict grabbers: a mapping of class names to grabber instances
+    :param int max_workers: maximum number of concurrently running grabbers
+    :param callback: a function called in the main thread with the name of
+        each finished grabber, before its dependents are started
+    """
+    pending = dict(grabbers)
+    running = {}
+    done = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name, grabber in list(pending.items()):
+                if all(dep in done or dep not in grabbers for dep in grabber.DEPENDS):
+                    del pending[name]
+                    running[executor.submit(grabber.update)] = name
+
+            if not running:
+                raise ValueError("Circular dependencies between grabbers: {}".format(", ".join(sorted(pending))))
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                # re-raise the exception from the worker thread
+                future.result()
+                done.add(name)
+                if callback is not None:
+                    callback(name)
+
+def synchronize(db, api, *, with_content=False, check_needs_update=True, max_workers=4, revision_partitions=1):
     time1 = time.time()
 
     # if no recent change has been added, it's safe to assume that the other tables are up to date as well
@@ -26,17 +81,31 @@ def synchronize(db, api, *, with_content=False, check_needs_update=True):
         logger.info("No new changes since the last database synchronization.")
         return
 
-    GrabberNamespaces(api, db).update()
-    GrabberTags(api, db).update()
-    GrabberRecentChanges(api, db).update()
-    GrabberUsers(api, db).update()
-    GrabberLogging(api, db).update()
-    GrabberUserMerge(api, db).update()
-    GrabberInterwiki(api, db).update()
-    GrabberIPBlocks(api, db).update()
-    GrabberPages(api, db).update()
-    GrabberProtectedTitles(api, db).update()
-    GrabberRevisions(api, db, with_content=with_content).update()
+    grabbers = {}
+    for cls in GRABBERS:
+        if cls is GrabberRevisions:
+            grabbers[cls.__name__] = cls(api, db, with_content=with_content, partitions=revision_partitions)
+        else:
+            grabbers[cls.__name__] = cls(api, db)
+
+    # the local logevents and recentchanges delta is selected only once and
+    # shared by all grabbers, starting from the oldest last-sync timestamp
+    timestamps = [g._get_sync_timestamp() for g in grabbers.values()]
+    timestamps = [t for t in timestamps if t is not None]
+    feed = ChangeFeed(db, since=min(timestamps, default=None))
+    for g in grabbers.values():
+        g.feed = feed
+
+    def callback(name):
+        if name in TITLE_CONTEXT_GRABBERS:
+            db.invalidate_title_context()
+
+    # each grabber runs in its own thread with its own transaction
+    try:
+        _run_concurrently(grabbers, max_workers=max_workers, callback=callback)
+    finally:
+        # the delta may be large, do not keep it after the synchronization
+        feed.release()
 
     time2 = time.time()
     logger.info("Synchronization of the database took {:.2f} seconds.".format(time2 - time1))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import defaultdict
+
+__all__ = ["ChangeFeed"]
+
+class ChangeFeed:
+    """
+    Sync-scoped view of the ``logevents`` and ``recentchanges`` delta in the
+    local database.
+
+    Many grabbers examine the changes since their last sync to determine what
+    has to be updated. Instead of each of them scanning the delta with its own
+    query, the feed selects each list only once (with the union of the props
+    needed by the grabbers) and indexes the entries by type, action, page ID
+    and revision ID, so that the grabbers iterate over just the entries they
+    are interested in.
+
+    The lists are selected lazily on the first access, which must happen after
+    :py:class:`GrabberRecentChanges <ws.db.grabbers.recentchanges.GrabberRecentChanges>`
+    and :py:class:`GrabberLogging <ws.db.grabbers.logging_.GrabberLogging>`
+    have finished. A list is selected again only if an older part of the delta
+    is requested than what was selected first. The feed is thread-safe and the
+    entries are shared by all grabbers, so they must not be modified. The
+    selected entries are kept until :py:meth:`release` is called.
+
+    :param db: a :py:class:`ws.db.database.Database` instance
+    :param datetime.datetime since:
+        the oldest timestamp which is expected to be requested (optional), the
+        delta is selected from this timestamp even if a newer part is requested
+        first
+    """
+
+    # parameters of the selected lists, the start timestamp is added to the
+    # parameter given by the "start" key
+    LISTS = {
+        "logevents": {
+            "start": "lestart",
+            "leprop": {"type", "details", "title", "ids", "timestamp"},
+            "ledir": "newer",
+        },
+        "recentchanges": {
+            "start": "rcstart",
+            "rctype": {"edit", "new", "log"},
+            "rcprop": {"user", "title", "ids", "loginfo", "timestamp"},
+            "rcdir": "newer",
+        },
+    }
+
+    # mapping of the filters accepted by the query methods to the keys of the
+    # entries, per list
+    INDEXES = {
+        "logevents": {
+            "type": "type",
+            "action": "action",
+            "pageid": "logpage",
+        },
+        "recentchanges": {
+            "type": "type",
+            "pageid": "pageid",
+            "revid": "revid",
+        },
+    }
+
+    def __init__(self, db, since=None):
+        self.db = db
+        self.since = since
+        self._lock = threading.Lock()
+        self._deltas = {}
+
+    def _select(self, list_, since):
+        params = dict(self.LISTS[list_])
+        params["list"] = list_
+        params[params.pop("start")] = since
+        entries = list(self.db.query(params))
+
+        indexes = {name: defaultdict(list) for name in self.INDEXES[list_]}
+        for position, entry in enumerate(entries):
+            for name, key in self.INDEXES[list_].items():
+                if key in entry:
+                    indexes[name][entry[key]].append(position)
+
+        return {"since": since, "entries": entries, "indexes": indexes}
+
+    def _get_delta(self, list_, since):
+        with self._lock:
+            delta = self._deltas.get(list_)
+            if delta is None or delta["since"] > since:
+                if self.since is not None:
+                    since = min(since, self.since)
+                # drop the newer part before selecting the older delta, which
+                # contains all its entries
+                self._deltas.pop(list_, None)
+                delta = self._select(list_, since)
+                self._deltas[list_] = delta
+            return delta
+
+    def release(self):
+        """
+        Drop the selected entries and their indexes. The lists are selected
+        again on the next access. Iterations which have already started are
+        not affected.
+        """
+        with self._lock:
+            self._deltas.clear()
+
+    def _query(self, list_, since, filters):
+        assert since is not None
+        delta = self._get_delta(list_, since)
+        entries = delta["entries"]
+        keys = self.INDEXES[list_]
+
+        # normalize the filters to sets of accepted values
+        filters = {name: value if isinstance(value, (set, frozenset)) else {value}
+                   for name, value in filters.items() if value is not None}
+
+        if filters:
+            # use the index of the most selective filter
+            candidates = []
+            for name, values in filters.items():
+                index = delta["indexes"][name]
+                positions = set()
+                for value in values:
+                    positions.update(index.get(value, []))
+                candidates.append(positions)
+            positions = sorted(min(candidates, key=len))
+        else:
+            positions = range(len(entries))
+
+        for position in positions:
+            entry = entries[position]
+            # the selected delta may start earlier than requested
+            if entry["timestamp"] < since:
+                continue
+            if all(entry.get(keys[name]) in values for name, values in filters.items()):
+                yield entry
+
+    def logevents(self, since, *, type=None, action=None, pageid=None):
+        """
+        Iterate over the log events since the given timestamp, in the
+        chronological order. The entries contain the ``type``, ``details``,
+        ``title``, ``ids`` and ``timestamp`` props.
+
+        Each filter accepts a single value or a set of values.
+
+        :param datetime.datetime since: timestamp of the oldest log event
+        :param type: select only log events of this type
+        :param action: select only log events with this action
+        :param pageid: select only log events whose target is this page
+        """
+        filters = {"type": type, "action": action, "pageid": pageid}
+        return self._query("logevents", since, filters)
+
+    def recentchanges(self, since, *, type=None, pageid=None, revid=None):
+        """
+        Iterate over the recent changes of the ``edit``, ``new`` and ``log``
+        types since the given timestamp, in the chronological order. The
+        entries contain the ``user``, ``title``, ``ids``, ``loginfo`` and
+        ``timestamp`` props.
+
+        Each filter accepts a single value or a set of values.
+
+        :param datetime.datetime since: timestamp of the oldest change
+        :param type: select only changes of this type
+        :param pageid: select only changes of this page
+        :param revid: select only changes which created this revision
+        """
+        filters = {"type": type, "pageid": pageid, "revid": revid}
+        return self._query("recentchanges", since, filters)
@@ -6,6 +6,8 @@ from .GrabberBase import GrabberBase
 
 class GrabberInterwiki(GrabberBase):
 
+    DEPENDS = ["GrabberLogging"]
+
     INSERT_PREDELETE_TABLES = ["interwiki"]
 
     def __init__(self, api, db):
@@ -53,17 +55,9 @@ class GrabberInterwiki(GrabberBase):
     def gen_update(self, since):
         # The interwiki can change also by direct manipulation with the database,
         # in which case there won't be any logevents. We don't care much about that...
-
-        le_params = {
-            "list": "logevents",
-            "leprop": {"type", "details"},
-            "ledir": "newer",
-            "lestart": since,
-        }
-        for le in self.db.query(le_params):
-            if le["type"] == "interwiki":
-                db_entry = self._transform_logevent_params(le["params"])
-                if le["action"] in {"iw_add", "iw_edit"}:
-                    yield self.sql["update", "interwiki"], db_entry
-                elif le["action"] == "iw_delete":
-                    yield self.sql["delete", "interwiki"], {"b_iw_prefix": db_entry["iw_prefix"]}
+        for le in self.feed.logevents(since, type="interwiki"):
+            db_entry = self._transform_logevent_params(le["params"])
+            if le["action"] in {"iw_add", "iw_edit"}:
+                yield self.sql["update", "interwiki"], db_entry
+            elif le["action"] == "iw_delete":
+                yield self.sql["delete", "interwiki"], {"b_iw_prefix": db_entry["iw_prefix"]}
@@ -10,6 +10,8 @@ from .GrabberBase import GrabberBase
 
 class GrabberIPBlocks(GrabberBase):
 
+    DEPENDS = ["GrabberUsers", "GrabberLogging", "GrabberUserMerge"]
+
     INSERT_PREDELETE_TABLES = ["ipblocks"]
 
     def __init__(self, api, db):
@@ -105,14 +107,7 @@ class GrabberIPBlocks(GrabberBase):
 
         # also examine the logs for possible reblocks or unblocks
         rcusers = set()
-        le_params = {
-            "list": "logevents",
-            "letype": "block",
-            "leprop": {"title"},
-            "ledir": "newer",
-            "lestart": since,
-        }
-        for logevent in self.db.query(le_params):
+        for logevent in self.feed.logevents(since, type="block"):
             # extract target user name
             username = logevent["title"].split(":", maxsplit=1)[1]
             rcusers.add(username)
@@ -9,6 +9,8 @@ from .GrabberBase import GrabberBase
 
 class GrabberLogging(GrabberBase):
 
+    DEPENDS = ["GrabberRecentChanges", "GrabberUsers", "GrabberTags"]
+
     def __init__(self, api, db):
         super().__init__(api, db)
 
@@ -158,6 +160,9 @@ class GrabberLogging(GrabberBase):
             yield self.sql["update", "log_deleted"], {"b_log_id": logid, "log_deleted": bitmask}
 
         # update tags
+        if added_tags:
+            # check which are recent changes to tag them as well
+            rc_logids = self._select_existing(self.db.recentchanges.c.rc_logid, added_tags)
         for logid, added in added_tags.items():
             for tag in added:
                 db_entry = {
@@ -165,11 +170,7 @@ class GrabberLogging(GrabberBase):
                     "b_tag_name": tag,
                 }
                 yield self.sql["insert", "tagged_logevent"], db_entry
-                # check if it is a recent change and tag it as well
-                result = self.db.engine.execute(sa.select([
-                            sa.exists().where(self.db.recentchanges.c.rc_logid == logid)
-                        ]))
-                if result.fetchone()[0]:
+                if logid in rc_logids:
                     yield self.sql["insert", "tagged_recentchange"], db_entry
         for logid, removed in removed_tags.items():
             for tag in removed:
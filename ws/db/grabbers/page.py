@@ -9,6 +9,8 @@ from .GrabberBase import GrabberBase
 
 class GrabberPages(GrabberBase):
 
+    DEPENDS = ["GrabberRecentChanges", "GrabberLogging", "GrabberUserMerge", "GrabberInterwiki"]
+
     INSERT_PREDELETE_TABLES = ["page", "page_props", "page_restrictions"]
 
     def __init__(self, api, db):
@@ -255,8 +257,13 @@ class GrabberPages(GrabberBase):
         delete_early, moved, pages = self.get_logpages(since)
         if rc_oldest is not None and rc_oldest <= since:
             pages |= self.get_rcpages(since)[2]
+        else:
+            # get_logpages does not include normal edits, so we need to go
+            # through list=allpages again
+            pages |= self.get_outdated_pages()
 
-        keys = list(pages.keys())
+        # positions of the page IDs for sorting the API results
+        positions = {pageid: i for i, pageid in enumerate(pages)}
 
         # Always delete beforehand, otherwise inserts might violate the
         # page_namespace_title unique constraint (for example when an automatic
@@ -294,34 +301,58 @@ class GrabberPages(GrabberBase):
 
                 # ordering of SQL inserts is important for moved pages, but MediaWiki does
                 # not return ordered results for the pageids= parameter
-                pages.sort(key=lambda page: keys.index(page["pageid"]))
+                pages.sort(key=lambda page: positions[page["pageid"]])
 
                 for page in pages:
                     # deletes first, otherwise edit + move over redirect would fail
                     yield from self.gen_deletes_from_page(page)
                     yield from self.gen_inserts_from_page(page)
 
-        # get_logpages does not include normal edits, so we need to go through list=allpages again
-        if rc_oldest is None or rc_oldest > since:
-            yield from self.gen_insert()
-
         # delete recent changes whose pages were deleted
         yield self.sql["delete", "deleted_recentchanges"]
 
+    def get_outdated_pages(self):
+        """
+        Compare the ``page`` table with a lightweight ``list=allpages``
+        listing and return the IDs of the pages which are missing or outdated
+        (i.e. their ``page_latest`` or ``page_touched`` differs) in the
+        database. Only these pages have to be fetched with all properties.
+
+        The listing is compared in chunks of ``db.chunk_size`` pages, so only
+        the rows of the pages in the current chunk are loaded from the
+        database.
+        """
+        page = self.db.page
+        query = sa.select([page.c.page_id, page.c.page_latest, page.c.page_touched]) \
+                  .where(page.c.page_id.in_(sa.bindparam("pageids", expanding=True)))
+
+        outdated = ws.utils.OrderedSet()
+        params = {
+            "generator": "allpages",
+            "gaplimit": "max",
+            "prop": "info",
+        }
+        for ns in self.api.site.namespaces.keys():
+            if ns < 0:
+                continue
+            params["gapnamespace"] = ns
+            for chunk in ws.utils.iter_chunks(self.api.generator(params), self.db.chunk_size):
+                remote = {p["pageid"]: (p["lastrevid"], p["touched"]) for p in chunk}
+                with self.db.connection() as conn:
+                    result = conn.execute(query, pageids=list(remote))
+                    local = {row.page_id: (row.page_latest, row.page_touched) for row in result}
+                for pageid, info in remote.items():
+                    if local.get(pageid) != info:
+                        outdated.add(pageid)
+        return outdated
+
     def get_rcpages(self, since):
         deleted_pageids = set()
         moved = []
         rcpages = ws.utils.OrderedSet()
         rctitles = ws.utils.OrderedSet()
 
-        rc_params = {
-            "list": "recentchanges",
-            "rctype": {"edit", "new", "log"},
-            "rcprop": {"ids", "loginfo", "title"},
-            "rcdir": "newer",
-            "rcstart": since,
-        }
-        for change in self.db.query(rc_params):
+        for change in self.feed.recentchanges(since):
             # add pageid for edits, new pages and target pages of log events
             # (this implicitly handles all protect, delete, import actions)
             if change["pageid"] > 0:
@@ -339,6 +370,8 @@ class GrabberPages(GrabberBase):
 
         # resolve titles to IDs (we actually need to call the API, see above)
         if rctitles:
+            # positions of the titles for sorting the API results
+            positions = {title: i for i, title in enumerate(rctitles)}
             for chunk in ws.utils.iter_chunks(rctitles, self.api.max_ids_per_query):
                 params = {
                     "action": "query",
@@ -355,8 +388,7 @@ class GrabberPages(GrabberBase):
 
                 # ordering of SQL inserts is important for moved pages, but MediaWiki does
                 # not return ordered results for the titles= parameter
-                keys = list(rctitles.keys())
-                pages.sort(key=lambda page: keys.index(normalized.get(page["title"], page["title"])))
+                pages.sort(key=lambda page: positions[normalized.get(page["title"], page["title"])])
 
                 for page in pages:
                     # skip missing pages (we don't detect "move without leaving a redirect" until here)
@@ -370,13 +402,8 @@ class GrabberPages(GrabberBase):
         moved = []
         modified = ws.utils.OrderedSet()
 
-        le_params = {
-            "list": "logevents",
-            "leprop": {"type", "details", "ids"},
-            "ledir": "newer",
-            "lestart": since,
-        }
-        for le in self.db.query(le_params):
+        le_types = {"delete", "protect", "move", "import", "suppress"}
+        for le in self.feed.logevents(since, type=le_types):
             if le["type"] in {"delete", "protect", "move", "import"}:
                 if le["action"] in {"delete_redir", "delete"}:
                     deleted_pageids.add(le["logpage"])
@@ -10,6 +10,8 @@ from .GrabberBase import GrabberBase
 
 class GrabberProtectedTitles(GrabberBase):
 
+    DEPENDS = ["GrabberRecentChanges", "GrabberLogging", "GrabberInterwiki"]
+
     INSERT_PREDELETE_TABLES = ["protected_titles"]
 
     def __init__(self, api, db):
@@ -112,14 +114,7 @@ class GrabberProtectedTitles(GrabberBase):
         if selects.oldest_rc_timestamp(self.db) > since:
             raise ShortRecentChangesError()
 
-        rc_params = {
-            "list": "recentchanges",
-            "rctype": {"new", "log"},
-            "rcprop": {"ids", "title", "loginfo"},
-            "rcdir": "newer",
-            "rcstart": since,
-        }
-        for change in self.db.query(rc_params):
+        for change in self.feed.recentchanges(since, type={"new", "log"}):
             if change["type"] == "log":
                 # note that pageid in recentchanges corresponds to log_page
                 if change["logtype"] == "protect" and change["pageid"] == 0:
@@ -14,6 +14,8 @@ logger = logging.getLogger(__name__)
 
 class GrabberRecentChanges(GrabberBase):
 
+    DEPENDS = ["GrabberNamespaces", "GrabberTags"]
+
     INSERT_PREDELETE_TABLES = ["recentchanges"]
 
     def __init__(self, api, db):
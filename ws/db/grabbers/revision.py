@@ -1,23 +1,36 @@
 #!/usr/bin/env python3
 
+import datetime
+import itertools
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import sqlalchemy as sa
 
 from ws.utils import value_or_none
 import ws.db.mw_constants as mwconst
 
-from .GrabberBase import GrabberBase
+from .GrabberBase import GrabberBase, Checkpoint
 
 logger = logging.getLogger(__name__)
 
 # TODO: are truncated results due to PHP cache reflected by changing the query-continuation parameter accordingly or do we actually lose some revisions?
 class GrabberRevisions(GrabberBase):
 
-    def __init__(self, api, db, *, with_content=False):
+    DEPENDS = ["GrabberPages", "GrabberUsers", "GrabberUserMerge", "GrabberTags", "GrabberRecentChanges", "GrabberLogging"]
+
+    # maximum number of SHA1 checksums remembered for the deduplication of
+    # the revision content, see gen_text_dedup
+    TEXT_IDS_CACHE_SIZE = 100000
+
+    def __init__(self, api, db, *, with_content=False, partitions=1):
         super().__init__(api, db)
         self.with_content = with_content
+        # number of concurrent partitions of the initial import
+        self.partitions = partitions
+        # text ID counter shared by the partitions
+        self.text_id_counter = None
 
         ins_text = sa.dialects.postgresql.insert(db.text)
         ins_revision = sa.dialects.postgresql.insert(db.revision)
@@ -195,15 +208,20 @@ class GrabberRevisions(GrabberBase):
 #                           "Skipping it, but the sync will be incomplete.")
 
     # TODO: text.old_id is auto-increment, but revision.rev_text_id has to be set accordingly. SQL should be able to do it automatically.
-    def _get_text_id_gen(self):
-        conn = self.db.engine.connect()
-        result = conn.execute(sa.select( [sa.sql.func.max(self.db.text.c.old_id)] ))
-        value = result.fetchone()[0]
+    def _get_max_text_id(self):
+        with self.db.connection() as conn:
+            result = conn.execute(sa.select( [sa.sql.func.max(self.db.text.c.old_id)] ))
+            value = result.fetchone()[0]
         if value is None:
             value = 0
-        while True:
-            value += 1
-            yield value
+        return value
+
+    def _get_text_id_gen(self):
+        if self.text_id_counter is not None:
+            # next() on itertools.count is atomic, so the counter can be
+            # shared by concurrent partitions
+            return self.text_id_counter
+        return itertools.count(self._get_max_text_id() + 1)
 
     def gen_text(self, rev, text_id):
         db_entry = {
@@ -214,7 +232,62 @@ class GrabberRevisions(GrabberBase):
         }
         yield self.sql["insert", "text"], db_entry
 
-    def gen_revisions(self, page):
+    def _reset_text_ids(self):
+        """
+        Reset the mapping of SHA1 checksums to the IDs of the text rows used by
+        :py:meth:`gen_text_dedup`. The mapping is bounded by
+        ``TEXT_IDS_CACHE_SIZE``, the least recently used entries are discarded
+        (which only means that some content is not deduplicated).
+        """
+        self.text_ids = sa.util.LRUCache(self.TEXT_IDS_CACHE_SIZE)
+
+    def gen_text_dedup(self, rev):
+        """
+        Yields the insert for the content of the revision, unless a text row
+        with the same SHA1 was recently inserted (or found in the database by
+        :py:meth:`_load_text_ids`). Reverts and null edits thus share the
+        text rows. Returns the ID of the text row for the revision.
+
+        ``self.text_ids`` has to be reset together with ``self.text_id_gen``.
+        """
+        sha1 = rev.get("sha1")
+        if sha1 is not None and sha1 in self.text_ids:
+            return self.text_ids[sha1]
+        text_id = next(self.text_id_gen)
+        yield from self.gen_text(rev, text_id)
+        if sha1 is not None:
+            self.text_ids[sha1] = text_id
+        return text_id
+
+    def _load_text_ids(self, page):
+        """
+        Load the IDs of the existing text rows for the revisions of the page
+        into ``self.text_ids``. Identical content is looked up only among the
+        revisions of the same page, which can use the ``rev_page_id`` index.
+        """
+        if not page.get("pageid"):
+            return
+        sha1s = {rev["sha1"] for rev in page["revisions"] if rev.get("sha1") and rev["sha1"] not in self.text_ids}
+        if not sha1s:
+            return
+        rev = self.db.revision
+        query = sa.select([rev.c.rev_sha1, sa.func.min(rev.c.rev_text_id)]) \
+                  .where(rev.c.rev_page == page["pageid"]) \
+                  .where(rev.c.rev_sha1.in_(sha1s)) \
+                  .where(rev.c.rev_text_id != None) \
+                  .group_by(rev.c.rev_sha1)
+        with self.db.connection() as conn:
+            for sha1, text_id in conn.execute(query):
+                self.text_ids[sha1] = text_id
+
+    def gen_revisions(self, page, *, dedup_existing=False):
+        """
+        :param bool dedup_existing:
+            whether the content should be deduplicated also with the text rows
+            already present in the database (not needed for the initial insert)
+        """
+        if self.with_content is True and dedup_existing is True:
+            self._load_text_ids(page)
         for rev in page["revisions"]:
             db_entry = {
                 "rev_id": rev["revid"],
@@ -235,9 +308,7 @@ class GrabberRevisions(GrabberBase):
             }
 
             if self.with_content is True:
-                text_id = next(self.text_id_gen)
-                db_entry["rev_text_id"] = text_id
-                yield from self.gen_text(rev, text_id)
+                db_entry["rev_text_id"] = yield from self.gen_text_dedup(rev)
 
             yield self.sql["insert", "revision"], db_entry
 
@@ -274,9 +345,7 @@ class GrabberRevisions(GrabberBase):
             }
 
             if self.with_content is True:
-                text_id = next(self.text_id_gen)
-                db_entry["ar_text_id"] = text_id
-                yield from self.gen_text(rev, text_id)
+                db_entry["ar_text_id"] = yield from self.gen_text_dedup(rev)
 
             yield self.sql["insert", "archive"], db_entry
 
@@ -289,16 +358,126 @@ class GrabberRevisions(GrabberBase):
 
     def gen_insert(self):
         # we need one instance per transaction
+        # (the data is committed at checkpoints, but the text rows are not
+        # inserted by anything else while this generator is running)
         self.text_id_gen = self._get_text_id_gen()
+        self._reset_text_ids()
 
-        for page in self.api.list(self.arv_params):
-            yield from self.gen_revisions(page)
-        for page in self.api.list(self.adr_params):
-            yield from self.gen_deletedrevisions(page)
+        lists = [
+            (self.arv_params, self.gen_revisions),
+            (self.adr_params, self.gen_deletedrevisions),
+        ]
+        # partitions of a parallel insert may skip some lists
+        lists = [(params, gen) for params, gen in lists if params is not None]
+        # skip the lists which were finished before the checkpoint
+        start = 0
+        continue_ = None
+        if self.checkpoint is not None:
+            start = [params["list"] for params, _ in lists].index(self.checkpoint["list"])
+            continue_ = self.checkpoint["continue"]
+
+        for params, gen in lists[start:]:
+            for pages, continue_ in self.api.list_chunks(params, continue_=continue_):
+                for page in pages:
+                    yield from gen(page)
+                if continue_ is not None:
+                    yield Checkpoint({"list": params["list"], "continue": continue_})
+
+    def _get_partition_windows(self, sync_timestamp):
+        """
+        Split the time span of all revisions into ``self.partitions`` windows
+        of the same length. The first and last windows are open, so that
+        all revisions are covered.
+        """
+        params = {
+            "action": "query",
+            "list": "allrevisions",
+            "arvprop": "timestamp",
+            "arvdir": "newer",
+            "arvlimit": "1",
+        }
+        pages = self.api.call_api(params)["allrevisions"]
+        if len(pages) == 0:
+            return [{"start": None, "end": None}]
+        oldest = pages[0]["revisions"][0]["timestamp"]
+
+        step = (sync_timestamp - oldest) / self.partitions
+        boundaries = [(oldest + i * step).replace(microsecond=0) for i in range(1, self.partitions)]
+        starts = [None] + boundaries
+        # the timestamps have a resolution of seconds and arvend is inclusive
+        ends = [b - datetime.timedelta(seconds=1) for b in boundaries] + [None]
+        return [{"start": start, "end": end} for start, end in zip(starts, ends)]
+
+    def _get_partition(self, i, window):
+        """
+        Create a grabber for the ``i``-th partition of a parallel insert. Each
+        partition has its own key in the ``ws_sync`` table, so it can be
+        resumed independently.
+        """
+        part = GrabberRevisions(self.api, self.db, with_content=self.with_content)
+        part.sync_key = "{}:{}".format(self.sync_key, i)
+        part.text_id_counter = self.text_id_counter
+        part.arv_params["arvdir"] = "newer"
+        if window["start"] is not None:
+            part.arv_params["arvstart"] = window["start"]
+        if window["end"] is not None:
+            part.arv_params["arvend"] = window["end"]
+        # deleted revisions are not partitioned, they are much less common
+        if i > 0:
+            part.adr_params = None
+        return part
+
+    def insert(self):
+        """
+        With ``partitions > 1``, the ``allrevisions`` list is split into
+        timestamp windows which are imported concurrently, each with its own
+        API query and database transactions. An interrupted parallel insert
+        is always resumed with the saved windows, regardless of
+        ``partitions``.
+
+        Note that all partitions share the same API object and thus also the
+        rate limit of :py:meth:`ws.client.connection.Connection.request`, so
+        the speedup is limited mainly to overlapping the API requests with
+        the processing and database work of the other partitions.
+        """
+        ws_sync = self.db.ws_sync
+        delete_partitions = ws_sync.delete().where(ws_sync.c.wss_key.like(self.sync_key + ":%"))
+
+        checkpoint = self._get_sync_checkpoint()
+        if checkpoint is not None and "windows" in checkpoint["state"]:
+            logger.info("Resuming the interrupted parallel insert of {}.".format(self.sync_key))
+            sync_timestamp = checkpoint["timestamp"]
+            windows = checkpoint["state"]["windows"]
+        elif checkpoint is not None or self.partitions <= 1:
+            # serial insert or resume the interrupted serial insert
+            super().insert()
+            return
+        else:
+            sync_timestamp = datetime.datetime.utcnow()
+            windows = self._get_partition_windows(sync_timestamp)
+            # save the windows, the partitions have to be the same when resumed
+            with self.db.engine.begin() as conn:
+                conn.execute(delete_partitions)
+                self._set_sync_checkpoint(sync_timestamp, {"windows": windows}, conn)
+
+        self.text_id_counter = itertools.count(self._get_max_text_id() + 1)
+        parts = [self._get_partition(i, window) for i, window in enumerate(windows)]
+        # skip partitions finished before the interruption
+        parts = [part for part in parts if part._get_sync_timestamp() is None]
+
+        with ThreadPoolExecutor(max_workers=max(len(parts), 1)) as executor:
+            futures = [executor.submit(part.insert) for part in parts]
+            for future in futures:
+                future.result()
+
+        with self.db.engine.begin() as conn:
+            conn.execute(delete_partitions)
+            self._set_sync_timestamp(sync_timestamp, conn)
 
     def gen_update(self, since):
         # we need one instance per transaction
         self.text_id_gen = self._get_text_id_gen()
+        self._reset_text_ids()
 
         # save new revids for the tag updates
         new_revids = set()
@@ -308,7 +487,7 @@ class GrabberRevisions(GrabberBase):
         arv_params["arvdir"] = "newer"
         arv_params["arvstart"] = since
         for page in self.api.list(arv_params):
-            yield from self.gen_revisions(page)
+            yield from self.gen_revisions(page, dedup_existing=True)
             for rev in page["revisions"]:
                 new_revids.add(rev["revid"])
 
@@ -323,13 +502,8 @@ class GrabberRevisions(GrabberBase):
         suppressed_pages = set()
         # TODO: what about unsuppressed?
 
-        le_params = {
-            "list": "logevents",
-            "leprop": {"type", "details", "title", "ids"},
-            "ledir": "newer",
-            "lestart": since,
-        }
-        for le in self.db.query(le_params):
+        le_types = {"delete", "suppress", "import", "merge", "move", "tag"}
+        for le in self.feed.logevents(since, type=le_types):
             # check logevents for delete/undelete
             if le["type"] == "delete":
                 if le["action"] == "delete" or le["action"] == "delete_redir":
@@ -452,7 +626,7 @@ class GrabberRevisions(GrabberBase):
                 raise NotImplementedError("Handling of the 'rvcontinue' and 'drvcontinue' parameters is not implemented.")
             for page in result["query"]["pages"].values():
                 if "revisions" in page:
-                    yield from self.gen_revisions(page)
+                    yield from self.gen_revisions(page, dedup_existing=True)
                     for rev in page["revisions"]:
                         new_revids.add(rev["revid"])
                 if "deletedrevisions" in page:
@@ -488,29 +662,26 @@ class GrabberRevisions(GrabberBase):
             yield self.sql["suppress-page", "archive"], {"b_ns": ns, "b_title": title, "ar_deleted": ar_deleted }
 
         # update tags
+        # Deleted revisions cannot be tagged in MediaWiki, but they might be
+        # undeleted, tagged, and deleted again before the sync. For inserts we
+        # have to check manually if it is normal or archived revision, otherwise
+        # we would get foreign key errors. New revisions added in this sync are
+        # skipped, so we don't mind if the queued queries were not executed yet.
+        if added_tags:
+            existing_revids = self._select_existing(self.db.revision.c.rev_id, added_tags)
+            # check which are recent changes to tag them as well
+            rc_revids = self._select_existing(self.db.recentchanges.c.rc_this_oldid, added_tags)
         for revid, added in added_tags.items():
             for tag in added:
-                # Deleted revisions cannot be tagged in MediaWiki, but they might be
-                # undeleted, tagged, and deleted again before the sync. For inserts we
-                # have to check manually if it is normal or archived revision, otherwise
-                # we would get foreign key errors. New revisions added in this sync are
-                # skipped, so we don't mind if the queued queries were not executed yet.
                 db_entry = {
                     "b_rev_id": revid,
                     "b_tag_name": tag,
                 }
-                result = self.db.engine.execute(sa.select([
-                            sa.exists().where(self.db.revision.c.rev_id == revid)
-                        ]))
-                if result.fetchone()[0]:
+                if revid in existing_revids:
                     yield self.sql["insert", "tagged_revision"], db_entry
                 else:
                     yield self.sql["insert", "tagged_archived_revision"], db_entry
-                # check if it is a recent change and tag it as well
-                result = self.db.engine.execute(sa.select([
-                            sa.exists().where(self.db.recentchanges.c.rc_this_oldid == revid)
-                        ]))
-                if result.fetchone()[0]:
+                if revid in rc_revids:
                     yield self.sql["insert", "tagged_recentchange"], db_entry
 
         for revid, removed in removed_tags.items():
@@ -532,6 +703,18 @@ class GrabberRevisions(GrabberBase):
         time1 = time.time()
         counter = 0
 
+        def stream_revids(query):
+            # the revids are fetched from a server-side cursor in chunks of
+            # db.fetch_size rows, so that they do not have to fit into memory
+            # (the cursor uses its own connection and a snapshot taken before
+            # the updates below)
+            result = self.db.engine.execution_options(stream_results=True, max_row_buffer=self.db.fetch_size).execute(query)
+            try:
+                for row in result:
+                    yield row[0]
+            finally:
+                result.close()
+
         def get_latest_revids():
             rev = self.db.revision
             page = self.db.page
@@ -539,26 +722,44 @@ class GrabberRevisions(GrabberBase):
                         rev.join(page, (rev.c.rev_page == page.c.page_id) &
                                        (rev.c.rev_id == page.c.page_latest))
                     ).where(rev.c.rev_text_id == None).order_by(rev.c.rev_id)
-            conn = self.db.engine.connect()
-            result = conn.execute(query)
-            return [r[0] for r in result]
+            return stream_revids(query)
 
         def get_all_revids():
             rev = self.db.revision
             query = sa.select([rev.c.rev_id]).select_from(
                         rev
                     ).where(rev.c.rev_text_id == None).order_by(rev.c.rev_id)
-            conn = self.db.engine.connect()
-            result = conn.execute(query)
-            return [r[0] for r in result]
+            return stream_revids(query)
+
+        def dedup_existing():
+            # revisions with the same content as another revision of the same
+            # page (e.g. reverts and null edits) share its text row, so their
+            # content does not have to be fetched at all
+            rev = self.db.revision
+            rev2 = rev.alias("rev2")
+            upd = rev.update() \
+                    .values(rev_text_id=rev2.c.rev_text_id) \
+                    .where(rev.c.rev_text_id == None) \
+                    .where(rev2.c.rev_page == rev.c.rev_page) \
+                    .where(rev2.c.rev_sha1 == rev.c.rev_sha1) \
+                    .where(rev2.c.rev_text_id != None)
+            with self.db.engine.begin() as conn:
+                result = conn.execute(upd)
+            if result.rowcount:
+                logger.info("Reused existing text rows for {} revisions with duplicate content.".format(result.rowcount))
+
+        if mode == "all":
+            dedup_existing()
 
         params = {
             "action": "query",
             "revids": get_latest_revids() if mode == "latest" else get_all_revids(),
             "prop": "revisions",
-            "rvprop": "ids|content",
+            "rvprop": "ids|sha1|content",
             "rvslots": "main",
         }
+        # IDs of the text rows inserted in previous chunks (already committed)
+        self._reset_text_ids()
         for result in self.api.call_api_autoiter_ids(params, expand_result=False):
             fetched_revids = set()
 
@@ -575,12 +776,11 @@ class GrabberRevisions(GrabberBase):
                         logger.warning("Skipping synchronization of revisions from deleted page [[{}]].".format(page["title"]))
                         continue
                     for rev in page["revisions"]:
-                        text_id = next(self.text_id_gen)
+                        text_id = yield from self.gen_text_dedup(rev)
                         db_entry = {
                             "b_rev_id": rev["revid"],
                             "rev_text_id": text_id
                         }
-                        yield from self.gen_text(rev, text_id)
                         yield self.sql["update", "revision"], db_entry
                         counter += 1
                         fetched_revids.add(rev["revid"])
@@ -16,6 +16,8 @@ logger = logging.getLogger(__name__)
 
 class GrabberUsers(GrabberBase):
 
+    DEPENDS = ["GrabberRecentChanges"]
+
     # We never delete from the user table, otherwise FK constraints might kick in.
     # If we find out that MediaWiki sometimes deletes from the user table, it
     # should be handled differently.
@@ -141,14 +143,7 @@ class GrabberUsers(GrabberBase):
         # feature: https://stackoverflow.com/a/39980744 )
         renamed_users = {}
 
-        rc_params = {
-            "list": "recentchanges",
-            "rctype": {"edit", "new", "log"},
-            "rcprop": {"user", "title", "loginfo"},
-            "rcdir": "newer",
-            "rcstart": since,
-        }
-        for change in self.db.query(rc_params):
+        for change in self.feed.recentchanges(since):
             # add the performer of the edit, newpage or log entry
             rcusers.add(change["user"])
 
@@ -6,6 +6,8 @@ from .GrabberBase import GrabberBase
 
 class GrabberUserMerge(GrabberBase):
 
+    DEPENDS = ["GrabberUsers", "GrabberLogging"]
+
     def __init__(self, api, db):
         super().__init__(api, db)
 
@@ -41,15 +43,18 @@ class GrabberUserMerge(GrabberBase):
         # collect merged users
         # (note that usermerge events are not recorded in the recentchanges
         # table, see https://phabricator.wikimedia.org/T253726 )
-        le_params = {
-            "list": "logevents",
-            "letype": "usermerge",
-            "leprop": {"type", "details"},
-            "ledir": "newer",
-        }
-        if since is not None:
-            le_params["lestart"] = since
-        for logevent in self.db.query(le_params):
+        if since is None:
+            # full scan for the initial insert
+            le_params = {
+                "list": "logevents",
+                "letype": "usermerge",
+                "leprop": {"type", "details"},
+                "ledir": "newer",
+            }
+            logevents = self.db.query(le_params)
+        else:
+            logevents = self.feed.logevents(since, type="usermerge")
+        for logevent in logevents:
             if logevent["action"] == "mergeuser":
                 oldid = logevent["params"]["oldId"]
                 newid = logevent["params"]["newId"]
@@ -0,0 +1,30 @@
+"""use lz4 compression for text
+
+Revision ID: 3f9d2c71a5e8
+Revises: 6b2e4f8a1c07
+Create Date: 2026-10-18 14:27:41.518263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from ws.db.schema import supports_lz4_compression
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9d2c71a5e8'
+down_revision = '6b2e4f8a1c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # only new values are compressed with lz4, existing values are recompressed
+    # only when they are updated (or e.g. with VACUUM FULL)
+    if supports_lz4_compression(None, None, op.get_bind()):
+        op.execute("ALTER TABLE text ALTER COLUMN old_text SET COMPRESSION lz4")
+
+
+def downgrade():
+    if op.get_bind().dialect.server_version_info >= (14,):
+        op.execute("ALTER TABLE text ALTER COLUMN old_text SET COMPRESSION DEFAULT")
@@ -1,13 +1,16 @@
 #! /usr/bin/env python3
 
 import logging
-from functools import lru_cache
+import re
+import time
 
 import sqlalchemy as sa
 from sqlalchemy.dialects.postgresql import insert
 import mwparserfromhell
 import requests.packages.urllib3 as urllib3
 
+import ws.utils
+from .content_cache import ContentCache
 from .selects.namespaces import get_namespaces
 from ..parser_helpers.template_expansion import expand_templates
 from ..parser_helpers.wikicode import get_anchors, is_redirect, parented_ifilter
@@ -19,70 +22,146 @@ from ws.ArchWiki.lang import get_language_tags
 
 logger = logging.getLogger(__name__)
 
+# URLs matching this regex certainly have a non-empty host and are accepted by
+# urllib3.util.url.parse_url, so the parsing can be skipped for them
+_simple_url_re = re.compile(r"^(?:https?|ftps?)://[A-Za-z0-9][A-Za-z0-9.-]*(?::(?P<port>[0-9]{1,5}))?(?:[/?#]\S*)?$")
+
+def _needs_reparse(el):
+    """
+    Returns ``True`` if the URL of the external link might have been parsed
+    incorrectly, i.e. it contains anything but plain text (e.g. templates,
+    HTML entities or tags), or characters which are not valid in URLs.
+    """
+    nodes = el.url.nodes
+    if len(nodes) != 1 or not isinstance(nodes[0], mwparserfromhell.nodes.Text):
+        return True
+    url = nodes[0].value
+    return "{{" in url or "&" in url or "<" in url
+
+def _is_valid_url(url):
+    match = _simple_url_re.fullmatch(url)
+    if match is not None:
+        port = match.group("port")
+        if port is None or int(port) <= 65535:
+            return True
+    try:
+        # try to parse the URL - fails e.g. if port is not a number
+        # reference: https://urllib3.readthedocs.io/en/latest/reference/urllib3.util.html#urllib3.util.parse_url
+        parsed = urllib3.util.url.parse_url(url)
+    except urllib3.exceptions.LocationParseError:
+        return False
+    # skip URLs with empty host, e.g. "http://" or "http://git@" or "http:///var/run"
+    # (partial workaround for https://github.com/earwig/mwparserfromhell/issues/196 )
+    # GOTCHA: mailto:user@host is scheme + path only; auth, host and port are recognized only after //
+    return parsed.scheme == "mailto" or bool(parsed.host)
+
 def get_normalized_extlinks(wikicode):
-    # Pass 1: re-parse all external links, because "http://example.com/{{Dead link}}" was initially
+    # Pass 1: re-parse external links, because "http://example.com/{{Dead link}}" was initially
     # parsed as one big URL, but the template transcludes tags which should terminate the URL.
+    # Links whose URL is plain text are parsed correctly already, so only the
+    # rest is re-parsed (package lists etc. contain hundreds of simple links).
 #    for el in wikicode.filter_external_links(recursive=True):
 #        wikicode.replace(el, str(el))
     # performance optimization, see https://github.com/earwig/mwparserfromhell/issues/195
     for parent, el in parented_ifilter(wikicode, forcetype=mwparserfromhell.nodes.external_link.ExternalLink, recursive=True):
-        parent.replace(el, str(el), recursive=False)
+        if _needs_reparse(el):
+            parent.replace(el, str(el), recursive=False)
 
     extlinks = wikicode.filter_external_links(recursive=True)
 
     # Pass 2: normalize the URLs
-    for el in extlinks:
-        # strip whitespace like "\t"
-        el.url = str(el.url).strip()
-        # decode percent-encoding
+    # strip whitespace like "\t"
+    urls = [str(el.url).strip() for el in extlinks]
+    for i, url in enumerate(urls):
+        # decode percent-encoding (there is nothing to decode without "%")
         # MW incompatibility: MediaWiki decodes only some characters, spaces and some unicode characters with accents are encoded
-        try:
-            el.url = urldecode(str(el.url))
-        except UnicodeDecodeError:
-            pass
+        if "%" in url:
+            try:
+                urls[i] = urldecode(url)
+            except UnicodeDecodeError:
+                pass
+    # assigning to el.url parses the value, so skip it for unchanged URLs
+    for el, url in zip(extlinks, urls):
+        if url != str(el.url):
+            el.url = url
 
     # Pass 3: skip invalid URLs
     filtered_extlinks = []
-    for el in extlinks:
-        try:
-            # try to parse the URL - fails e.g. if port is not a number
-            # reference: https://urllib3.readthedocs.io/en/latest/reference/urllib3.util.html#urllib3.util.parse_url
-            url = urllib3.util.url.parse_url(str(el.url))
-            # skip URLs with empty host, e.g. "http://" or "http://git@" or "http:///var/run"
-            # (partial workaround for https://github.com/earwig/mwparserfromhell/issues/196 )
-            # GOTCHA: mailto:user@host is scheme + path only; auth, host and port are recognized only after //
-            if url.scheme != "mailto" and not url.host:
-                continue
+    for el, url in zip(extlinks, urls):
+        if _is_valid_url(url):
             filtered_extlinks.append(el)
-        except urllib3.exceptions.LocationParseError:
-            pass
 
     return filtered_extlinks
 
 class ParserCache:
-    def __init__(self, db):
+    """
+    Parser cache for the wiki-scripts database.
+
+    The invalidated pages are parsed in batches: rows for all pages in the
+    batch are accumulated in memory and compared with the rows currently
+    stored in the database. Only the difference is applied, i.e. one
+    ``DELETE`` statement for the outdated rows and multi-row ``INSERT``
+    statements for the new rows per table, in the same transaction as the
+    ``ws_parser_cache_sync`` entries of the batch. Since the invalidation
+    removes the ``ws_parser_cache_sync`` entries of the invalidated pages, an
+    interrupted update loses only the current batch, which is invalidated again
+    on the next run.
+
+    The invalidation is incremental by default: the maximum ``page_touched``
+    value seen by the last complete update is stored in the ``ws_sync`` table
+    and only pages touched since then (and the pages transcluding them) are
+    considered. The full scan comparing all pages with the
+    ``ws_parser_cache_sync`` table is used for the first update, after
+    :py:meth:`invalidate_all` and when ``incremental=False`` is passed to
+    :py:meth:`update`.
+
+    :param db: a :py:class:`ws.db.database.Database` instance
+    :param int batch_size:
+        number of pages whose content is fetched and whose rows are written in
+        one transaction
+    :param content_cache:
+        a :py:class:`ws.db.content_cache.ContentCache` instance used for the
+        template expansion (if ``None``, an in-memory cache is created)
+
+    Statistics about each page parsed by the last :py:meth:`update` are
+    collected in the :py:attr:`stats` list, see :py:meth:`get_report` for a
+    summary.
+    """
+
+    # mapping of the tables to their columns referencing the parsed page
+    # (the order is the order of executing the statements)
+    TABLES = {
+        "templatelinks": "tl_from",
+        "pagelinks": "pl_from",
+        "imagelinks": "il_from",
+        "categorylinks": "cl_from",
+        "langlinks": "ll_from",
+        "iwlinks": "iwl_from",
+        "externallinks": "el_from",
+        "redirect": "rd_from",
+        "section": "sec_page",
+        "ws_parser_cache_sync": "wspc_page_id",
+    }
+
+    def __init__(self, db, *, batch_size=100, content_cache=None):
+        if batch_size <= 0:  # pragma: no cover
+            raise ValueError("batch_size must be positive")
+
         self.db = db
+        self.batch_size = batch_size
+        if content_cache is None:
+            content_cache = ContentCache(db)
+        self.content_cache = content_cache
+        # per-page statistics collected by the last update
+        self.stats = []
+        # total duration of the last update (in seconds)
+        self.duration = None
         self.invalidated_pageids = set()
+        # mapping of namespace numbers to the invalidated pageids
+        self.invalidated_namespaces = {}
 
-        wspc_sync = self.db.ws_parser_cache_sync
-        wspc_sync_ins = insert(wspc_sync)
-
-        self.sql_inserts = {
-            "templatelinks": self.db.templatelinks.insert(),
-            "pagelinks": self.db.pagelinks.insert(),
-            "imagelinks": self.db.imagelinks.insert(),
-            "categorylinks": self.db.categorylinks.insert(),
-            "langlinks": self.db.langlinks.insert(),
-            "iwlinks": self.db.iwlinks.insert(),
-            "externallinks": self.db.externallinks.insert(),
-            "redirect": self.db.redirect.insert(),
-            "section": self.db.section.insert(),
-            "ws_parser_cache_sync":
-                wspc_sync_ins.on_conflict_do_update(
-                    constraint=wspc_sync.primary_key,
-                    set_={"wspc_rev_id": wspc_sync_ins.excluded.wspc_rev_id}
-                )
-        }
+        # rows accumulated for the current batch, grouped by table name
+        self.batch = {}
 
     def _execute(self, conn, query, *, explain=False):
         if explain is True:
@@ -94,53 +173,173 @@ class ParserCache:
 
         return conn.execute(query)
 
-    def _check_invalidation(self, conn):
+    def _transclusion_closure(self, seed):
+        """
+        Build a recursive query selecting the pages from ``seed`` and all pages
+        which transclude them, directly or transitively through other pages.
+
+        :param seed:
+            a select of the ``page_id``, ``page_namespace`` and ``page_title``
+            columns from the ``page`` table
+        """
         tl = self.db.templatelinks
         page = self.db.page
+
+        invalidated = seed.cte("invalidated", recursive=True)
+        src_page = page.alias()
+        # UNION (as opposed to UNION ALL) ensures termination even if the
+        # templates transclude each other
+        invalidated = invalidated.union(
+                    sa.select([src_page.c.page_id, src_page.c.page_namespace, src_page.c.page_title])
+                    .select_from(
+                        invalidated.join(tl, ( tl.c.tl_namespace == invalidated.c.page_namespace ) &
+                                             ( tl.c.tl_title == invalidated.c.page_title )
+                        )
+                        .join(src_page, tl.c.tl_from == src_page.c.page_id)
+                    )
+                )
+        return sa.select([invalidated.c.page_id, invalidated.c.page_namespace])
+
+    def _get_sync_timestamp(self, conn):
+        """
+        Get the ``page_touched`` watermark of the last complete update from the
+        ``ws_sync`` table.
+        """
+        ws_sync = self.db.ws_sync
+        sel = sa.select([ws_sync.c.wss_timestamp]) \
+              .where(ws_sync.c.wss_key == self.__class__.__name__)
+        row = conn.execute(sel).fetchone()
+        if row:
+            return row[0]
+        return None
+
+    def _set_sync_timestamp(self, conn, timestamp):
+        """
+        Set the ``page_touched`` watermark in the ``ws_sync`` table.
+        """
+        ws_sync = self.db.ws_sync
+        ins = insert(ws_sync)
+        ins = ins.on_conflict_do_update(
+                    constraint=ws_sync.primary_key,
+                    set_={"wss_timestamp": ins.excluded.wss_timestamp}
+                )
+        entry = {
+            "wss_key": self.__class__.__name__,
+            "wss_timestamp": timestamp,
+        }
+        conn.execute(ins, entry)
+
+    def _check_invalidation(self, conn, since=None):
+        """
+        :param since:
+            the ``page_touched`` watermark of the last complete update, or
+            ``None`` to check all pages
+        """
+        page = self.db.page
         wspc = self.db.ws_parser_cache_sync
 
+        outdated = ( wspc.c.wspc_rev_id == None ) | ( wspc.c.wspc_rev_id != page.c.page_latest )
+
         # pages with older revisions
         # (note that we don't join the templatelinks table here because we want
         # to invalidate also pages which don't have any template links)
-        query = sa.select([page.c.page_id]) \
+        seed = sa.select([page.c.page_id, page.c.page_namespace, page.c.page_title]) \
                 .select_from(
                     page.outerjoin(wspc, page.c.page_id == wspc.c.wspc_page_id)
-                ).where(
-                    ( wspc.c.wspc_rev_id == None ) |
-                    ( wspc.c.wspc_rev_id != page.c.page_latest )
-                )
-        for row in self._execute(conn, query):
-            self.invalidated_pageids.add(row["page_id"])
-
-        # pages transcluding older pages
-        src_page = page.alias()
-        target_page = page.alias()
-        query = sa.select([src_page.c.page_id]) \
-                .select_from(
-                    src_page.join(tl, tl.c.tl_from == src_page.c.page_id)
-                    .join(target_page, ( tl.c.tl_namespace == target_page.c.page_namespace ) &
-                                       ( tl.c.tl_title == target_page.c.page_title )
-                    )
-                    .outerjoin(wspc, target_page.c.page_id == wspc.c.wspc_page_id)
-                ).where(
-                    ( wspc.c.wspc_rev_id == None ) |
-                    ( wspc.c.wspc_rev_id != target_page.c.page_latest )
                 )
+        if since is None:
+            seed = seed.where(outdated)
+        else:
+            # Pages touched after the last complete update are taken regardless
+            # of ws_parser_cache_sync, because an interrupted update may have
+            # already parsed them, but not the pages transcluding them. Pages
+            # touched at the same time as the watermark might have been synced
+            # after the last update, so they are checked as well.
+            # (two selects so that both can use the page_touched index)
+            touched = sa.select([page.c.page_id, page.c.page_namespace, page.c.page_title]) \
+                        .where(page.c.page_touched > since)
+            seed = seed.where(( page.c.page_touched == since ) & outdated)
+            seed = sa.union(touched, seed).alias("seed")
+            seed = sa.select([seed.c.page_id, seed.c.page_namespace, seed.c.page_title])
+
+        # add pages transcluding older pages, following the whole chain of
+        # transclusions in one query
+        query = self._transclusion_closure(seed)
         for row in self._execute(conn, query):
             self.invalidated_pageids.add(row["page_id"])
+            ns = self.invalidated_namespaces.setdefault(row["page_namespace"], set())
+            ns.add(row["page_id"])
 
     def _invalidate(self, conn):
-        conn.execute(self.db.pagelinks.delete().where(self.db.pagelinks.c.pl_from.in_(self.invalidated_pageids)))
-        conn.execute(self.db.templatelinks.delete().where(self.db.templatelinks.c.tl_from.in_(self.invalidated_pageids)))
-        conn.execute(self.db.imagelinks.delete().where(self.db.imagelinks.c.il_from.in_(self.invalidated_pageids)))
-        conn.execute(self.db.categorylinks.delete().where(self.db.categorylinks.c.cl_from.in_(self.invalidated_pageids)))
-        conn.execute(self.db.langlinks.delete().where(self.db.langlinks.c.ll_from.in_(self.invalidated_pageids)))
-        conn.execute(self.db.iwlinks.delete().where(self.db.iwlinks.c.iwl_from.in_(self.invalidated_pageids)))
-        conn.execute(self.db.externallinks.delete().where(self.db.externallinks.c.el_from.in_(self.invalidated_pageids)))
-        conn.execute(self.db.redirect.delete().where(self.db.redirect.c.rd_from.in_(self.invalidated_pageids)))
-        conn.execute(self.db.section.delete().where(self.db.section.c.sec_page.in_(self.invalidated_pageids)))
-
-    def _insert_templatelinks(self, conn, pageid, transclusions):
+        # The rows in the recomputable tables are kept until the page is parsed
+        # again, see _flush. Pages which are not parsed (e.g. due to interruption)
+        # will be invalidated again next time.
+        conn.execute(self.db.ws_parser_cache_sync.delete().where(self.db.ws_parser_cache_sync.c.wspc_page_id.in_(self.invalidated_pageids)))
+
+    def _queue(self, table, db_entries):
+        """
+        Add rows for ``table`` into the current batch.
+        """
+        self.batch.setdefault(table, []).extend(db_entries)
+
+    def _diff(self, conn, table_name, pageids, db_entries):
+        """
+        Delete the rows of ``table_name`` which belong to ``pageids`` and are
+        not present in ``db_entries``. Returns the entries which are not present
+        in the table yet and need to be inserted.
+        """
+        table = self.db.metadata.tables[table_name]
+        from_column = table.c[self.TABLES[table_name]]
+        columns = [c.name for c in table.c]
+
+        query = sa.select(table.c).where(from_column.in_(pageids))
+        existing = set(tuple(row) for row in conn.execute(query))
+
+        # drop duplicates, preserve order
+        new = {}
+        for entry in db_entries:
+            new.setdefault(tuple(entry[c] for c in columns), entry)
+
+        # rows whose non-key values changed are deleted and inserted again
+        deleted = [row for row in existing if row not in new]
+        if deleted:
+            pk_columns = list(table.primary_key.columns)
+            pk_indexes = [columns.index(c.name) for c in pk_columns]
+            keys = [tuple(row[i] for i in pk_indexes) for row in deleted]
+            for chunk in ws.utils.list_chunks(keys, self.db.chunk_size):
+                conn.execute(table.delete().where(sa.tuple_(*pk_columns).in_(chunk)))
+
+        return [entry for row, entry in new.items() if row not in existing]
+
+    def _flush(self, conn):
+        """
+        Write all rows accumulated in the current batch and clear the batch.
+        """
+        # pages parsed in the current batch
+        pageids = set(entry["wspc_page_id"] for entry in self.batch.get("ws_parser_cache_sync", []))
+        if not pageids:
+            self.batch.clear()
+            return
+
+        for table_name in self.TABLES:
+            table = self.db.metadata.tables[table_name]
+            db_entries = self.batch.get(table_name, [])
+            if table_name != "ws_parser_cache_sync":
+                db_entries = self._diff(conn, table_name, pageids, db_entries)
+            if not db_entries:
+                continue
+            # multi-row INSERT statements (one round-trip per chunk instead of per row)
+            for chunk in ws.utils.list_chunks(db_entries, self.db.chunk_size):
+                ins = insert(table).values(chunk)
+                if table_name == "ws_parser_cache_sync":
+                    ins = ins.on_conflict_do_update(
+                                constraint=table.primary_key,
+                                set_={"wspc_rev_id": ins.excluded.wspc_rev_id}
+                            )
+                conn.execute(ins)
+        self.batch.clear()
+
+    def _insert_templatelinks(self, pageid, transclusions):
         db_entries = []
         for t in transclusions:
             title = self.db.Title(t)
@@ -152,9 +351,9 @@ class ParserCache:
             db_entries.append(entry)
 
         if db_entries:
-            conn.execute(self.sql_inserts["templatelinks"], db_entries)
+            self._queue("templatelinks", db_entries)
 
-    def _insert_pagelinks(self, conn, pageid, pagelinks):
+    def _insert_pagelinks(self, pageid, pagelinks):
         db_entries = []
         for title in pagelinks:
             entry = {
@@ -168,9 +367,9 @@ class ParserCache:
         db_entries = list({ (v["pl_from"], v["pl_namespace"], v["pl_title"] ): v for v in db_entries}.values())
 
         if db_entries:
-            conn.execute(self.sql_inserts["pagelinks"], db_entries)
+            self._queue("pagelinks", db_entries)
 
-    def _insert_imagelinks(self, conn, pageid, imagelinks):
+    def _insert_imagelinks(self, pageid, imagelinks):
         db_entries = []
         for title in imagelinks:
             entry = {
@@ -183,9 +382,9 @@ class ParserCache:
         db_entries = list({ (v["il_from"], v["il_to"] ): v for v in db_entries}.values())
 
         if db_entries:
-            conn.execute(self.sql_inserts["imagelinks"], db_entries)
+            self._queue("imagelinks", db_entries)
 
-    def _insert_categorylinks(self, conn, pageid, from_title, categorylinks):
+    def _insert_categorylinks(self, pageid, from_title, categorylinks):
         db_entries = []
         for title, prefix in categorylinks:
             sortkey = from_title.pagename.upper()
@@ -213,9 +412,9 @@ class ParserCache:
         db_entries = list({ (v["cl_from"], v["cl_to"] ): v for v in db_entries}.values())
 
         if db_entries:
-            conn.execute(self.sql_inserts["categorylinks"], db_entries)
+            self._queue("categorylinks", db_entries)
 
-    def _insert_langlinks(self, conn, pageid, langlinks):
+    def _insert_langlinks(self, pageid, langlinks):
         db_entries = []
         for title in langlinks:
             if title.namespace:
@@ -236,9 +435,9 @@ class ParserCache:
         db_entries = list({ (v["ll_from"], v["ll_lang"] ): v for v in db_entries}.values())
 
         if db_entries:
-            conn.execute(self.sql_inserts["langlinks"], db_entries)
+            self._queue("langlinks", db_entries)
 
-    def _insert_iwlinks(self, conn, pageid, iwlinks):
+    def _insert_iwlinks(self, pageid, iwlinks):
         db_entries = []
         for title in iwlinks:
             entry = {
@@ -252,9 +451,9 @@ class ParserCache:
         db_entries = list({ (v["iwl_from"], v["iwl_prefix"], v["iwl_title"] ): v for v in db_entries}.values())
 
         if db_entries:
-            conn.execute(self.sql_inserts["iwlinks"], db_entries)
+            self._queue("iwlinks", db_entries)
 
-    def _insert_externallinks(self, conn, pageid, externallinks):
+    def _insert_externallinks(self, pageid, externallinks):
         db_entries = []
         for ext in externallinks:
             url = str(ext.url)
@@ -268,12 +467,15 @@ class ParserCache:
         db_entries = list({ (v["el_from"], v["el_to"] ): v for v in db_entries}.values())
 
         if db_entries:
-            conn.execute(self.sql_inserts["externallinks"], db_entries)
+            self._queue("externallinks", db_entries)
 
-    def _insert_redirect(self, conn, pageid, target):
+    def _insert_redirect(self, pageid, target):
+        # all rows in a multi-row INSERT must have the same keys
         db_entry = {
             "rd_from": pageid,
             "rd_namespace": target.namespacenumber if not target.iwprefix else None,
+            "rd_interwiki": None,
+            "rd_fragment": None,
         }
 
         if target.iwprefix:
@@ -288,9 +490,9 @@ class ParserCache:
         if target.sectionname:
             db_entry["rd_fragment"] = target.sectionname
 
-        conn.execute(self.sql_inserts["redirect"], db_entry)
+        self._queue("redirect", [db_entry])
 
-    def _insert_section(self, conn, pageid, levels, headings):
+    def _insert_section(self, pageid, levels, headings):
         if headings:
             anchors = get_anchors(headings)
 
@@ -305,9 +507,9 @@ class ParserCache:
                 }
                 db_entries.append(db_entry)
 
-            conn.execute(self.sql_inserts["section"], db_entries)
+            self._queue("section", db_entries)
 
-    def _set_sync_revid(self, conn, pageid, revid):
+    def _set_sync_revid(self, pageid, revid):
         """
         Set the ``pageid``, ``revid`` pair in the ``ws_parser_cache_sync`` table.
         """
@@ -315,58 +517,49 @@ class ParserCache:
             "wspc_page_id": pageid,
             "wspc_rev_id": revid,
         }
-        conn.execute(self.sql_inserts["ws_parser_cache_sync"], entry)
-
-    # cacheable part of the content getter, using common cache across all SQL transactions
-    @lru_cache(maxsize=128)
-    def _cached_content_getter(self, title):
-        pages_gen = self.db.query(titles=title, prop="latestrevisions", rvprop="content")
-        page = next(pages_gen)
-
-        if "revisions" in page:
-            if "*" in page["revisions"][0]:
-                return page["revisions"][0]["*"]
-            else:
-                logger.error("ParserCache: no latest revision found for page [[{}]]".format(page["title"]))
-                raise ValueError
-        else:
-            # no revision => page does not exist
-            logger.warn("ParserCache: page not found: {{" + title + "}}")
-            raise ValueError
+        self._queue("ws_parser_cache_sync", [entry])
 
-    def _parse_page(self, conn, pageid, title, content):
+    def _parse_page(self, pageid, title, content):
         logger.info("ParserCache: parsing page [[{}]] ...".format(title))
+        start = time.perf_counter()
+        # number of rows queued for each table before parsing the page
+        queued = {table: len(self.batch.get(table, [])) for table in self.TABLES}
+
         title = self.db.Title(title)
 
         # set of all pages transcluded on the current page
         # (will be filled by the content_getter function)
         transclusions = set()
+        # number of calls to the content_getter function
+        fetched = 0
 
         def content_getter(title):
             # skip pages in the Special: and Media: namespaces
             # (even MediaWiki does not track such transclusions in the templatelinks table)
             if title.namespacenumber < 0:
                 raise ValueError
-            # set and lru_cache need hashable types
-            title = str(title)
-            nonlocal transclusions
-            transclusions.add(title)
-            return self._cached_content_getter(title)
+            nonlocal transclusions, fetched
+            fetched += 1
+            # set needs hashable types
+            transclusions.add(str(title))
+            return self.content_cache.get(title)
 
         wikicode = mwparserfromhell.parse(content)
+        expansion_start = time.perf_counter()
         expand_templates(title, wikicode, content_getter)
+        expansion_time = time.perf_counter() - expansion_start
 
-        logger.debug("ParserCache: content getter cache statistics: {}".format(self._cached_content_getter.cache_info()))
+        logger.debug("ParserCache: content getter cache statistics: {}".format(self.content_cache.cache_info()))
 
         # templatelinks can be updated right away
-        self._insert_templatelinks(conn, pageid, transclusions)
+        self._insert_templatelinks(pageid, transclusions)
 
         # parse redirect using regex-based parser helper
         if is_redirect(str(wikicode)):
             page_is_redirect = True
             # the redirect target is just the first wikilink
             redirect_target = wikicode.filter_wikilinks()[0]
-            self._insert_redirect(conn, pageid, self.db.Title(str(redirect_target.title)))
+            self._insert_redirect(pageid, self.db.Title(str(redirect_target.title)))
         else:
             page_is_redirect = False
 
@@ -380,7 +573,7 @@ class ParserCache:
         # normalize and extract external links
         # (should be done before wikilinks and other nodes, because URLs need to be re-parsed due to adjacent templates)
         extlinks = get_normalized_extlinks(wikicode)
-        self._insert_externallinks(conn, pageid, extlinks)
+        self._insert_externallinks(pageid, extlinks)
 
         pagelinks = []
         imagelinks = []
@@ -436,11 +629,11 @@ class ParserCache:
                 if target.namespacenumber >= 0:
                     pagelinks.append(target)
 
-        self._insert_pagelinks(conn, pageid, pagelinks)
-        self._insert_iwlinks(conn, pageid, iwlinks)
-        self._insert_categorylinks(conn, pageid, title, categorylinks)
-        self._insert_langlinks(conn, pageid, langlinks)
-        self._insert_imagelinks(conn, pageid, imagelinks)
+        self._insert_pagelinks(pageid, pagelinks)
+        self._insert_iwlinks(pageid, iwlinks)
+        self._insert_categorylinks(pageid, title, categorylinks)
+        self._insert_langlinks(pageid, langlinks)
+        self._insert_imagelinks(pageid, imagelinks)
 
         # extract section headings
         levels = []
@@ -448,34 +641,106 @@ class ParserCache:
         for heading in wikicode.ifilter_headings(recursive=True):
             levels.append(heading.level)
             headings.append(heading.title.strip())
-        self._insert_section(conn, pageid, levels, headings)
+        self._insert_section(pageid, levels, headings)
 
-    def update(self):
+        links = {}
+        for table in self.TABLES:
+            if table == "ws_parser_cache_sync":
+                continue
+            links[table] = len(self.batch.get(table, [])) - queued[table]
+        self.stats.append({
+            "pageid": pageid,
+            "title": str(title),
+            "content_size": len(content),
+            "parse_time": time.perf_counter() - start,
+            "expansion_time": expansion_time,
+            "templates_fetched": fetched,
+            "links": links,
+        })
+
+    def get_report(self, *, slowest=10):
+        """
+        Return a summary of the statistics collected by the last
+        :py:meth:`update`. The result is a JSON-serializable dictionary with
+        the following keys:
+
+        - ``pages``: number of parsed pages
+        - ``duration``: total duration of the update (in seconds)
+        - ``parse_time``: total time spent in parsing the pages (in seconds)
+        - ``pages_per_second``: overall throughput of the update
+        - ``slowest``: list of statistics for the ``slowest`` pages with the
+          largest ``parse_time``, see :py:attr:`stats` for the format
+
+        :param int slowest: number of the slowest pages to include
+        """
+        parse_time = sum(entry["parse_time"] for entry in self.stats)
+        if self.duration:
+            pages_per_second = len(self.stats) / self.duration
+        else:
+            pages_per_second = None
+        return {
+            "pages": len(self.stats),
+            "duration": self.duration,
+            "parse_time": parse_time,
+            "pages_per_second": pages_per_second,
+            "slowest": sorted(self.stats, key=lambda entry: entry["parse_time"], reverse=True)[:slowest],
+        }
+
+    def update(self, *, incremental=True):
+        """
+        Parse the invalidated pages and update the parser cache tables.
+
+        :param bool incremental:
+            whether to check only pages touched since the last complete update
+            (if there was one)
+        """
         self.invalidated_pageids = set()
+        self.invalidated_namespaces = {}
+        self.stats = []
+        self.duration = None
+        start = time.perf_counter()
+        # the database might have been synchronized since the last update
+        self.content_cache.reset()
         namespaces = get_namespaces(self.db)
 
         logger.info("ParserCache: Invalidating old entries...")
         with self.db.engine.begin() as conn:
-            self._check_invalidation(conn)
+            since = self._get_sync_timestamp(conn) if incremental is True else None
+            # the new watermark is stored after all invalidated pages are parsed
+            result = conn.execute(sa.select([sa.func.max(self.db.page.c.page_touched)]))
+            sync_timestamp = result.fetchone()[0]
+
+            self._check_invalidation(conn, since)
             self._invalidate(conn)
         logger.debug("Invalidated pageids: {}".format(self.invalidated_pageids))
 
         if not self.invalidated_pageids:
             logger.info("ParserCache: All latest revisions have already been parsed.")
+            if sync_timestamp is not None:
+                with self.db.engine.begin() as conn:
+                    self._set_sync_timestamp(conn, sync_timestamp)
+            self.duration = time.perf_counter() - start
             return
 
         logger.info("ParserCache: Parsing new content...")
 
         def parse_namespace(ns):
-            for page in self.db.query(generator="allpages", gapnamespace=ns, prop="latestrevisions", rvprop={"content", "ids"}):
-                # one transaction per page
-                with self.db.engine.begin() as conn:
+            pageids = sorted(self.invalidated_namespaces.get(ns, set()))
+            # fetch the content only for the invalidated pages
+            for chunk in ws.utils.iter_chunks(pageids, self.batch_size):
+                self.batch.clear()
+                for page in self.db.query(pageids=set(chunk), prop="latestrevisions", rvprop={"content", "ids"}):
+                    # skip pages deleted since the invalidation
+                    if "missing" in page:
+                        continue
                     if "*" in page["revisions"][0]:
-                        if page["pageid"] in self.invalidated_pageids:
-                            self._parse_page(conn, page["pageid"], page["title"], page["revisions"][0]["*"])
-                            self._set_sync_revid(conn, page["pageid"], page["revisions"][0]["revid"])
+                        self._parse_page(page["pageid"], page["title"], page["revisions"][0]["*"])
+                        self._set_sync_revid(page["pageid"], page["revisions"][0]["revid"])
                     else:
                         logger.error("ParserCache: no latest revision found for page [[{}]]".format(page["title"]))
+                # one transaction per batch
+                with self.db.engine.begin() as conn:
+                    self._flush(conn)
 
         # parse templates before the main namespace so that we can interrupt afterwards
         parse_namespace(10)
@@ -485,6 +750,20 @@ class ParserCache:
                 continue
             parse_namespace(ns)
 
+        logger.info("ParserCache: content cache statistics: {}".format(self.content_cache.cache_info()))
+
+        with self.db.engine.begin() as conn:
+            self._set_sync_timestamp(conn, sync_timestamp)
+
+        self.duration = time.perf_counter() - start
+        report = self.get_report(slowest=5)
+        logger.info("ParserCache: parsed {} pages in {:.1f} seconds ({:.2f} pages per second)"
+                    .format(report["pages"], report["duration"], report["pages_per_second"]))
+        for entry in report["slowest"]:
+            logger.info("ParserCache: slow page [[{}]]: {:.3f} seconds (expansion {:.3f} seconds, {} templates fetched)"
+                        .format(entry["title"], entry["parse_time"], entry["expansion_time"], entry["templates_fetched"]))
+
     def invalidate_all(self):
         with self.db.engine.begin() as conn:
             conn.execute(self.db.ws_parser_cache_sync.delete())
+            conn.execute(self.db.ws_sync.delete().where(self.db.ws_sync.c.wss_key == self.__class__.__name__))
@@ -48,7 +48,8 @@ Known incompatibilities from MediaWiki schema:
 # - try to normalize revision + archive
 
 from sqlalchemy import \
-        Table, Column, ForeignKey, Index, PrimaryKeyConstraint, ForeignKeyConstraint, CheckConstraint
+        Table, Column, ForeignKey, Index, PrimaryKeyConstraint, ForeignKeyConstraint, CheckConstraint, \
+        DDL, event
 from sqlalchemy.types import \
         Boolean, SmallInteger, Integer, Float, \
         UnicodeText, Enum, DateTime, ARRAY
@@ -57,6 +58,20 @@ from .sql_types import \
         MWTimestamp, SHA1, JSONEncodedDict
 
 
+def supports_lz4_compression(ddl, target, bind, **kwargs):
+    """
+    Check if the PostgreSQL server supports the lz4 compression method for
+    TOAST (it has to be compiled with ``--with-lz4``).
+    """
+    if bind.dialect.server_version_info < (14,):
+        return False
+    # enum of the default_toast_compression setting contains only the methods
+    # which the server was compiled with
+    result = bind.execute("SELECT 'lz4' = ANY(enumvals) FROM pg_settings WHERE name = 'default_toast_compression'")
+    row = result.fetchone()
+    return bool(row and row[0])
+
+
 def create_custom_tables(metadata):
     # Even special namespaces (with negative IDs) are included, because the recentchanges and logging tables reference them.
     # But most foreign keys should be restricted to non-negative values using a CHECK constraint.
@@ -103,7 +118,9 @@ def create_custom_tables(metadata):
     ws_sync = Table("ws_sync", metadata,
         Column("wss_key", UnicodeText, nullable=False, primary_key=True),
         # timestamp of the last successful sync of the table
-        Column("wss_timestamp", DateTime, nullable=False)
+        Column("wss_timestamp", DateTime),
+        # continuation of an interrupted initial sync of the table
+        Column("wss_checkpoint", JSONEncodedDict)
     )
 
 
@@ -377,6 +394,11 @@ def create_revisions_tables(metadata):
         # (everything is utf-8, compression is done transparently by PostgreSQL, PHP
         # objects are not supported and we will never support external storage)
     )
+    # lz4 is much faster than the default pglz compression method for TOAST
+    # (only PostgreSQL 14 and newer; existing values are not recompressed)
+    event.listen(text, "after_create",
+                 DDL("ALTER TABLE text ALTER COLUMN old_text SET COMPRESSION lz4")
+                 .execute_if(callable_=supports_lz4_compression))
 
     tagged_revision = Table("tagged_revision", metadata,
         Column("tgrev_tag_id", Integer, ForeignKey("tag.tag_id", ondelete="CASCADE", deferrable=True, initially="DEFERRED"), nullable=False),
@@ -414,6 +436,8 @@ def create_pages_tables(metadata):
     )
     Index("page_namespace_title", page.c.page_namespace, page.c.page_title, unique=True)
     Index("page_len", page.c.page_len)
+    # for the incremental invalidation of the parser cache
+    Index("page_touched", page.c.page_touched)
     Index("page_redirect_namespace_len", page.c.page_is_redirect, page.c.page_namespace, page.c.page_len)
 
     page_props = Table("page_props", metadata,
@@ -475,6 +499,8 @@ def create_recomputable_tables(metadata):
         PrimaryKeyConstraint("tl_from", "tl_namespace", "tl_title"),
         CheckConstraint("tl_namespace >= 0", name="check_namespace")
     )
+    # for looking up pages transcluding given page (parser cache invalidation)
+    Index("tl_namespace_title_from", templatelinks.c.tl_namespace, templatelinks.c.tl_title, templatelinks.c.tl_from)
 
     # tracks links to images/files used inline (e.g. [[File:Name]])
     imagelinks = Table("imagelinks", metadata,
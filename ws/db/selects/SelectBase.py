@@ -41,12 +41,48 @@ class SelectBase:
                 new_params[new_key] = value
         return new_params
 
-    def execute_sql(self, query, *, explain=False):
+    def execute_sql(self, query, *, explain=False, stream=False, params=None, cache=False):
+        """
+        Execute the query and return the result.
+
+        The query is executed on the connection provided by
+        :py:meth:`ws.db.database.Database.connection` and all rows are fetched
+        before the connection is released, i.e. the result is a list of rows.
+
+        :param dict params: values of the bind parameters of the query
+        :param bool cache:
+            If ``True``, the compiled form of the query is cached in
+            ``db.compiled_cache``. Use only for query objects which are reused
+            for multiple executions.
+        :param bool stream:
+            If ``True``, the rows are fetched from a server-side cursor in
+            chunks of ``db.fetch_size`` rows instead of loading the whole
+            result into memory and a result proxy is returned. Server-side
+            cursors need a transaction, so they cannot use the shared
+            ``AUTOCOMMIT`` connection and the query is executed on a separate
+            connection from the pool. The caller should close the result when
+            done with it, because the cursor keeps the connection busy.
+        """
+        if params is None:
+            params = {}
+
         if explain is True:
             from ws.db.database import explain
-            result = self.db.engine.execute(explain(query))
-            print(query)
-            for row in result:
-                print(row[0])
+            with self.db.connection() as conn:
+                result = conn.execute(explain(query), **params)
+                print(query)
+                for row in result:
+                    print(row[0])
+
+        options = {}
+        if cache is True:
+            options["compiled_cache"] = self.db.compiled_cache
+        if stream is True:
+            options["stream_results"] = True
+            options["max_row_buffer"] = self.db.fetch_size
+            return self.db.engine.execution_options(**options).execute(query, **params)
 
-        return self.db.engine.execute(query)
+        with self.db.connection() as conn:
+            if options:
+                conn = conn.execution_options(**options)
+            return conn.execute(query, **params).fetchall()
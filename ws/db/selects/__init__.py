@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import builtins
 from collections import OrderedDict
 
 import sqlalchemy as sa
@@ -75,6 +76,14 @@ __classes_props = {
 }
 
 def list(db, params):
+    """
+    Execute a query to a ``list=`` module and yield the results.
+
+    If the ``limit`` parameter (e.g. ``rclimit``) is given and there are more
+    results, the generator returns the parameters for the continuation in the
+    MediaWiki format, e.g. ``{"rccontinue": "20200101123456|42", "continue": "-||"}``.
+    The value can be obtained with ``cont = yield from db.query(...)``.
+    """
     assert "list" in params
     list = params.pop("list")
     if list not in __classes_lists:
@@ -86,16 +95,32 @@ def list(db, params):
     s.sanitize_params(list_params)
     query = s.get_select(list_params)
 
+    limit = list_params.get("limit", "max")
+    if limit != "max":
+        limit = int(limit)
+
     # TODO: some lists like allrevisions should group the results per page like MediaWiki
-    result = s.execute_sql(query)
-    for row in result:
-        yield s.db_to_api(row)
-    result.close()
+    result = s.execute_sql(query, stream=True)
+    try:
+        for i, row in enumerate(result):
+            # the query selects one row more than the limit, it starts the next continuation
+            if i == limit:
+                return {s.API_PREFIX + "continue": s.get_continue(row), "continue": "-||"}
+            yield s.db_to_api(row)
+    finally:
+        result.close()
 
 def get_pageset(db, titles=None, pageids=None):
     """
-    :param list titles: list of :py:class:`ws.parser_helpers.title.Title` objects
-    :param list pageids: list of :py:obj:`int` objects
+    Returns the selects for the pageset specified by ``titles=`` or
+    ``pageids=``. The values are not embedded in the selects, they have to be
+    passed as the ``titles`` or ``pageids`` parameter on execution. The
+    selects can therefore be reused for different pagesets.
+
+    :param bool titles: whether the pageset is specified by titles; the
+        ``titles`` parameter is a list of ``(namespace, dbtitle)`` tuples
+    :param bool pageids: whether the pageset is specified by page IDs; the
+        ``pageids`` parameter is a list of :py:obj:`int` objects
     """
     assert titles is not None or pageids is not None
     assert titles is None or pageids is None
@@ -108,13 +133,14 @@ def get_pageset(db, titles=None, pageids=None):
     s = sa.select([page.c.page_id, page.c.page_namespace, page.c.page_title, nss.c.nss_name])
 
     if titles is not None:
-        ns_title_pairs = [(t.namespacenumber, t.dbtitle()) for t in titles]
+        ns_title_pairs = sa.bindparam("titles", expanding=True)
         s = s.where(sa.tuple_(page.c.page_namespace, page.c.page_title).in_(ns_title_pairs))
         s = s.order_by(page.c.page_namespace.asc(), page.c.page_title.asc())
 
         ex = sa.select([page.c.page_namespace, page.c.page_title])
         ex = ex.where(sa.tuple_(page.c.page_namespace, page.c.page_title).in_(ns_title_pairs))
     elif pageids is not None:
+        pageids = sa.bindparam("pageids", expanding=True)
         s = s.where(page.c.page_id.in_(pageids))
         s = s.order_by(page.c.page_id.asc())
 
@@ -123,6 +149,50 @@ def get_pageset(db, titles=None, pageids=None):
 
     return tail, s, ex
 
+def _get_prop_queries(db, pageset, tail, params):
+    """
+    Returns a list of ``(module, query)`` pairs for the ``prop=`` modules.
+    The queries are restricted to the pages passed as the ``chunk_pageids``
+    parameter on execution.
+    """
+    prop_queries = []
+    if "prop" in params:
+        prop = params.pop("prop")
+        if isinstance(prop, str):
+            prop = {prop}
+        assert isinstance(prop, set)
+
+        for p in prop:
+            if p not in __classes_props:
+                raise NotImplementedError("Module prop={} is not implemented yet.".format(p))
+            _s = __classes_props[p](db)
+
+            if p == "latestrevisions":
+                prop_tail = _s.join_with_pageset(tail, enum_rev_mode=False)
+            else:
+                prop_tail = _s.join_with_pageset(tail)
+            prop_params = _s.filter_params(params)
+            _s.set_defaults(prop_params)
+            prop_select, prop_tail = _s.get_select_prop(pageset, prop_tail, prop_params)
+
+            query = prop_select.select_from(prop_tail)
+            query = query.where(db.page.c.page_id.in_(sa.bindparam("chunk_pageids", expanding=True)))
+            prop_queries.append((_s, query))
+    return prop_queries
+
+def _cache_key(params):
+    """
+    Returns a hashable key representing the shape of the query parameters.
+    """
+    key = []
+    for name, value in sorted(params.items()):
+        if isinstance(value, (set, frozenset)):
+            value = frozenset(value)
+        elif isinstance(value, builtins.list):
+            value = tuple(value)
+        key.append((name, value))
+    return tuple(key)
+
 def query_pageset(db, params):
     params_copy = params.copy()
 
@@ -130,19 +200,38 @@ def query_pageset(db, params):
     s = AllPages(db)
 
     assert "titles" in params or "pageids" in params or "generator" in params
-    if "titles" in params:
-        titles = params_copy.pop("titles")
-        if isinstance(titles, str):
-            titles = {titles}
-        assert isinstance(titles, set)
-        titles = [db.Title(t) for t in titles]
-        tail, pageset, ex = get_pageset(db, titles=titles)
-    elif "pageids" in params:
-        pageids = params_copy.pop("pageids")
-        if isinstance(pageids, int):
-            pageids = {pageids}
-        assert isinstance(pageids, set)
-        tail, pageset, ex = get_pageset(db, pageids=pageids)
+    if "titles" in params or "pageids" in params:
+        if "titles" in params:
+            titles = params_copy.pop("titles")
+            if isinstance(titles, str):
+                titles = {titles}
+            assert isinstance(titles, set)
+            titles = [db.Title(t) for t in titles]
+            kind = "titles"
+            values = [(t.namespacenumber, t.dbtitle()) for t in titles]
+        else:
+            pageids = params_copy.pop("pageids")
+            if isinstance(pageids, int):
+                pageids = {pageids}
+            assert isinstance(pageids, set)
+            kind = "pageids"
+            values = sorted(pageids)
+
+        # The selects depend only on the shape of the parameters, the pageset
+        # is passed as a bind parameter. Hence they can be reused for
+        # subsequent queries and SQLAlchemy does not have to compile them again.
+        key = (kind, _cache_key(params_copy))
+        cached = db.select_cache.get(key)
+        if cached is None:
+            tail, pageset, ex = get_pageset(db, **{kind: True})
+            # the pageset query must be created before the prop modules modify the select
+            query = pageset.select_from(tail)
+            prop_queries = _get_prop_queries(db, pageset, tail, params_copy)
+            cached = (ex, query, prop_queries)
+            db.select_cache[key] = cached
+        ex, query, prop_queries = cached
+        use_cache = True
+        bind_params = {kind: values}
     elif "generator" in params:
         generator = params_copy.pop("generator")
         if generator not in __classes_generators:
@@ -153,11 +242,16 @@ def query_pageset(db, params):
         s.set_defaults(generator_params)
         s.sanitize_params(generator_params)
         pageset, tail = s.get_pageset(generator_params)
+        # the pageset query must be created before the prop modules modify the select
+        query = pageset.select_from(tail)
+        prop_queries = _get_prop_queries(db, pageset, tail, params_copy)
+        use_cache = False
+        bind_params = {}
 
     # report missing pages (does not make sense for generators)
     if "generator" not in params:
         existing_pages = set()
-        result = s.execute_sql(ex)
+        result = s.execute_sql(ex, params=bind_params, cache=use_cache)
         for row in result:
             if "titles" in params:
                 existing_pages.add((row.page_namespace, row.page_title))
@@ -172,43 +266,32 @@ def query_pageset(db, params):
                 if p not in existing_pages:
                     yield {"missing": "", "pageid": p}
 
-    # fetch the pageset into an intermediate list
-    # TODO: query-continuation is probably needed for better efficiency
-    query = pageset.select_from(tail)
-    pages = OrderedDict()  # for indexed access, like in MediaWiki
-    result = s.execute_sql(query)
-    for row in result:
-        entry = s.db_to_api(row)
-        pages[entry["pageid"]] = entry
-    result.close()
-
-    if "prop" in params:
-        prop = params_copy.pop("prop")
-        if isinstance(prop, str):
-            prop = {prop}
-        assert isinstance(prop, set)
-
-        for p in prop:
-            if p not in __classes_props:
-                raise NotImplementedError("Module prop={} is not implemented yet.".format(p))
-            _s = __classes_props[p](db)
-
-            if p == "latestrevisions":
-                prop_tail = _s.join_with_pageset(tail, enum_rev_mode=False)
-            else:
-                prop_tail = _s.join_with_pageset(tail)
-            prop_params = _s.filter_params(params_copy)
-            _s.set_defaults(prop_params)
-            prop_select, prop_tail = _s.get_select_prop(pageset, prop_tail, prop_params)
-
-            query = prop_select.select_from(prop_tail)
-            result = _s.execute_sql(query)
+    def process_chunk(pages):
+        # the prop queries are restricted to the pages of the current chunk
+        chunk_params = dict(bind_params, chunk_pageids=[*pages])
+        for _s, prop_query in prop_queries:
+            result = _s.execute_sql(prop_query, params=chunk_params, cache=use_cache)
             for row in result:
                 page = pages[row["page_id"]]
                 _s.db_to_api_subentry(page, row)
-            result.close()
 
-    yield from pages.values()
+    # process the pageset in chunks of pages to keep the memory usage bounded
+    pages = OrderedDict()  # for indexed access, like in MediaWiki
+    result = s.execute_sql(query, params=bind_params, stream=True, cache=use_cache)
+    try:
+        for row in result:
+            entry = s.db_to_api(row)
+            pages[entry["pageid"]] = entry
+            if len(pages) >= db.chunk_size:
+                process_chunk(pages)
+                yield from pages.values()
+                pages = OrderedDict()
+    finally:
+        result.close()
+
+    if pages:
+        process_chunk(pages)
+        yield from pages.values()
 
 def query(db, params=None, **kwargs):
     if params is None:
@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 
 def get_interwikimap(db):
-    conn = db.engine.connect()
-    result = conn.execute(db.interwiki.select())
-
     interwikimap = {}
 
-    for row in result:
+    with db.connection() as conn:
+        rows = conn.execute(db.interwiki.select()).fetchall()
+
+    for row in rows:
         iw = {
             "prefix": row.iw_prefix,
             "url": row.iw_url,
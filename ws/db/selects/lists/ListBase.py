@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 
+import datetime
+
+import sqlalchemy as sa
+
 from ..SelectBase import SelectBase
+from ...sql_types import MWTimestamp
 
 class ListBase(SelectBase):
     def get_select(self, params):
@@ -8,3 +13,84 @@ class ListBase(SelectBase):
         Returns the SQL query for given parameters to the ``list=`` module.
         """
         raise NotImplementedError
+
+    def get_continue_columns(self):
+        """
+        Returns the list of columns which determine the order of the results,
+        i.e. the columns in the ``ORDER BY`` clause of the query. Their values
+        form the ``continue`` parameter of the module.
+
+        Modules which do not support the ``limit`` and ``continue`` parameters
+        return ``None``.
+        """
+        return None
+
+    @staticmethod
+    def _format_continue_value(value):
+        if isinstance(value, datetime.datetime):
+            return value.strftime("%Y%m%d%H%M%S")
+        return str(value)
+
+    @staticmethod
+    def _parse_continue_value(column, value):
+        if isinstance(column.type, MWTimestamp):
+            return datetime.datetime.strptime(value, "%Y%m%d%H%M%S")
+        if isinstance(column.type, sa.Integer):
+            return int(value)
+        return value
+
+    def get_continue(self, row):
+        """
+        Returns the value of the ``continue`` parameter for the query selecting
+        the results starting from the given row. The format corresponds to
+        MediaWiki, e.g. ``"20200101123456|42"`` for ``list=recentchanges``.
+        """
+        values = [row["continue_{}".format(i)] for i in range(len(self.get_continue_columns()))]
+        return "|".join(self._format_continue_value(value) for value in values)
+
+    def set_limit_continue(self, s, params, *, descending):
+        """
+        Applies the ``limit`` and ``continue`` parameters to the select ``s``.
+
+        The continuation uses keyset pagination on the columns from
+        :py:meth:`get_continue_columns`, so it is efficient even for large
+        tables and stable when new rows are added. One more row than ``limit``
+        is selected, :py:func:`ws.db.selects.list` uses it to determine the
+        ``continue`` value for the next query.
+
+        :param s: an instance of :py:class:`sqlalchemy.sql.expression.Select`
+        :param dict params: the parameters of the module
+        :param bool descending: whether the results are ordered in descending order
+        """
+        columns = self.get_continue_columns()
+
+        if "continue" in params:
+            values = params["continue"].split("|")
+            assert len(values) == len(columns), "invalid continue parameter: {}".format(params["continue"])
+            values = [self._parse_continue_value(c, v) for c, v in zip(columns, values)]
+
+            # Build a condition equivalent to the row comparison
+            # "(c1, c2, ...) >= (v1, v2, ...)", but expanded so that PostgreSQL
+            # can use indexes on the leading column(s):
+            #     c1 >= v1 AND (c1 > v1 OR (c2 >= v2 AND (c2 > v2 OR ...)))
+            condition = None
+            for column, value in reversed(list(zip(columns, values))):
+                if descending is True:
+                    weak = column <= value
+                    strict = column < value
+                else:
+                    weak = column >= value
+                    strict = column > value
+                if condition is None:
+                    condition = weak
+                else:
+                    condition = sa.and_(weak, sa.or_(strict, condition))
+            s = s.where(condition)
+
+        if params.get("limit", "max") != "max":
+            # the values of the last row are used for the continuation
+            for i, column in enumerate(columns):
+                s.append_column(column.label("continue_{}".format(i)))
+            s = s.limit(int(params["limit"]) + 1)
+
+        return s
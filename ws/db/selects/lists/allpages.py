@@ -62,6 +62,7 @@ class AllPages(GeneratorBase):
             Parameters ...TODO... require joins with other tables,
             so that information will not be present during mirroring.
         """
+        # MW incompatibility: limit and continue are supported only for list=allpages, not for generator=allpages
         if {"filterlanglinks", "continue"} & set(params):
             raise NotImplementedError
         if "limit" in params and params["limit"] != "max":
@@ -123,7 +124,16 @@ class AllPages(GeneratorBase):
         return s, tail
 
     def get_select(self, params):
-        return self.get_pageset(params)[0]
+        pageset_params = params.copy()
+        pageset_params.pop("continue", None)
+        pageset_params.pop("limit", None)
+        s = self.get_pageset(pageset_params)[0]
+        s = self.set_limit_continue(s, params, descending=(params["dir"] == "descending"))
+        return s
+
+    def get_continue_columns(self):
+        page = self.db.page
+        return [page.c.page_title]
 
     @classmethod
     def db_to_api(klass, row):
@@ -25,9 +25,7 @@ class AllRevisions(Revisions, GeneratorBase):
             Parameters ...TODO... require joins with other tables,
             so that information will not be present during mirroring.
         """
-        if {"section", "generatetitles", "continue"} & set(params):
-            raise NotImplementedError
-        if "limit" in params and params["limit"] != "max":
+        if {"section", "generatetitles"} & set(params):
             raise NotImplementedError
 
         rev = self.db.revision
@@ -45,4 +43,11 @@ class AllRevisions(Revisions, GeneratorBase):
             # FIXME: namespace can be a '|'-delimited list
             s = s.where(page.c.page_namespace == params["namespace"])
 
-        return s.select_from(tail)
+        s = s.select_from(tail)
+        s = self.set_limit_continue(s, params, descending=(params["dir"] == "older"))
+
+        return s
+
+    def get_continue_columns(self):
+        rev = self.db.revision
+        return [rev.c.rev_timestamp, rev.c.rev_id]
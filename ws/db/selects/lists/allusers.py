@@ -41,9 +41,7 @@ class AllUsers(ListBase):
         assert params["prop"] <= {"blockinfo", "groups", "editcount", "registration"}
 
     def get_select(self, params):
-        if {"prefix", "continue"} & set(params):
-            raise NotImplementedError
-        if "limit" in params and params["limit"] != "max":
+        if {"prefix"} & set(params):
             raise NotImplementedError
 
         user = self.db.user
@@ -104,8 +102,14 @@ class AllUsers(ListBase):
         else:
             s = s.order_by(user.c.user_name.desc())
 
+        s = self.set_limit_continue(s, params, descending=(params["dir"] == "descending"))
+
         return s
 
+    def get_continue_columns(self):
+        user = self.db.user
+        return [user.c.user_name]
+
     @classmethod
     def db_to_api(klass, row):
         flags = {
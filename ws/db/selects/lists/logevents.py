@@ -40,9 +40,7 @@ class LogEvents(ListBase):
         assert params["prop"]
 
     def get_select(self, params):
-        if {"prefix", "continue"} & set(params):
-            raise NotImplementedError
-        if "limit" in params and params["limit"] != "max":
+        if {"prefix"} & set(params):
             raise NotImplementedError
 
         log = self.db.logging
@@ -137,8 +135,14 @@ class LogEvents(ListBase):
         else:
             s = s.order_by(log.c.log_timestamp.asc(), log.c.log_id.asc())
 
+        s = self.set_limit_continue(s, params, descending=(params["dir"] == "older"))
+
         return s
 
+    def get_continue_columns(self):
+        log = self.db.logging
+        return [log.c.log_timestamp, log.c.log_id]
+
     @classmethod
     def db_to_api(klass, row):
         flags = {
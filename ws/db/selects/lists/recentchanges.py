@@ -63,11 +63,6 @@ class RecentChanges(GeneratorBase):
             Also ``prop=title`` requires join with the ``namespace_starname`` table
             but that must be synchronized first anyway.
         """
-        if {"continue"} & set(params):
-            raise NotImplementedError
-        if "limit" in params and params["limit"] != "max":
-            raise NotImplementedError
-
         rc = self.db.recentchanges
         s = sa.select([rc.c.rc_type, rc.c.rc_deleted])
 
@@ -191,8 +186,14 @@ class RecentChanges(GeneratorBase):
         else:
             s = s.order_by(rc.c.rc_timestamp.asc(), rc.c.rc_id.asc())
 
+        s = self.set_limit_continue(s, params, descending=(params["dir"] == "older"))
+
         return s
 
+    def get_continue_columns(self):
+        rc = self.db.recentchanges
+        return [rc.c.rc_timestamp, rc.c.rc_id]
+
     @classmethod
     def db_to_api(klass, row):
         flags = {
@@ -24,9 +24,15 @@ Or at runtime by wrapping the function call:
 
     # allow at most 10 calls in 2 seconds
     wrapped = RateLimited(10, 2)(PrintNumber)
+
+The allowance is shared by all threads calling the decorated function. When
+the rate limit is exceeded, the other threads wait until the timeout of the
+first one is over, but the decorated function itself is called without
+holding the lock.
 """
 
 from functools import wraps
+import threading
 import time
 import logging
 
@@ -42,6 +48,7 @@ def RateLimited(rate, per):
         # defined as lists to avoid problems with the 'global' keyword
         allowance = [rate]
         last_check = [time.time()]
+        lock = threading.Lock()
 
         @wraps(func)
         def rate_limit_func(*args, **kargs):
@@ -49,24 +56,24 @@ def RateLimited(rate, per):
             if hasattr(ws, "_tests_are_running"):
                 return func(*args, **kargs)
 
-            current = time.time()
-            time_passed = current - last_check[0]
-            last_check[0] = current
-            allowance[0] += time_passed * (rate / per)
-            if allowance[0] > rate:
-                allowance[0] = rate    # throttle
-            if allowance[0] < 1.0:
-                # the original used    to_sleep = (1 - allowance[0]) * (per / rate)
-                # but we want longer timeout after burst limit is exceeded
-                to_sleep = (1 - allowance[0]) * per
-                logger.info("rate limit for function {} exceeded, sleeping for {:0.3f} seconds".format(func.__qualname__, to_sleep))
-                time.sleep(to_sleep)
-                ret = func(*args, **kargs)
-                allowance[0] = rate
-            else:
-                ret = func(*args, **kargs)
-                allowance[0] -= 1.0
-            return ret
+            with lock:
+                current = time.time()
+                time_passed = current - last_check[0]
+                last_check[0] = current
+                allowance[0] += time_passed * (rate / per)
+                if allowance[0] > rate:
+                    allowance[0] = rate    # throttle
+                if allowance[0] < 1.0:
+                    # the original used    to_sleep = (1 - allowance[0]) * (per / rate)
+                    # but we want longer timeout after burst limit is exceeded
+                    to_sleep = (1 - allowance[0]) * per
+                    logger.info("rate limit for function {} exceeded, sleeping for {:0.3f} seconds".format(func.__qualname__, to_sleep))
+                    time.sleep(to_sleep)
+                    allowance[0] = rate
+                    last_check[0] = time.time()
+                else:
+                    allowance[0] -= 1.0
+            return func(*args, **kargs)
 
         return rate_limit_func
 